@@ -0,0 +1,91 @@
+"""
+Decoding speed of the JSON backends on recorded page payloads.
+
+Usage:
+    python benchmarks/decode_json.py [--repeat 50] [--models]
+
+Decodes every payload in benchmarks/payloads with each installed backend
+and prints the best time of repeat runs and the speedup over json. With
+--models it also converts the results to typed models, as clients with
+models=True do after decoding.
+"""
+
+import argparse
+import gc
+import glob
+import os
+import time
+
+from tiramisu_wallet_client.decoding import JSONDecoder, available_backends
+from tiramisu_wallet_client.models import decode_response
+
+PAYLOADS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+# endpoint of each payload, for the model conversion
+ENDPOINTS = {
+    "transactions_page": "transactions",
+    "assets_page": "assets",
+}
+
+
+def best_time(function, repeat:int) -> float:
+    best = None
+
+    # like timeit, keep the garbage collector from adding noise
+    gc.collect()
+    gc.disable()
+
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+
+    return best
+
+
+def decode_models(decoder:JSONDecoder, data:bytes, name:str):
+    page = decode_response(name, decoder.loads(data))
+
+    # pages convert their records lazily, touch them all
+    for index in range(len(page.results)):
+        page.results[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--models", action="store_true", help="also convert to typed models")
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"backends: {', '.join(backends)}")
+
+    for path in sorted(glob.glob(os.path.join(PAYLOADS, "*.json"))):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        payload = os.path.splitext(os.path.basename(path))[0]
+        print(f"\n{payload} ({len(data) / 1e3:.0f} kB)")
+
+        baseline = {}
+
+        # json first, it is the baseline of the speedups
+        for backend in sorted(backends, key=lambda backend: backend != "json"):
+            decoder = JSONDecoder(backend)
+            runs = [("loads", lambda: decoder.loads(data))]
+
+            if args.models:
+                runs.append(("models", lambda: decode_models(decoder, data, ENDPOINTS.get(payload, "transactions"))))
+
+            for label, function in runs:
+                elapsed = best_time(function, args.repeat)
+                baseline.setdefault(label, elapsed)
+                print(f"  {backend:8} {label:7} {elapsed * 1e3:8.2f} ms  {len(data) / elapsed / 1e6:7.1f} MB/s  {baseline[label] / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Local stand-in for the walletapp API, for benchmarks.
+
+Usage:
+    python benchmarks/mock_server.py [--port 8765] [--latency 0.02] [--jitter 0.005]
+
+Serves the endpoints the client uses from memory, for any username and
+password. Every response is delayed by a latency drawn around --latency,
+plus --row-cost seconds per record of list pages. Transactions move through
+the status sequence of their kind as time passes (send_internal goes from
+internal_pending to internal_finished after --step seconds, mint-nft from
+minting to minted, ...), so waiting on them behaves as on the real server.
+
+Responses are written to a buffered wfile and sent in one piece. Sending
+the headers and the body in two small segments lets Nagle's algorithm wait
+for the delayed ACK of the client, which adds about 40 ms to every request.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PREFIX = "/walletapp/"
+
+# status sequence per kind of transaction, every status but the last one
+# lasts one step
+FLOWS = {
+    "send_internal": ("internal_pending", "internal_finished"),
+    "send_taro": ("outbound_invoice_pending", "outbound_invoice_paid"),
+    "send_btc": ("outbound_invoice_pending", "outbound_invoice_paid"),
+    "send_btc_lnd": ("outbound_invoice_pending", "outbound_invoice_paid"),
+    "receive_taro": ("inbound_invoice_pending", "inbound_invoice_generated"),
+    "receive_btc": ("inbound_invoice_pending", "inbound_invoice_generated"),
+    "receive_btc_lnd": ("lnd_inbound_invoice_pending", "lnd_inbound_invoice_generated", "lnd_inbound_invoice_paid"),
+    "mint": ("minting", "minted"),
+    "exchange": ("exchange_pending", "exchange_finished"),
+}
+
+BTC = {"id": 1, "name": "Bitcoin", "acronym": "BTC", "description": "Bitcoin", "supply": 0, "asset_id": None, "minting_transaction": None, "is_nft": False, "collection": None, "picture_orig": None}
+
+
+class Wallets():
+    """
+    In-memory state of all users
+
+    Args:
+        transactions (int): Finished transactions every new user starts with
+        notifications (int): Notifications every new user starts with
+        assets (int): Fungible assets besides BTC
+        step (float): Seconds every intermediate transaction status lasts
+    """
+
+    def __init__(self, transactions:int=1000, notifications:int=100, assets:int=50, step:float=0.2) -> None:
+        self.initial_transactions = transactions
+        self.initial_notifications = notifications
+        self.step = step
+
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.users = {}
+        self.tokens = {}
+        self.assets = [BTC] + [dict(BTC, id=i, name=f"Asset {i}", acronym=f"A{i}", description=f"Test asset {i}", supply=1000000, asset_id="%064x" % i) for i in range(2, assets + 2)]
+        self.nfts = []
+        self.collections = [{"id": 1, "name": "Benchmark", "description": "NFTs minted by benchmarks", "picture_orig": None}]
+        self.listings = [{"id": number, "currency": asset, "amount": 100, "price_sat": 1000 + number * 37 % 500, "user": 0, "created_timestamp": "2024-01-01T00:00:00Z"} for number, asset in enumerate(self.assets[1:] * 3, 1)]
+
+    def user(self, username:str) -> dict:
+        with self.lock:
+            user = self.users.get(username)
+
+            if user is None:
+                user = {"id": len(self.users) + 1, "username": username, "token": f"token-{username}", "transactions": {}, "notifications": [], "idempotency": {}}
+
+                for number in range(self.initial_transactions):
+                    transaction_id = next(self.ids)
+                    user["transactions"][transaction_id] = self._transaction(transaction_id, "send_internal", created=0, currency=self.assets[number % len(self.assets)], amount=number + 1, description=f"seed {number}")
+
+                user["notifications"] = [{"id": number, "title": f"Notification {number}", "message": "Benchmark", "read": False, "created_timestamp": "2024-01-01T00:00:00Z"} for number in range(1, self.initial_notifications + 1)]
+
+                self.users[username] = user
+                self.tokens[user["token"]] = user
+
+            return user
+
+    def lookup(self, term:str) -> list:
+        """
+        Users whose username contains term, as returned by the user lookup
+        """
+
+        with self.lock:
+            return [{"pk": user["id"], "value": user["username"], "repr": user["username"]} for user in self.users.values() if term in user["username"]][:20]
+
+    def _transaction(self, transaction_id:int, kind:str, created:float, currency:dict, amount, description:str) -> dict:
+        return {"id": transaction_id, "kind": kind, "created": created, "status": FLOWS[kind][0], "status_description": "", "amount": amount, "description": description, "currency": currency, "direction": "outbound" if kind.startswith("send") else "inbound", "invoice_inbound": None, "invoice_outbound": None, "created_timestamp": "2024-01-01T00:00:00Z"}
+
+    def create(self, user:dict, kind:str, currency_id, amount, description:str, idempotency_key:str=None) -> dict:
+        with self.lock:
+            if idempotency_key is not None and idempotency_key in user["idempotency"]:
+                return user["transactions"][user["idempotency"][idempotency_key]]
+
+            transaction_id = next(self.ids)
+            currency = self.asset(int(currency_id)) if currency_id else BTC
+            transaction = self._transaction(transaction_id, kind, time.monotonic(), currency, amount, description)
+
+            if kind.startswith("receive"):
+                transaction["invoice_inbound"] = "lntb%dn1p%032x" % (int(amount or 0), transaction_id)
+
+            user["transactions"][transaction_id] = transaction
+
+            if idempotency_key is not None:
+                user["idempotency"][idempotency_key] = transaction_id
+
+            return transaction
+
+    def view(self, transaction:dict) -> dict:
+        """
+        The transaction in the status it has reached by now
+        """
+
+        flow = FLOWS[transaction["kind"]]
+
+        if transaction["created"]:
+            step = int((time.monotonic() - transaction["created"]) / self.step) if self.step > 0 else len(flow)
+            status = flow[min(step, len(flow) - 1)]
+        else:
+            status = flow[-1]
+
+        data = {key: value for key, value in transaction.items() if key not in ("kind", "created")}
+        data["status"] = status
+
+        return data
+
+    def asset(self, asset_id:int) -> dict:
+        for asset in itertools.chain(self.assets, self.nfts):
+            if asset["id"] == asset_id:
+                return asset
+
+        return None
+
+
+def page(request:"Handler", items:list) -> dict:
+    query = request.query
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", 100))
+    results = items[offset:offset + limit]
+
+    request.row_delay = len(results)
+
+    def link(new_offset):
+        return f"http://{request.headers.get('Host')}{request.path_only}?limit={limit}&offset={new_offset}"
+
+    return {
+        "count": len(items),
+        "next": link(offset + limit) if offset + limit < len(items) else None,
+        "previous": link(max(offset - limit, 0)) if offset > 0 else None,
+        "results": results,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # buffer the response and send it in one piece, see the module docstring
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method:str):
+        started = time.monotonic()
+
+        url = urlparse(self.path)
+        self.path_only = url.path
+        self.query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        self.form = self._form() if method == "POST" else {}
+        self.row_delay = 0
+
+        status, body = self._route(method, url.path[len(PREFIX):] if url.path.startswith(PREFIX) else None)
+
+        server = self.server
+        delay = max(0.0, random.gauss(server.latency, server.jitter)) + self.row_delay * server.row_cost - (time.monotonic() - started)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        payload = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _form(self) -> dict:
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("multipart/form-data"):
+            message = BytesParser(policy=policy.HTTP).parsebytes(b"Content-Type: " + content_type.encode() + b"\r\n\r\n" + raw)
+
+            return {part.get_param("name", header="content-disposition"): part.get_content() if part.get_filename() is None else part.get_filename() for part in message.iter_parts()}
+
+        return {name: values[0] for name, values in parse_qs(raw.decode()).items()}
+
+    def _route(self, method:str, path:str):
+        wallets = self.server.wallets
+
+        if path is None:
+            return 404, {"detail": "Not found."}
+
+        if method == "POST" and path in ("api/token-auth/", "api/user/register/"):
+            user = wallets.user(self.form.get("username", ""))
+
+            return (200, {"token": user["token"]}) if path == "api/token-auth/" else (201, {"id": user["id"], "username": user["username"]})
+
+        if method == "GET" and path == "ajax_select/ajax_lookup/users":
+            return 200, wallets.lookup(self.query.get("term", ""))
+
+        user = wallets.tokens.get(self.headers.get("Authorization", "")[len("Token "):])
+
+        if user is None:
+            return 401, {"detail": "Invalid token."}
+
+        for pattern, route_method, handler in ROUTES:
+            match = pattern.fullmatch(path)
+
+            if match and route_method == method:
+                return handler(self, wallets, user, *match.groups())
+
+        return 404, {"detail": "Not found."}
+
+
+def _transactions(request, wallets, user):
+    with wallets.lock:
+        items = [wallets.view(transaction) for transaction in sorted(user["transactions"].values(), key=lambda transaction: -transaction["id"])]
+
+    for field, name in (("description", "description"), ("currency_id", "currency")):
+        if field in request.query:
+            items = [item for item in items if str(item[name]["id"] if name == "currency" else item[name]) == request.query[field]]
+
+    return 200, page(request, items)
+
+
+def _transaction(request, wallets, user, transaction_id):
+    with wallets.lock:
+        transaction = user["transactions"].get(int(transaction_id))
+
+        if transaction is None:
+            return 404, {"detail": "Not found."}
+
+        return 200, wallets.view(transaction)
+
+
+def _create(kind:str, currency_field:str="currency", amount_field:str="amount"):
+    def handler(request, wallets, user):
+        form = request.form
+        transaction = wallets.create(user, kind, form.get(currency_field), form.get(amount_field), form.get("description", ""), request.headers.get("Idempotency-Key"))
+
+        return 201, wallets.view(transaction)
+
+    return handler
+
+
+def _mint_nft(request, wallets, user):
+    transaction = wallets.create(user, "mint", None, 1, f"Minting {request.form.get('name')}")
+
+    with wallets.lock:
+        nft = dict(BTC, id=100000 + transaction["id"], name=request.form.get("name"), acronym=None, description=request.form.get("description"), supply=1, is_nft=True, minting_transaction=transaction["id"], collection=wallets.collections[0])
+        wallets.nfts.append(nft)
+
+    return 201, nft
+
+
+def _mint(request, wallets, user):
+    transaction = wallets.create(user, "mint", None, request.form.get("supply"), f"Minting {request.form.get('name')}")
+
+    with wallets.lock:
+        asset = dict(BTC, id=100000 + transaction["id"], name=request.form.get("name"), acronym=request.form.get("acronym"), description=request.form.get("description"), supply=request.form.get("supply"), minting_transaction=transaction["id"])
+        wallets.assets.append(asset)
+
+    return 201, asset
+
+
+def _assets(request, wallets, user, nfts=False):
+    items = wallets.nfts if nfts else wallets.assets
+
+    if "name" in request.query:
+        items = [asset for asset in items if asset["name"] == request.query["name"]]
+
+    if "collection_name" in request.query:
+        items = [asset for asset in items if (asset["collection"] or {}).get("name") == request.query["collection_name"]]
+
+    return 200, page(request, list(items))
+
+
+def _asset(request, wallets, user, asset_id):
+    asset = wallets.asset(int(asset_id))
+
+    return (200, asset) if asset is not None else (404, {"detail": "Not found."})
+
+
+def _balances(request, wallets, user):
+    return 200, page(request, [{"id": asset["id"], "amount": 100000000 if asset["id"] == BTC["id"] else 1000, "currency": asset} for asset in wallets.assets[:10]])
+
+
+def _notifications(request, wallets, user):
+    return 200, page(request, sorted(user["notifications"], key=lambda notification: -notification["id"]))
+
+
+def _empty_page(request, wallets, user):
+    return 200, page(request, [])
+
+
+def _ok(request, wallets, user):
+    return 201, {}
+
+
+ROUTES = [(re.compile(pattern), method, handler) for pattern, method, handler in (
+    (r"api/transactions/", "GET", _transactions),
+    (r"api/transactions/(\d+)", "GET", _transaction),
+    (r"api/transactions/send_internal/", "POST", _create("send_internal")),
+    (r"api/transactions/send_taro/", "POST", _create("send_taro")),
+    (r"api/transactions/send_btc/", "POST", _create("send_btc")),
+    (r"api/transactions/send_btc_lnd/", "POST", _create("send_btc_lnd")),
+    (r"api/transactions/receive_taro/", "POST", _create("receive_taro")),
+    (r"api/transactions/receive_btc/", "POST", _create("receive_btc")),
+    (r"api/transactions/receive_btc_lnd/", "POST", _create("receive_btc_lnd")),
+    (r"api/buy_taro_asset/", "POST", _create("exchange")),
+    (r"api/buy_nft_asset/", "POST", _create("exchange")),
+    (r"api/sell_taro_asset/", "POST", _create("exchange")),
+    (r"api/currencies/", "GET", _assets),
+    (r"api/currencies/(\d+)", "GET", _asset),
+    (r"api/currencies/mint/", "POST", _mint),
+    (r"api/currencies/mint-nft/", "POST", _mint_nft),
+    (r"api/currency/create/", "POST", _ok),
+    (r"api/nfts/", "GET", lambda request, wallets, user: _assets(request, wallets, user, nfts=True)),
+    (r"api/collections/", "GET", lambda request, wallets, user: (200, page(request, wallets.collections))),
+    (r"api/balances/", "GET", _balances),
+    (r"api/balances-rgb/", "GET", _empty_page),
+    (r"api/balances-nft/", "GET", _empty_page),
+    (r"api/balance/create/", "POST", _ok),
+    (r"api/notifications/", "GET", _notifications),
+    (r"api/listings/", "GET", lambda request, wallets, user: (200, page(request, wallets.listings))),
+    (r"api/listings_nfts/", "GET", _empty_page),
+    (r"api/listings_my/", "GET", _empty_page),
+    (r"api/list_asset/", "POST", _ok),
+    (r"api/list_nft_asset/", "POST", _ok),
+    (r"api/get_info/", "GET", lambda request, wallets, user: (200, {"network": "benchmark"})),
+)]
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    The mock walletapp server
+
+    Args:
+        address (tuple): (host, port), port 0 picks a free one
+        wallets (Wallets): State served
+        latency (float): Mean seconds every response is delayed
+        jitter (float): Standard deviation of the delay
+        row_cost (float): Extra seconds per record of a list page
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address:tuple=("127.0.0.1", 0), wallets:Wallets=None, latency:float=0.02, jitter:float=0.005, row_cost:float=0.00002) -> None:
+        super().__init__(address, Handler)
+        self.wallets = wallets or Wallets()
+        self.latency = latency
+        self.jitter = jitter
+        self.row_cost = row_cost
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}{PREFIX}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 for a free port")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.005, help="standard deviation of the latency")
+    parser.add_argument("--row-cost", type=float, default=0.00002, help="seconds per record of list pages")
+    parser.add_argument("--step", type=float, default=0.2, help="seconds per intermediate transaction status")
+    parser.add_argument("--transactions", type=int, default=1000, help="transactions of every new user")
+    args = parser.parse_args()
+
+    server = MockServer((args.host, args.port), Wallets(transactions=args.transactions, step=args.step), latency=args.latency, jitter=args.jitter, row_cost=args.row_cost)
+
+    # the first line tells the benchmark runner where to connect
+    print(server.url, flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Client benchmarks against the local mock walletapp server.
+
+Usage:
+    python benchmarks/run.py [--scenarios startup,pagination,send_wait,minting]
+                             [--save] [--compare benchmarks/results/0.0.9+16d61d5.json]
+
+Starts benchmarks/mock_server.py in a subprocess (or uses --server-url),
+runs the scenarios and prints the throughput and the p50/p99 latency of
+every one. --save stores the results as
+benchmarks/results/<version>+<commit>.json (or --output), --compare prints
+the change against stored results.
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from tiramisu_wallet_client import TiramisuClient, create_session
+from tiramisu_wallet_client.pagination import iter_pages
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMAGE = os.path.join(HERE, "..", "test_image.jpg")
+
+# metrics where a larger value is better, for --compare
+HIGHER_IS_BETTER = ("throughput",)
+
+
+def percentile(values:list, fraction:float) -> float:
+    """
+    Value below which the given fraction of values falls, by nearest rank
+    """
+
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarize(latencies:list, elapsed:float, operations:int=None) -> dict:
+    """
+    Throughput in operations per second and latency percentiles in milliseconds
+    """
+
+    operations = len(latencies) if operations is None else operations
+
+    return {
+        "operations": operations,
+        "seconds": round(elapsed, 3),
+        "throughput": round(operations / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1e3, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 2),
+        "max_ms": round(max(latencies) * 1e3, 2),
+    }
+
+
+def timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+
+    return time.perf_counter() - start
+
+
+def run_concurrently(function, count:int, concurrency:int) -> tuple:
+    """
+    Call function(number) count times from concurrency threads
+
+    Returns:
+        (latencies, elapsed seconds)
+    """
+
+    start = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda number: timed(function, number), range(count)))
+
+    return latencies, time.perf_counter() - start
+
+
+_usernames = itertools.count(1)
+
+
+def new_client(url:str, **kwargs) -> TiramisuClient:
+    return TiramisuClient(f"bench{next(_usernames)}", "password", server_url=url, **kwargs)
+
+
+def bench_startup(url:str, args) -> dict:
+    """
+    Client construction: logging in and looking up the BTC asset, and from a saved token
+    """
+
+    clients = []
+    latencies = [timed(lambda: clients.append(new_client(url))) for _ in range(args.count)]
+    elapsed = sum(latencies)
+
+    token_latencies = [timed(lambda: TiramisuClient.from_token(client.username, client.auth_token, btc_asset_id=client.btc_asset_id, server_url=url).close()) for client in clients]
+
+    for client in clients:
+        client.close()
+
+    return {"login": summarize(latencies, elapsed), "from_token": summarize(token_latencies, sum(token_latencies))}
+
+
+def bench_pagination(url:str, args) -> dict:
+    """
+    Reading the whole transaction list, one page at a time and with parallel pages
+    """
+
+    client = new_client(url)
+    results = {}
+
+    for concurrency in (1, 8):
+        latencies = []
+        records = 0
+        start = time.perf_counter()
+
+        for _ in range(args.repeat):
+            last = time.perf_counter()
+
+            for page in iter_pages(client.transactions, page_size=100, concurrency=concurrency):
+                now = time.perf_counter()
+                latencies.append(now - last)
+                last = now
+                records += len(page["results"])
+
+        elapsed = time.perf_counter() - start
+        summary = summarize(latencies, elapsed)
+        summary["records_per_second"] = round(records / elapsed, 1)
+        results[f"concurrency_{concurrency}"] = summary
+
+    client.close()
+
+    return results
+
+
+def bench_send_wait(url:str, args) -> dict:
+    """
+    Internal transfers sent from concurrent threads, each waiting until finished
+    """
+
+    client = new_client(url, session=create_session(pool_maxsize=args.concurrency))
+
+    def send(number):
+        client.transactions_send_internal_wait_sent(2, client.btc_asset_id, 1, f"bench {number}")
+
+    latencies, elapsed = run_concurrently(send, args.count, args.concurrency)
+    client.close()
+
+    return {"send_internal_wait_sent": summarize(latencies, elapsed)}
+
+
+def bench_minting(url:str, args) -> dict:
+    """
+    NFTs minted from concurrent threads, uploading an image and waiting until minted
+    """
+
+    client = new_client(url, session=create_session(pool_maxsize=args.concurrency))
+
+    def mint(number):
+        client.assets_mint_nft_wait_finished(f"Bench NFT {number}", "Benchmark", IMAGE)
+
+    latencies, elapsed = run_concurrently(mint, max(1, args.count // 4), args.concurrency)
+    client.close()
+
+    return {"assets_mint_nft_wait_finished": summarize(latencies, elapsed)}
+
+
+SCENARIOS = {
+    "startup": bench_startup,
+    "pagination": bench_pagination,
+    "send_wait": bench_send_wait,
+    "minting": bench_minting,
+}
+
+
+def start_server(args) -> tuple:
+    command = [sys.executable, os.path.join(HERE, "mock_server.py"), "--port", "0", "--latency", str(args.latency), "--jitter", str(args.jitter), "--transactions", str(args.transactions)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+    return process, process.stdout.readline().strip()
+
+
+def version() -> str:
+    try:
+        from importlib.metadata import version as package_version
+
+        return package_version("tiramisu-wallet-client")
+    except Exception:
+        with open(os.path.join(HERE, "..", "pyproject.toml")) as f:
+            for line in f:
+                if line.startswith("version"):
+                    return line.split("=")[1].strip().strip('"')
+
+    return "unknown"
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results:dict):
+    for scenario, cases in results["scenarios"].items():
+        print(f"\n{scenario}")
+
+        for case, summary in cases.items():
+            print(f"  {case:32} {summary['throughput']:9.2f} ops/s  p50 {summary['p50_ms']:8.2f} ms  p99 {summary['p99_ms']:8.2f} ms")
+
+
+def compare(results:dict, baseline:dict):
+    print(f"\nchange against {baseline['version']} ({baseline.get('commit')}), negative is worse")
+
+    for scenario, cases in results["scenarios"].items():
+        for case, summary in cases.items():
+            old = baseline["scenarios"].get(scenario, {}).get(case)
+
+            if old is None:
+                continue
+
+            changes = []
+
+            for metric in ("throughput", "p50_ms", "p99_ms"):
+                if not old.get(metric):
+                    continue
+
+                change = (summary[metric] - old[metric]) / old[metric] * 100
+
+                if metric not in HIGHER_IS_BETTER:
+                    change = -change
+
+                changes.append(f"{metric} {change:+6.1f}%")
+
+            print(f"  {scenario + '.' + case:45} {'  '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma separated, from " + ", ".join(SCENARIOS))
+    parser.add_argument("--server-url", help="walletapp URL to use instead of starting the mock server")
+    parser.add_argument("--count", type=int, default=100, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="threads of the send and mint scenarios")
+    parser.add_argument("--repeat", type=int, default=3, help="walks of the transaction list")
+    parser.add_argument("--transactions", type=int, default=2000, help="transactions of every mock user")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean latency of the mock server")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--save", action="store_true", help="store the results under benchmarks/results")
+    parser.add_argument("--output", help="file to store the results to, implies --save")
+    parser.add_argument("--compare", help="stored results to compare with")
+    args = parser.parse_args()
+
+    process = None
+    url = args.server_url
+
+    if url is None:
+        process, url = start_server(args)
+
+    try:
+        results = {
+            "version": version(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "settings": {name: getattr(args, name) for name in ("count", "concurrency", "repeat", "transactions", "latency", "jitter")},
+            "server": args.server_url or "mock",
+            "scenarios": {},
+        }
+
+        for name in args.scenarios.split(","):
+            results["scenarios"][name] = SCENARIOS[name](url, args)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_results(results)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+    if args.save or args.output:
+        # the package version is only bumped on release, the commit tells what was measured
+        label = results["version"] if results["commit"] is None else f"{results['version']}+{results['commit']}"
+        path = args.output or os.path.join(HERE, "results", f"{label}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+
+        print(f"\nsaved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,29 @@
 # !/bin/python3
 # isort: skip_file
 
+import logging
+
+from .bulk import BulkSendReport, SendJournal, SendResult
+from .cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend
+from .decoding import JSONDecoder, get_decoder
+from .events import AsyncEventHub, Event, EventCursor, EventHub
+from .exceptions import InsufficientBalance, RequestError, TiramisuError, TransactionError, TransactionTimeout
+from .invoices import BTC, AsyncInvoicePool, InvoicePool, PooledInvoice
+from .ledger import AsyncBalanceLedger, BalanceLedger
+from .log import SampleFilter
+from .manager import AsyncClientManager, ClientManager, FanOutReport
+from .market import BUY, BUY_NFT, SELL, AsyncMarket, ExecutionReport, ListingIndex, Market, Order
+from .metrics import RequestEvent, RequestMetrics
+from .minting import MintReport, load_manifest
+from .models import Asset, Balance, Collection, Listing, ModelIndex, Notification, Page, Transaction
+from .ratelimit import FileTokenBucket, RateLimiter, TokenBucket
+from .retry import RetryBudget, RetryPolicy
+from .session import create_async_session, create_session
+from .store import SyncStore
+from .tokens import FileTokenStore, MemoryTokenStore
+from .users import UserResolver
+from .waiter import AsyncTransactionWaiter, Backoff, TransactionWaiter
 from .tiramisu_client import TiramisuClient
+from .async_client import AsyncTiramisuClient
+
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -0,0 +1,520 @@
+import asyncio
+import functools
+import logging
+import time
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .bulk import BulkSendReport, SendJournal, asend_internal_many
+from .cache import ResponseCache
+from .decoding import JSONDecoder, get_decoder
+from .endpoints import (
+    Sleep,
+    WaitStatus,
+    authenticate,
+    bind_endpoints,
+    login,
+    resolve_base_url,
+)
+from .events import KINDS, AsyncEventHub
+from .exceptions import RequestError
+from .metrics import RequestEvent, emit
+from .minting import MintReport, aassets_mint_nft_many
+from .models import decode_response
+from .pagination import aiter_results
+from .ratelimit import RateLimiter
+from .retry import ErrorInfo, RetryPolicy, parse_retry_after
+from .session import DEFAULT_TIMEOUT, create_async_session
+from .tokens import token_key
+from .upload import MultipartEncoder
+from .users import UserResolver, aget_user_ids
+from .waiter import AsyncTransactionWaiter
+
+logger = logging.getLogger(__name__)
+
+
+@bind_endpoints
+class AsyncTiramisuClient():
+    """
+    asyncio client for the Tiramisu wallet API
+
+    Offers the same methods as TiramisuClient as coroutines. The constructor
+    does no I/O, the client logs in on first use, explicitly with
+    "await client.login()" or when used as an async context manager:
+
+        async with AsyncTiramisuClient(username, password) as client:
+            balances = await client.balances()
+
+    Requires the optional aiohttp dependency.
+    """
+
+    def __init__(self, username:str, password:str, network:str="testnet", server_url:str=None, register_new_user:bool=False, session=None, timeout=DEFAULT_TIMEOUT, pool_maxsize:int=100, keep_alive:bool=True, waiter:AsyncTransactionWaiter=None, cache:ResponseCache=None, token_store=None, auth_token:str=None, btc_asset_id:int=None, hooks:list=None, retry_policy:RetryPolicy=None, rate_limiter:RateLimiter=None, models:bool=False, json_decoder:JSONDecoder=None, user_resolver:UserResolver=None) -> None:
+        """
+        Create a client, nothing is sent before the first call
+
+        Args:
+            username (str):
+            password (str):
+            network (str): "testnet" or "mainnet"
+            server_url (str): Overrides the URL derived from network
+            register_new_user (bool): Register the user when logging in
+            session (aiohttp.ClientSession): Connection pool to use. Pass the
+            same session (see create_async_session) to many clients to share
+            one pool
+            timeout (float or tuple): Timeout in seconds for every request,
+            or a (connect, read) tuple
+            pool_maxsize (int): Connection limit when the client creates its
+            own session
+            keep_alive (bool): Reuse connections when the client creates its
+            own session
+            waiter (AsyncTransactionWaiter): Poller used by the *_wait_* methods.
+            Pass the same waiter to many clients to poll from one place
+            cache (ResponseCache): Cache for read-mostly endpoints such as
+            asset() and assets(). Pass the same cache to many clients to
+            share it
+            token_store (MemoryTokenStore or FileTokenStore): Store to load
+            credentials from and save new ones to
+            auth_token (str): Auth token obtained earlier
+            btc_asset_id (int): Id of the BTC asset obtained earlier
+            hooks (list): Callables called with a RequestEvent after every
+            HTTP call, e.g. a RequestMetrics object
+            retry_policy (RetryPolicy): When to repeat failed requests,
+            RetryPolicy(max_attempts=1) disables retries
+            rate_limiter (RateLimiter): Limits the request rate per endpoint
+            class and the requests in flight, can be shared between clients
+            models (bool): Return typed models (Transaction, Balance, Page,
+            ...) instead of dicts, see the models module
+            json_decoder (JSONDecoder): Decoder of response bodies, defaults
+            to the fastest installed JSON backend
+            user_resolver (UserResolver): Cache of the user ids looked up by
+            get_user_id(), can be shared between clients
+        """
+
+        if aiohttp is None:
+            raise ImportError("AsyncTiramisuClient requires aiohttp, install it with 'pip install tiramisu-wallet-client[async]'")
+
+        self._owns_session = session is None
+        self._pool_maxsize = pool_maxsize
+        self._keep_alive = keep_alive
+
+        self.session = session
+
+        if isinstance(timeout, tuple):
+            self.timeout = aiohttp.ClientTimeout(connect=timeout[0], sock_read=timeout[1])
+        else:
+            self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+        self.base_url = resolve_base_url(network, server_url)
+
+        self._owns_waiter = waiter is None
+        self.waiter = waiter or AsyncTransactionWaiter(self)
+
+        self.cache = cache
+        self.hooks = list(hooks or [])
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.models = models
+        self.json_decoder = json_decoder or get_decoder()
+        self.user_resolver = user_resolver or UserResolver()
+        self._event_hub = None
+
+        self.username = username
+        self.password = password
+
+        self.token_store = token_store
+        self.auth_token = auth_token
+        self._btc_asset_id = btc_asset_id
+        self._register_new_user = register_new_user
+        self._auth_lock = None
+
+        if token_store is not None and auth_token is None:
+            stored = token_store.load(token_key(self.base_url, username))
+
+            if stored:
+                self.auth_token = stored.get("auth_token")
+                self._btc_asset_id = self._btc_asset_id or stored.get("btc_asset_id")
+
+    @classmethod
+    def from_token(cls, username:str, auth_token:str, btc_asset_id:int=None, password:str=None, **kwargs):
+        """
+        Create a client from credentials obtained earlier
+
+        Args:
+            username (str):
+            auth_token (str):
+            btc_asset_id (int): Looked up on first use when not given
+            password (str): Needed to log in again when the token is rejected
+            **kwargs: Other arguments of AsyncTiramisuClient
+        """
+
+        return cls(username, password, auth_token=auth_token, btc_asset_id=btc_asset_id, **kwargs)
+
+    async def login(self):
+        """
+        Get an auth token and look up the BTC asset unless they are known
+        """
+
+        await self._run(login(self))
+
+        return self
+
+    @property
+    def btc_asset_id(self) -> int:
+        """
+        Id of the BTC asset, None until login() or the first call needing it
+        """
+
+        return self._btc_asset_id
+
+    @btc_asset_id.setter
+    def btc_asset_id(self, value:int):
+        self._btc_asset_id = value
+
+    @property
+    def event_hub(self) -> AsyncEventHub:
+        """
+        Hub feeding stream_events(), created on first use. Assign an
+        AsyncEventHub(client, ...) before streaming to configure it
+        """
+
+        if self._event_hub is None:
+            self._event_hub = AsyncEventHub(self)
+
+        return self._event_hub
+
+    @event_hub.setter
+    def event_hub(self, value:AsyncEventHub):
+        self._event_hub = value
+
+    @property
+    def headers(self) -> dict:
+        return {'Authorization':f'Token {self.auth_token}'}
+
+    async def _authenticate(self, rejected_token:str):
+        """
+        Log in unless another task replaced the rejected token meanwhile
+        """
+
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+
+        async with self._auth_lock:
+            if self.auth_token == rejected_token:
+                await self._run(authenticate(self))
+
+    async def __aenter__(self):
+        return await self.login()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @staticmethod
+    def _endpoint_method(op):
+
+        async def method(self, *args, **kwargs):
+            return await self._run(op(self, *args, **kwargs))
+
+        return method
+
+    @staticmethod
+    def _iter_method(name):
+
+        def method(self, page_size:int=100, prefetch:bool=False, concurrency:int=1, ordered:bool=True, **filters):
+            return aiter_results(functools.partial(getattr(self, name), **filters), page_size=page_size, prefetch=prefetch, concurrency=concurrency, ordered=ordered)
+
+        return method
+
+    async def _run(self, operation):
+        """
+        Execute the requests yielded by an endpoint generator and return its result
+        """
+
+        result, error = None, None
+
+        while True:
+            try:
+                if error is not None:
+                    step = operation.throw(error)
+                else:
+                    step = operation.send(result)
+            except StopIteration as stop:
+                return stop.value
+
+            result, error = None, None
+
+            try:
+                if isinstance(step, WaitStatus):
+                    result = await self.waiter.wait(step.transaction_id, step.status_wait_for, client=self, timeout=step.timeout)
+                elif isinstance(step, Sleep):
+                    await asyncio.sleep(step.seconds)
+                else:
+                    result = await self._send(step)
+
+                    if self.models and step.decode:
+                        result = decode_response(step.name, result)
+            except Exception as e:
+                error = e
+
+    def _get_session(self):
+
+        if self.session is None:
+            self.session = create_async_session(limit=self._pool_maxsize, keep_alive=self._keep_alive)
+
+        return self.session
+
+    async def _send(self, request):
+
+        if self.cache is not None and self.cache.cacheable(request):
+            cache_key = self.cache.key(self.base_url, request)
+            cached = self.cache.get(cache_key, request.name)
+
+            if cached is not None:
+                return cached
+
+            result = await self._fetch_retrying(request)
+            self.cache.set(cache_key, request.name, result)
+
+            return result
+
+        result = await self._fetch_retrying(request)
+
+        if self.cache is not None:
+            for name in request.invalidates:
+                self.cache.invalidate(name)
+
+        return result
+
+    async def _fetch_retrying(self, request):
+
+        self.retry_policy.record_request()
+
+        attempt = 1
+
+        while True:
+            try:
+                return await self._fetch(request)
+            except Exception as error:
+                delay = self.retry_policy.retry_delay(request, attempt, self._error_info(error))
+
+                if delay is None:
+                    raise
+
+                logger.debug("Retrying %s %s in %.2fs after attempt %s failed: %r", request.method, request.url, delay, attempt, error, extra={"event": "retry", "endpoint": request.name, "attempt": attempt, "delay": delay})
+
+                await asyncio.sleep(delay)
+
+                attempt += 1
+
+    def _error_info(self, error:Exception) -> ErrorInfo:
+        """
+        Describe a failed request for the retry policy, None if it is not an HTTP or transport error
+        """
+
+        if isinstance(error, RequestError):
+            return ErrorInfo(status=error.status, retry_after=error.retry_after)
+
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return ErrorInfo(sent=False)
+
+        if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+            return ErrorInfo()
+
+        return None
+
+    async def _fetch(self, request):
+
+        if request.auth and self.auth_token is None:
+            await self._authenticate(None)
+
+        token = self.auth_token
+
+        status, retry_after, body = await self._perform_limited(request)
+
+        if status == 401 and request.auth and self.password is not None:
+            await self._authenticate(token)
+
+            status, retry_after, body = await self._perform_limited(request)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            url = self.base_url + request.url
+            logger.debug("%s %s -> %s", request.method, url, status, extra={"event": "http_response", "method": request.method, "url": url, "status": status, "endpoint": request.name})
+
+        if status >= 400:
+            raise RequestError(body.decode(errors="replace"), status=status, retry_after=parse_retry_after(retry_after))
+
+        if request.decode:
+            return self.json_decoder.loads(body)
+
+    async def _perform_limited(self, request):
+        """
+        Wait for the rate limiter before the HTTP call and report the status to it
+        """
+
+        if self.rate_limiter is None:
+            return await self._perform(request)
+
+        async with self.rate_limiter.limit_async(request):
+            status, retry_after, body = await self._perform(request)
+
+        self.rate_limiter.record(request, status, parse_retry_after(retry_after))
+
+        return status, retry_after, body
+
+    async def _perform(self, request):
+        """
+        Make the HTTP call of a request and report it to the hooks
+        """
+
+        headers = self.headers if request.auth else None
+
+        if request.idempotency_key is not None:
+            headers = dict(headers or {}, **{"Idempotency-Key": request.idempotency_key})
+
+        if request.files:
+            encoder = MultipartEncoder(request.data, request.files)
+            headers = dict(headers or {}, **encoder.headers)
+            data = _stream(encoder)
+        else:
+            data = request.data
+
+        status, bytes_sent, body, error = None, 0, b"", None
+        start = time.perf_counter()
+
+        try:
+            async with self._get_session().request(request.method, self.base_url + request.url, params=request.params, data=data, headers=headers, timeout=self.timeout) as res:
+                status = res.status
+                bytes_sent = int(res.request_info.headers.get("Content-Length") or 0)
+                body = await res.read()
+
+                return status, res.headers.get("Retry-After"), body
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.hooks:
+                emit(self.hooks, RequestEvent(request.name, request.method, self.base_url + request.url, status, bytes_sent, len(body), time.perf_counter() - start, error))
+
+    async def send_internal_many(self, items, max_concurrency:int=8, journal:SendJournal=None, status_wait_for:str='internal_finished', timeout:float=None, idempotency_prefix:str=None) -> BulkSendReport:
+        """
+        Send many internal transfers with bounded concurrency and wait for
+        all of them with the shared waiter, see bulk.send_internal_many
+
+        Args:
+            items (iterable): (destination_user, asset, amount, description)
+            tuples, optionally with a unique key as fifth element
+            max_concurrency (int): Maximum number of transfers submitted at once
+            journal (SendJournal): Journal making the batch resumable
+            status_wait_for (str): Status of a finished transfer
+            timeout (float): Seconds to wait for each transaction
+            idempotency_prefix (str): Send every transfer with the
+            idempotency key prefix + key
+
+        Returns:
+            BulkSendReport with one SendResult per item
+        """
+
+        return await asend_internal_many(self, items, max_concurrency=max_concurrency, journal=journal, status_wait_for=status_wait_for, timeout=timeout, idempotency_prefix=idempotency_prefix)
+
+    async def assets_mint_nft_many(self, manifest, max_concurrency:int=4, journal:SendJournal=None, timeout:float=None, progress=None) -> MintReport:
+        """
+        Mint the NFTs of a CSV or JSON manifest with bounded concurrency and
+        wait until all are minted, see minting.assets_mint_nft_many
+
+        Args:
+            manifest: Path of the manifest or list of dicts with name,
+            description and image
+            max_concurrency (int): Maximum number of images uploaded at once
+            journal (SendJournal): Checkpoint file making the run resumable
+            timeout (float): Seconds to wait for each minting transaction
+            progress (callable): Called as progress(key, bytes_sent, total_bytes)
+
+        Returns:
+            MintReport with one SendResult per item
+        """
+
+        return await aassets_mint_nft_many(self, manifest, max_concurrency=max_concurrency, journal=journal, timeout=timeout, progress=progress)
+
+    async def get_user_ids(self, usernames, max_concurrency:int=8) -> dict:
+        """
+        Ids of many users with bounded concurrency, see users.get_user_ids
+
+        Cached ids are used without a lookup. The resolver is saved
+        afterwards when it has a path.
+
+        Args:
+            usernames (iterable):
+            max_concurrency (int): Maximum number of lookups at once
+
+        Returns:
+            dict of username to user id, None for usernames without a user
+        """
+
+        return await aget_user_ids(self, usernames, max_concurrency=max_concurrency)
+
+    def stream_events(self, cursor=None, kinds=KINDS, timeout:float=None):
+        """
+        Yield new notifications and transaction status changes as they happen
+
+        All streams of the client share one EventHub, which polls the
+        server (or reads its event push, see EventHub) once for all of
+        them.
+
+        Args:
+            cursor (EventCursor or str): Position to resume from and to
+            record seen events to, a path for a cursor saved to a file.
+            Without a cursor the stream starts now
+            kinds (tuple): Event kinds to yield, "notification" and/or "transaction"
+            timeout (float): End the stream after this many seconds without
+            an event, None to wait forever
+
+        Returns:
+            async generator of Event, use with async for
+        """
+
+        return self.event_hub.stream(cursor=cursor, kinds=kinds, timeout=timeout)
+
+    async def close(self):
+        """
+        Close the connection pool of the client unless it was passed in
+        and is shared with other clients
+        """
+
+        self.user_resolver.save()
+        await self._release()
+
+    async def _release(self):
+        """
+        Close what the client owns, leaving the user resolver to its owner
+        """
+
+        if self._event_hub is not None:
+            await self._event_hub.close()
+
+        if self._owns_waiter:
+            await self.waiter.close()
+
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+async def _stream(encoder:MultipartEncoder):
+    """
+    Body of a streamed upload for aiohttp, the Content-Length header keeps
+    it from being sent chunked. Chunks are read in the default executor so
+    file reads do not block the event loop
+    """
+
+    loop = asyncio.get_running_loop()
+    chunks = iter(encoder)
+
+    while True:
+        chunk = await loop.run_in_executor(None, next, chunks, None)
+
+        if chunk is None:
+            return
+
+        yield chunk
@@ -0,0 +1,526 @@
+"""
+Bulk internal transfers.
+
+send_internal_many() submits transfers with bounded concurrency and hands
+every created transaction to the shared waiter of the client, so a batch
+is tracked by one poller however large it is. A SendJournal makes a batch
+resumable: every transfer is recorded before it is sent, when it was
+created and when it reached its final state. A resumed batch never
+sends a transfer again once it may have been created and waits again for
+the transactions that timed out. Transfers that were
+interrupted in flight are looked up by description and must match in
+currency and amount. Use descriptions unique to each transfer (e.g. with
+a batch reference) to resume exactly.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+from .exceptions import TransactionError, TransactionTimeout
+from .models import currency_id
+
+FINISHED = "finished"
+ERROR = "error"
+TIMEOUT = "timeout"
+FAILED = "failed"
+
+SUBMITTING = "submitting"
+SUBMITTED = "submitted"
+
+
+class SendResult():
+    """
+    Outcome of one item of a batch
+
+    Args:
+        key (str): Key of the item in the batch and the journal
+        item: Item of the batch, e.g. (destination_user, asset, amount, description)
+        status (str): "finished", "error" (the transaction ended in
+        'error'), "timeout" or "failed" (submitting or polling failed)
+        transaction (dict): Last state of the transaction, None when unknown
+        error (Exception): Error of a failed transfer
+        latency (float): Seconds from submitting the item to its final
+        state, None for items finished by an earlier run
+    """
+
+    __slots__ = ("key", "item", "status", "transaction", "error", "latency")
+
+    def __init__(self, key:str, item:tuple, status:str, transaction:dict=None, error:Exception=None, latency:float=None) -> None:
+        self.key = key
+        self.item = item
+        self.status = status
+        self.transaction = transaction
+        self.error = error
+        self.latency = latency
+
+    @property
+    def transaction_id(self) -> int:
+        return self.transaction["id"] if self.transaction is not None else None
+
+    def __repr__(self) -> str:
+        return f"SendResult(key={self.key!r}, status={self.status!r}, transaction_id={self.transaction_id!r})"
+
+
+class BulkSendReport():
+    """
+    Results of a batch in the order of its items
+
+    Args:
+        results (list): SendResult per item
+        elapsed (float): Seconds the batch took
+    """
+
+    def __init__(self, results:list, elapsed:float=None) -> None:
+        self.results = results
+        self.elapsed = elapsed
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def by_status(self, status:str) -> list:
+        return [result for result in self.results if result.status == status]
+
+    @property
+    def finished(self) -> list:
+        return self.by_status(FINISHED)
+
+    @property
+    def errored(self) -> list:
+        return self.by_status(ERROR)
+
+    @property
+    def timed_out(self) -> list:
+        return self.by_status(TIMEOUT)
+
+    @property
+    def failed(self) -> list:
+        return self.by_status(FAILED)
+
+    @property
+    def ok(self) -> bool:
+        return all(result.status == FINISHED for result in self.results)
+
+    @property
+    def throughput(self) -> float:
+        """
+        Finished items per second
+        """
+
+        if not self.elapsed:
+            return None
+
+        return len(self.finished) / self.elapsed
+
+    def summary(self) -> dict:
+        counts = {FINISHED: 0, ERROR: 0, TIMEOUT: 0, FAILED: 0}
+
+        for result in self.results:
+            counts[result.status] += 1
+
+        return counts
+
+    def __str__(self) -> str:
+        counts = self.summary()
+        text = f"{counts[FINISHED]}/{len(self.results)} finished"
+
+        if self.elapsed is not None:
+            text += f" in {self.elapsed:.1f}s ({self.throughput:.2f}/s)"
+
+        return text + f", {counts[ERROR]} error, {counts[TIMEOUT]} timeout, {counts[FAILED]} failed"
+
+
+class SendJournal():
+    """
+    Append-only JSON lines file recording the progress of a batch
+
+    Args:
+        path (str): Path of the journal, reused to resume a batch
+        fsync (bool): Sync every record to disk, not only to the OS
+    """
+
+    def __init__(self, path:str, fsync:bool=True) -> None:
+        self.path = path
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> dict:
+        """
+        Last record of every key found in the journal
+        """
+
+        records = {}
+
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # line cut short by an interruption
+                        continue
+
+                    records[record["key"]] = record
+        except FileNotFoundError:
+            pass
+
+        return records
+
+    def record(self, key:str, state:str, transaction_id:int=None, error:str=None):
+        line = json.dumps({"key": key, "state": state, "transaction_id": transaction_id, "error": error}) + "\n"
+
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+
+            self._file.write(line)
+            self._file.flush()
+
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _keyed(items) -> list:
+    """
+    Pair every item with its key, the key is a fifth element of the item or
+    derived from its fields, numbered when the same transfer repeats
+    """
+
+    keyed = []
+    seen = {}
+
+    for item in items:
+        item = tuple(item)
+
+        if len(item) > 4:
+            key, item = str(item[4]), item[:4]
+        else:
+            key = ":".join(str(field) for field in item)
+            seen[key] = seen.get(key, 0) + 1
+
+            if seen[key] > 1:
+                key = f"{key}#{seen[key]}"
+
+        keyed.append((key, item))
+
+    return keyed
+
+
+def _claimed_ids(records:dict) -> set:
+    return {record["transaction_id"] for record in records.values() if record.get("transaction_id") is not None}
+
+
+def _unclaimed(candidates:list, claimed:set) -> int:
+    """
+    First candidate transaction id not taken by another item
+    """
+
+    for transaction_id in candidates:
+        if transaction_id not in claimed:
+            return transaction_id
+
+    return None
+
+
+def _same_transfer(transaction_dict:dict, item:tuple) -> bool:
+    """
+    Whether a transaction has the currency and amount of a transfer, and its
+    destination when the transaction shows one
+    """
+
+    destination_user, asset, amount = item[:3]
+    destination = transaction_dict.get("destination_user")
+
+    return (
+        "amount" in transaction_dict
+        and str(transaction_dict["amount"]) == str(amount)
+        and str(currency_id(transaction_dict)) == str(asset)
+        and (destination is None or str(destination) == str(destination_user))
+    )
+
+
+def _matching_transactions(page:dict, item:tuple) -> list:
+    """
+    Ids of the transactions that an interrupted transfer may have created
+    """
+
+    return [transaction_dict["id"] for transaction_dict in page["results"] if _same_transfer(transaction_dict, item)]
+
+
+def _result(key:str, item:tuple, transaction_dict:dict=None, error:Exception=None) -> SendResult:
+
+    if error is None:
+        return SendResult(key, item, FINISHED, transaction_dict)
+
+    if isinstance(error, TransactionError):
+        return SendResult(key, item, ERROR, error.transaction, error)
+
+    if isinstance(error, TransactionTimeout):
+        return SendResult(key, item, TIMEOUT, transaction_dict, error)
+
+    return SendResult(key, item, FAILED, transaction_dict, error)
+
+
+def _from_record(key:str, item:tuple, record:dict) -> SendResult:
+    transaction_dict = {"id": record["transaction_id"]} if record.get("transaction_id") is not None else None
+
+    return SendResult(key, item, record["state"], transaction_dict)
+
+
+def _record_final(journal:SendJournal, key:str, result:SendResult):
+    if journal is not None:
+        journal.record(key, result.status, result.transaction_id, None if result.error is None else repr(result.error))
+
+
+def run_batch(client, keyed:list, send, lookup, journal:SendJournal=None, max_concurrency:int=8, status_wait_for:str=None, timeout:float=None) -> BulkSendReport:
+    """
+    Submit items with bounded concurrency and wait for their transactions
+    with the shared waiter of the client, resuming from the journal
+
+    Args:
+        client (TiramisuClient):
+        keyed (list): (key, item) pairs
+        send (callable): send(key, item) submits an item and returns the id
+        of the transaction to wait for
+        lookup (callable): lookup(key, item) returns the ids of transactions
+        an interrupted submission of the item may have created
+        journal (SendJournal): Journal to record progress to and resume from
+        max_concurrency (int): Maximum number of items submitted at once
+        status_wait_for (str): Status of a finished transaction
+        timeout (float): Seconds to wait for each transaction
+
+    Returns:
+        BulkSendReport in the order of keyed
+    """
+
+    started = time.monotonic()
+    records = journal.load() if journal is not None else {}
+    claimed = _claimed_ids(records)
+    claimed_lock = threading.Lock()
+    submitted_at = {}
+    finished_at = {}
+
+    def submit(key, item):
+        record = records.get(key)
+
+        if record is not None and record["state"] in (FINISHED, ERROR):
+            return _from_record(key, item, record)
+
+        if record is not None and record["state"] in (SUBMITTED, TIMEOUT, FAILED) and record.get("transaction_id") is not None:
+            return record["transaction_id"]
+
+        try:
+            if record is not None and record["state"] in (SUBMITTING, FAILED):
+                candidates = lookup(key, item)
+
+                with claimed_lock:
+                    landed = _unclaimed(candidates, claimed)
+
+                    if landed is not None:
+                        claimed.add(landed)
+
+                if landed is not None:
+                    if journal is not None:
+                        journal.record(key, SUBMITTED, landed)
+
+                    return landed
+
+            if journal is not None:
+                journal.record(key, SUBMITTING)
+
+            transaction_id = send(key, item)
+        except Exception as e:
+            # the journal keeps the item in "submitting", a resumed batch
+            # looks it up before submitting it again
+            return SendResult(key, item, FAILED, None, e, latency=time.monotonic() - submitted_at[key])
+
+        with claimed_lock:
+            claimed.add(transaction_id)
+
+        if journal is not None:
+            journal.record(key, SUBMITTED, transaction_id)
+
+        return transaction_id
+
+    def watch(key, item, transaction_id):
+        future = client.waiter.watch(transaction_id, status_wait_for, client=client, timeout=timeout)
+
+        def done(future):
+            finished_at[key] = time.monotonic()
+
+            try:
+                result = _result(key, item, future.result())
+            except Exception as e:
+                result = _result(key, item, {"id": transaction_id}, e)
+
+            _record_final(journal, key, result)
+
+        future.add_done_callback(done)
+
+        return future
+
+    def track(key, item):
+        submitted_at[key] = time.monotonic()
+        outcome = submit(key, item)
+
+        if isinstance(outcome, SendResult):
+            return outcome
+
+        return outcome, watch(key, item, outcome)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tiramisu-bulk") as executor:
+        tracked = [executor.submit(track, key, item) for key, item in keyed]
+
+    results = []
+
+    for (key, item), outcome in zip(keyed, tracked):
+        outcome = outcome.result()
+
+        if isinstance(outcome, SendResult):
+            results.append(outcome)
+            continue
+
+        transaction_id, future = outcome
+
+        try:
+            result = _result(key, item, future.result())
+        except Exception as e:
+            result = _result(key, item, {"id": transaction_id}, e)
+
+        # the done callback may still be running
+        result.latency = finished_at.get(key, time.monotonic()) - submitted_at[key]
+        results.append(result)
+
+    return BulkSendReport(results, elapsed=time.monotonic() - started)
+
+
+async def arun_batch(client, keyed:list, send, lookup, journal:SendJournal=None, max_concurrency:int=8, status_wait_for:str=None, timeout:float=None) -> BulkSendReport:
+    """
+    asyncio counterpart of run_batch, send and lookup are coroutine functions
+    """
+
+    started = time.monotonic()
+    records = journal.load() if journal is not None else {}
+    claimed = _claimed_ids(records)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    submitted_at = {}
+
+    async def submit(key, item):
+        record = records.get(key)
+
+        if record is not None and record["state"] in (FINISHED, ERROR):
+            return _from_record(key, item, record)
+
+        if record is not None and record["state"] in (SUBMITTED, TIMEOUT, FAILED) and record.get("transaction_id") is not None:
+            return record["transaction_id"]
+
+        async with semaphore:
+            submitted_at[key] = time.monotonic()
+
+            try:
+                if record is not None and record["state"] in (SUBMITTING, FAILED):
+                    landed = _unclaimed(await lookup(key, item), claimed)
+
+                    if landed is not None:
+                        claimed.add(landed)
+
+                        if journal is not None:
+                            journal.record(key, SUBMITTED, landed)
+
+                        return landed
+
+                if journal is not None:
+                    journal.record(key, SUBMITTING)
+
+                transaction_id = await send(key, item)
+            except Exception as e:
+                return SendResult(key, item, FAILED, None, e, latency=time.monotonic() - submitted_at[key])
+
+        claimed.add(transaction_id)
+
+        if journal is not None:
+            journal.record(key, SUBMITTED, transaction_id)
+
+        return transaction_id
+
+    async def track(key, item):
+        tracked_at = time.monotonic()
+        outcome = await submit(key, item)
+
+        if isinstance(outcome, SendResult):
+            return outcome
+
+        try:
+            result = _result(key, item, await client.waiter.watch(outcome, status_wait_for, client=client, timeout=timeout))
+        except Exception as e:
+            result = _result(key, item, {"id": outcome}, e)
+
+        result.latency = time.monotonic() - submitted_at.get(key, tracked_at)
+        _record_final(journal, key, result)
+
+        return result
+
+    results = await asyncio.gather(*(track(key, item) for key, item in keyed))
+
+    return BulkSendReport(list(results), elapsed=time.monotonic() - started)
+
+
+def send_internal_many(client, items, max_concurrency:int=8, journal:SendJournal=None, status_wait_for:str='internal_finished', timeout:float=None, idempotency_prefix:str=None) -> BulkSendReport:
+    """
+    Send many internal transfers and wait for all of them
+
+    Args:
+        client (TiramisuClient):
+        items (iterable): (destination_user, asset, amount, description)
+        tuples, optionally with a unique key as fifth element
+        max_concurrency (int): Maximum number of transfers submitted at once
+        journal (SendJournal): Journal to record progress to and resume from
+        status_wait_for (str): Status of a finished transfer
+        timeout (float): Seconds to wait for each transaction, None for the
+        waiter default
+        idempotency_prefix (str): Send every transfer with the idempotency
+        key prefix + key, for servers deduplicating on Idempotency-Key
+
+    Returns:
+        BulkSendReport in the order of items
+    """
+
+    def send(key, item):
+        idempotency_key = None if idempotency_prefix is None else idempotency_prefix + key
+
+        return client.transactions_send_internal(*item, idempotency_key=idempotency_key)["id"]
+
+    def lookup(key, item):
+        return _matching_transactions(client.transactions(description=item[3]), item)
+
+    return run_batch(client, _keyed(items), send, lookup, journal=journal, max_concurrency=max_concurrency, status_wait_for=status_wait_for, timeout=timeout)
+
+
+async def asend_internal_many(client, items, max_concurrency:int=8, journal:SendJournal=None, status_wait_for:str='internal_finished', timeout:float=None, idempotency_prefix:str=None) -> BulkSendReport:
+    """
+    asyncio counterpart of send_internal_many for AsyncTiramisuClient
+    """
+
+    async def send(key, item):
+        idempotency_key = None if idempotency_prefix is None else idempotency_prefix + key
+
+        return (await client.transactions_send_internal(*item, idempotency_key=idempotency_key))["id"]
+
+    async def lookup(key, item):
+        return _matching_transactions(await client.transactions(description=item[3]), item)
+
+    return await arun_batch(client, _keyed(items), send, lookup, journal=journal, max_concurrency=max_concurrency, status_wait_for=status_wait_for, timeout=timeout)
@@ -0,0 +1,181 @@
+"""
+Response cache for read-mostly endpoints.
+
+Only GET requests of endpoints listed in the TTL table are cached. Cached
+responses are shared by all clients using the same cache and must be
+treated as read-only.
+"""
+
+import collections
+import json
+import sqlite3
+import threading
+import time
+
+# Seconds a response of the endpoint stays valid
+DEFAULT_TTLS = {
+    "asset": 3600,
+    "collection": 3600,
+    "assets": 300,
+    "nfts": 300,
+    "collections": 300,
+}
+
+
+class MemoryCacheBackend():
+    """
+    In-process LRU store
+
+    Args:
+        maxsize (int): Maximum number of cached responses
+    """
+
+    def __init__(self, maxsize:int=1024) -> None:
+        self.maxsize = maxsize
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key:str):
+        """
+        Return (expires, value) or None
+        """
+
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is not None:
+                self._items.move_to_end(key)
+
+            return item
+
+    def set(self, key:str, value, expires:float):
+        with self._lock:
+            self._items[key] = (expires, value)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def delete_prefix(self, prefix:str):
+        with self._lock:
+            for key in [key for key in self._items if key.startswith(prefix)]:
+                del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteCacheBackend():
+    """
+    LRU store in a sqlite database so cached responses survive restarts
+
+    Expiry times are stored as wall clock time.
+
+    Args:
+        path (str): Path of the database file
+        maxsize (int): Maximum number of cached responses
+    """
+
+    def __init__(self, path:str, maxsize:int=10000) -> None:
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)")
+        self._db.commit()
+
+    def get(self, key:str):
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            self._db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+
+        return (row[1], json.loads(row[0]))
+
+    def set(self, key:str, value, expires:float):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)", (key, json.dumps(value), expires, time.time()))
+            self._db.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+            self._db.commit()
+
+    def delete_prefix(self, prefix:str):
+        with self._lock:
+            self._db.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+class ResponseCache():
+    """
+    TTL cache of decoded responses keyed by endpoint, URL and parameters
+
+    Args:
+        ttls (dict): Seconds a response stays valid per endpoint name,
+        defaults to DEFAULT_TTLS. Endpoints missing from it are not cached
+        backend: MemoryCacheBackend (default) or SQLiteCacheBackend
+        maxsize (int): Size of the default memory backend
+    """
+
+    def __init__(self, ttls:dict=None, backend=None, maxsize:int=1024) -> None:
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.backend = backend if backend is not None else MemoryCacheBackend(maxsize=maxsize)
+
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+        # sqlite backend stores wall clock expiry times
+        self._clock = time.monotonic if isinstance(self.backend, MemoryCacheBackend) else time.time
+
+    def cacheable(self, request) -> bool:
+        return request.method == "GET" and request.name in self.ttls
+
+    def key(self, base_url:str, request) -> str:
+        params = json.dumps(request.params, sort_keys=True, default=str)
+
+        return f"{request.name}|{base_url}{request.url}|{params}"
+
+    def get(self, key:str, name:str):
+        """
+        Return the cached response or None
+        """
+
+        item = self.backend.get(key)
+
+        if item is not None and item[0] > self._clock():
+            self.hits[name] += 1
+            return item[1]
+
+        self.misses[name] += 1
+
+        return None
+
+    def set(self, key:str, name:str, value):
+        self.backend.set(key, value, self._clock() + self.ttls[name])
+
+    def invalidate(self, name:str=None):
+        """
+        Drop the cached responses of one endpoint, or of all endpoints
+        """
+
+        self.backend.delete_prefix(f"{name}|" if name else "")
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counters, in total and per endpoint
+        """
+
+        return {
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "size": len(self.backend),
+            "endpoints": {name: {"hits": self.hits[name], "misses": self.misses[name]} for name in set(self.hits) | set(self.misses)},
+        }
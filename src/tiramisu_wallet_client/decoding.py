@@ -0,0 +1,105 @@
+"""
+Pluggable JSON decoding of response bodies.
+
+Clients decode every response body with a JSONDecoder. The default one
+uses orjson or msgspec when installed, which decode large transactions
+and assets pages several times faster than the json module, and falls
+back to json otherwise. All backends take the raw bytes of the body, so
+no text copy of it is made, and raise ValueError on invalid JSON.
+"""
+
+import json
+
+# backends in order of preference for get_decoder()
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _json_loads():
+    return json.loads
+
+
+def _orjson_loads():
+    import orjson
+
+    return orjson.loads
+
+
+def _msgspec_loads():
+    import msgspec
+
+    decode = msgspec.json.Decoder().decode
+
+    def loads(data):
+        try:
+            return decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    return loads
+
+
+_LOADERS = {
+    "json": _json_loads,
+    "orjson": _orjson_loads,
+    "msgspec": _msgspec_loads,
+}
+
+
+class JSONDecoder():
+    """
+    Decoder of response bodies
+
+    Args:
+        backend (str): "orjson", "msgspec" or "json", None for the fastest
+        installed one
+    """
+
+    def __init__(self, backend:str=None) -> None:
+        if backend is None:
+            backend = available_backends()[0]
+
+        if backend not in _LOADERS:
+            raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+        self.backend = backend
+        self.loads = _LOADERS[backend]()
+
+    def __repr__(self) -> str:
+        return f"JSONDecoder({self.backend!r})"
+
+
+def available_backends() -> list:
+    """
+    Installed backends, fastest first
+    """
+
+    available = []
+
+    for backend in BACKENDS:
+        try:
+            _LOADERS[backend]()
+        except ImportError:
+            continue
+
+        available.append(backend)
+
+    return available
+
+
+_default = None
+
+
+def get_decoder(backend:str=None) -> JSONDecoder:
+    """
+    Decoder of a backend, the shared default decoder when backend is None
+    """
+
+    global _default
+
+    if backend is not None:
+        return JSONDecoder(backend)
+
+    if _default is None:
+        _default = JSONDecoder()
+
+    return _default
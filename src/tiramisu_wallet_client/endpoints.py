@@ -0,0 +1,812 @@
+"""
+Endpoint definitions shared by TiramisuClient and AsyncTiramisuClient.
+
+Every endpoint is a generator function that takes the client as first
+argument, yields Request (and Sleep) objects and receives the decoded
+response of every Request back. Waiting for a transaction status is
+yielded as a WaitStatus step and handled by the transaction waiter of the
+client. The sync and async clients only differ in how they execute the
+yielded steps, so each endpoint is written once.
+"""
+
+import collections
+import functools
+import threading
+
+from .models import currency_id
+from .tokens import token_key
+from .upload import Upload
+
+
+class Request():
+    """
+    Description of a single HTTP call to the walletapp API
+
+    Args:
+        name (str): Name of the endpoint making the call
+        method (str): HTTP method
+        url (str): URL relative to the base URL of the client
+        params (dict): Query string parameters
+        data (dict): Form fields
+        files (dict): Multipart files as Upload objects or in the format
+        accepted by requests, sent streamed by upload.MultipartEncoder
+        auth (bool): Send the authorization token of the client
+        decode (bool): Decode the JSON body of the response
+        invalidates (tuple): Endpoints whose cached responses are dropped
+        once the request succeeds
+        idempotency_key (str): Sent as Idempotency-Key header, makes the
+        request safe to retry
+    """
+
+    def __init__(self, name:str, method:str, url:str, params:dict=None, data:dict=None, files:dict=None, auth:bool=True, decode:bool=True, invalidates:tuple=(), idempotency_key:str=None) -> None:
+        self.name = name
+        self.method = method
+        self.url = url
+        self.params = params
+        self.data = data
+        self.files = files
+        self.auth = auth
+        self.decode = decode
+        self.invalidates = invalidates
+        self.idempotency_key = idempotency_key
+
+    def __repr__(self):
+        return f"Request({self.method} {self.url})"
+
+
+class Sleep():
+    """
+    Pause the running endpoint
+
+    Args:
+        seconds (float):
+    """
+
+    def __init__(self, seconds:float) -> None:
+        self.seconds = seconds
+
+
+class WaitStatus():
+    """
+    Wait until a transaction reaches a status
+
+    Args:
+        transaction_id (int):
+        status_wait_for (str):
+        timeout (float): Seconds to wait, None for the waiter default
+    """
+
+    def __init__(self, transaction_id:int, status_wait_for:str, timeout:float=None) -> None:
+        self.transaction_id = transaction_id
+        self.status_wait_for = status_wait_for
+        self.timeout = timeout
+
+
+ENDPOINTS = {}
+
+# List endpoints taking offset/limit, each gets an iter_<name> method
+PAGED_ENDPOINTS = (
+    "balances",
+    "balances_rgb",
+    "balances_nft",
+    "assets",
+    "nfts",
+    "collections",
+    "notifications",
+    "transactions",
+    "listings",
+    "listings_nfts",
+    "listings_my",
+)
+
+
+def endpoint(func):
+    ENDPOINTS[func.__name__] = func
+    return func
+
+
+def bind_endpoints(cls):
+    """
+    Class decorator adding a method for every endpoint
+
+    The client class has to provide _endpoint_method(op) returning the
+    method that runs the endpoint and _iter_method(name) returning the
+    method iterating over all results of a paginated endpoint. Methods
+    defined on the class itself take precedence.
+    """
+
+    for name, op in ENDPOINTS.items():
+        if name not in cls.__dict__:
+            setattr(cls, name, functools.wraps(op)(cls._endpoint_method(op)))
+
+    for name in PAGED_ENDPOINTS:
+        iter_name = f"iter_{name}"
+
+        if iter_name not in cls.__dict__:
+            method = cls._iter_method(name)
+            method.__name__ = method.__qualname__ = iter_name
+            method.__doc__ = f"""
+    Iterate over the results of all pages of {name}()
+
+    Args:
+        page_size (int): Number of results requested per page
+        prefetch (bool): Fetch the next page in the background while the
+        current one is consumed
+        concurrency (int): Number of pages fetched in parallel once the
+        count is known from the first page
+        ordered (bool): Keep the order of the pages when fetching in
+        parallel, otherwise yield them as they arrive
+        **filters: Other keyword arguments of {name}()
+    """
+            setattr(cls, iter_name, method)
+
+    return cls
+
+
+def resolve_base_url(network:str, server_url:str=None) -> str:
+
+    if server_url:
+        return server_url
+
+    if network=='testnet':
+        return "https://testnet.tarowallet.net/walletapp/"
+    elif network=='mainnet':
+        return "https://mainnet.tiramisuwallet.com/walletapp/"
+
+    raise Exception(f"Unknown value '{network}' supplies for network argument.")
+
+
+def _upload(file_path, progress=None):
+    """
+    Upload streaming a picture, file_path may also be a file object, a
+    bytes-like object or an Upload
+    """
+
+    if file_path is None:
+        return None
+
+    if isinstance(file_path, Upload):
+        if progress is not None:
+            file_path.progress = progress
+
+        return file_path
+
+    return Upload(file_path, progress=progress)
+
+
+def _transactions_by_description(client, description:str):
+
+    page = yield from transactions(client, description=description)
+
+    return {transaction_dict["id"]: transaction_dict for transaction_dict in page["results"]}
+
+
+# confirmed sends in progress per (server, user, description), a transaction
+# of another one of them cannot be told apart from one of this call
+_confirming = collections.Counter()
+_confirming_lock = threading.Lock()
+
+
+def _same_send(transaction_dict:dict, request:Request) -> bool:
+    """
+    Whether a transaction has the currency and amount of a send request
+    """
+
+    return str(currency_id(transaction_dict)) == str(request.data["currency"]) and str(transaction_dict.get("amount")) == str(request.data["amount"])
+
+
+def _send_confirmed(client, request:Request, description:str):
+    """
+    Send a request creating a transaction with the given description
+
+    Without idempotency key the request is only retried when the retry
+    policy allows confirmed sends and transactions(description=...) shows
+    that the failed attempt did not create a transaction. A new transaction
+    with the description, currency and amount of the request is returned as
+    the one the failed attempt created, unless another confirmed send with
+    the same description is in progress in this process. The error is raised
+    then, as it is when more than one such transaction appeared.
+    """
+
+    policy = client.retry_policy
+
+    if request.idempotency_key is not None or not policy.confirm_sends:
+        return (yield request)
+
+    key = (client.base_url, client.username, description)
+
+    with _confirming_lock:
+        _confirming[key] += 1
+
+    try:
+        before = yield from _transactions_by_description(client, description)
+
+        attempt = 1
+
+        while True:
+            try:
+                return (yield request)
+            except Exception as error:
+                error_info = client._error_info(error)
+
+                if error_info is None:
+                    raise error
+
+                after = yield from _transactions_by_description(client, description)
+
+                landed = [transaction_dict for transaction_id, transaction_dict in after.items() if transaction_id not in before and _same_send(transaction_dict, request)]
+
+                with _confirming_lock:
+                    concurrent = _confirming[key] > 1
+
+                if landed:
+                    if len(landed) == 1 and not concurrent:
+                        return landed[0]
+
+                    # cannot tell which send created them, retrying could send twice
+                    raise error
+
+                delay = policy.retry_delay(request, attempt, error_info, confirmed=True)
+
+                if delay is None:
+                    raise error
+
+                yield Sleep(delay)
+
+                attempt += 1
+    finally:
+        with _confirming_lock:
+            _confirming[key] -= 1
+
+            if not _confirming[key]:
+                del _confirming[key]
+
+
+@endpoint
+def login(client):
+    """
+    Get an auth token for the client and look up the BTC asset, skipping
+    what the client already knows
+    """
+
+    if client.auth_token is None:
+        yield from authenticate(client)
+
+    yield from resolve_btc_asset_id(client)
+
+
+@endpoint
+def authenticate(client):
+    """
+    Get a new auth token, registering the user first when the client was
+    created with register_new_user
+    """
+
+    if client._register_new_user:
+        yield from register_user(client)
+        client._register_new_user = False
+
+    client.auth_token = yield from get_token(client)
+
+    _save_credentials(client)
+
+    return client.auth_token
+
+
+@endpoint
+def resolve_btc_asset_id(client):
+    """
+    Look up the id of the BTC asset unless it is already known
+    """
+
+    if client._btc_asset_id is None:
+        assets_btc = yield from assets(client, limit=10, name="Bitcoin")
+
+        client._btc_asset_id = assets_btc["results"][0]["id"]
+
+        _save_credentials(client)
+
+    return client._btc_asset_id
+
+
+def _save_credentials(client):
+
+    if client.token_store is not None and client.auth_token is not None:
+        client.token_store.save(token_key(client.base_url, client.username), {"auth_token": client.auth_token, "btc_asset_id": client._btc_asset_id})
+
+
+@endpoint
+def register_user(client):
+    """
+    Register a new user
+
+    Args:
+    """
+
+    url = "api/user/register/"
+
+    return (yield Request("register_user", "POST", url, data={"username": client.username, "password":client.password}, auth=False))
+
+
+@endpoint
+def get_token(client):
+    """
+    Register a new user
+
+    Args:
+        username (str):
+        password (str):
+    """
+
+    url = "api/token-auth/"
+
+    res = yield Request("get_token", "POST", url, data={"username": client.username, "password":client.password}, auth=False)
+
+    return res["token"]
+
+
+@endpoint
+def lookup_users(client, term:str):
+    """
+    Users whose username contains term
+
+    Args:
+        term (str):
+
+    Returns:
+        list of dicts with the username as "value" and the user id as "pk"
+    """
+
+    url = "ajax_select/ajax_lookup/users"
+
+    return (yield Request("lookup_users", "GET", url, params={"term": term}, auth=False))
+
+
+@endpoint
+def get_user_id(client, username:str):
+    """
+    Id of the user with the given username, None when there is none
+
+    Results are kept by the user_resolver of the client, see UserResolver
+
+    Args:
+        username (str):
+    """
+
+    found, user_id = client.user_resolver.get(client.base_url, username)
+
+    if found:
+        return user_id
+
+    matches = yield from lookup_users(client, username)
+
+    return client.user_resolver.store(client.base_url, username, matches)
+
+
+@endpoint
+def balance_create(client, asset: str):
+    """
+    Create a new balance in the current user account
+
+    Args:
+        asset (str): Acronym of the asset to create
+        new balance for
+    """
+
+    url = "api/balance/create/"
+
+    yield Request("balance_create", "POST", url, data={"currency": asset}, decode=False)
+
+
+@endpoint
+def get_btc_balance(client):
+    """
+    List all asset balances in the current user account
+    """
+
+    btc_asset_id = yield from resolve_btc_asset_id(client)
+
+    balances_page = yield from balances(client)
+
+    for balance in balances_page["results"]:
+        if currency_id(balance) == btc_asset_id:
+            return balance
+
+    raise KeyError(btc_asset_id)
+
+
+@endpoint
+def balances(client, offset=0, limit=100):
+    """
+    List all asset balances in the current user account
+    """
+    url = "api/balances/"
+
+    return (yield Request("balances", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def balances_rgb(client, offset=0, limit=100):
+    """
+    List all asset RGB balances in the current user account
+    """
+    url = "api/balances-rgb/"
+
+    return (yield Request("balances_rgb", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def balances_nft(client, offset=0, limit=100):
+    """
+    List all NFT balances in the current user account
+    """
+
+    url = "api/balances-nft/"
+
+    return (yield Request("balances_nft", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def asset_create(client, acronym:str, asset_id:str, file_path:str=None, progress=None):
+    """
+    Args:
+        file_path: Picture as path, file object, bytes-like object or Upload
+        progress (callable): Called as progress(bytes_sent, total_bytes)
+        while the picture is uploaded
+    """
+
+    url = "api/currency/create/"
+
+    return (yield Request("asset_create", "POST", url, data={"acronym": acronym, "asset_id":asset_id}, files={"picture_orig":_upload(file_path, progress)}, invalidates=("assets",)))
+
+
+@endpoint
+def assets_mint(client, acronym:str, name:str, description:str, supply:int, file_path:str, progress=None):
+    """
+    Args:
+        file_path: Picture as path, file object, bytes-like object or Upload
+        progress (callable): Called as progress(bytes_sent, total_bytes)
+        while the picture is uploaded
+    """
+
+    url = "api/currencies/mint/"
+
+    data = {
+            "acronym": acronym,
+            "name":name,
+            "description":description,
+            "supply":str(supply),
+        }
+
+    files = {'picture_orig': _upload(file_path, progress)}
+
+    return (yield Request("assets_mint", "POST", url, data=data, files=files, invalidates=("assets",)))
+
+
+@endpoint
+def assets_mint_wait_finished(client, acronym:str, name:str, description:str, supply:int, file_path:str, progress=None):
+
+    new_asset = yield from assets_mint(client, acronym, name, description, supply, file_path, progress=progress)
+    new_asset = yield from asset(client, new_asset['id'])
+    yield from transactions_wait_status(client, transaction_id=new_asset['minting_transaction'], status_wait_for='minted')
+
+    return new_asset
+
+
+@endpoint
+def assets_mint_nft(client, name:str, description:str, file_path:str, progress=None):
+    """
+    Args:
+        file_path: Picture as path, file object, bytes-like object or Upload
+        progress (callable): Called as progress(bytes_sent, total_bytes)
+        while the picture is uploaded
+    """
+
+    url = "api/currencies/mint-nft/"
+
+    data = {
+            "name":name,
+            "description":description,
+        }
+
+    files = {'picture_orig': _upload(file_path, progress)}
+
+    return (yield Request("assets_mint_nft", "POST", url, data=data, files=files, invalidates=("nfts", "collections")))
+
+
+@endpoint
+def assets_mint_nft_wait_finished(client, name:str, description:str, file_path:str, progress=None, timeout:float=None):
+
+    minted = yield from assets_mint_nft(client, name, description, file_path, progress=progress)
+    minting_transaction = yield from transactions_wait_status(client, transaction_id=minted.get("minting_transaction") or minted["id"], status_wait_for='minted', timeout=timeout)
+
+    return minting_transaction
+
+
+@endpoint
+def assets(client, offset=0, limit=100, name=None):
+
+    url = "api/currencies/"
+    params = {"limit":limit, "offset":offset}
+
+    if name:
+        params["name"]=name
+
+    return (yield Request("assets", "GET", url, params = params))
+
+
+@endpoint
+def nfts(client, offset=0, limit=100, name=None, collection_name=None):
+    url = "api/nfts/"
+
+    params = {"limit":limit, "offset":offset}
+
+    if collection_name:
+        params["collection__name"]=collection_name
+
+    if name:
+        params["name"]=name
+
+    return (yield Request("nfts", "GET", url, params = params))
+
+
+@endpoint
+def asset(client, id):
+    url = f"api/currencies/{id}"
+
+    return (yield Request("asset", "GET", url))
+
+
+@endpoint
+def collections(client, offset=0, limit=100):
+    url = "api/collections/"
+
+    return (yield Request("collections", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def collection(client, id):
+    url = f"api/collection/{id}"
+
+    return (yield Request("collection", "GET", url))
+
+
+@endpoint
+def notifications(client, offset=0, limit=100):
+    url = "api/notifications/"
+
+    return (yield Request("notifications", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def transactions_send_taproot_asset(client, invoice_outbound, idempotency_key:str=None):
+    url = "api/transactions/send_taro/"
+
+    return (yield Request("transactions_send_taproot_asset", "POST", url, data={"invoice_outbound":invoice_outbound}, idempotency_key=idempotency_key))
+
+
+@endpoint
+def transactions_send_btc(client, invoice_outbound:str, amount:int, idempotency_key:str=None):
+    url = "api/transactions/send_btc/"
+
+    return (yield Request("transactions_send_btc", "POST", url, data={"invoice_outbound":invoice_outbound, "amount":amount}, idempotency_key=idempotency_key))
+
+
+@endpoint
+def transactions_send_btc_lnd(client, invoice_outbound:str, idempotency_key:str=None):
+    url = "api/transactions/send_btc_lnd/"
+
+    return (yield Request("transactions_send_btc_lnd", "POST", url, data={"invoice_outbound":invoice_outbound}, idempotency_key=idempotency_key))
+
+
+@endpoint
+def transactions_send_btc_wait_sent(client, invoice_outbound:str, amount:int, idempotency_key:str=None):
+
+    transaction_receive = yield from transactions_send_btc(client, invoice_outbound, amount, idempotency_key=idempotency_key)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='outbound_invoice_paid')
+
+    return transaction_receive
+
+
+@endpoint
+def transactions_send_btc_lns_wait_sent(client, invoice_outbound:str, idempotency_key:str=None):
+
+    transaction_receive = yield from transactions_send_btc_lnd(client, invoice_outbound, idempotency_key=idempotency_key)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='lnd_inbound_invoice_paid')
+
+    return transaction_receive
+
+
+@endpoint
+def transactions_send_internal(client, destination_user:int, asset:int, amount:int, description:str, idempotency_key:str=None):
+    url = "api/transactions/send_internal/"
+
+    request = Request("transactions_send_internal", "POST", url, data={"destination_user":destination_user, "currency":asset, "amount":amount, "description":description}, idempotency_key=idempotency_key)
+
+    return (yield from _send_confirmed(client, request, description))
+
+
+@endpoint
+def transactions_send_internal_wait_sent(client, destination_user:int, asset:int, amount:int, description:str, idempotency_key:str=None):
+
+    transaction_receive = yield from transactions_send_internal(client, destination_user, asset, amount, description, idempotency_key=idempotency_key)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='internal_finished')
+
+    return transaction_receive
+
+
+@endpoint
+def transactions_receive_taproot_asset(client, amount:int, asset: int, description: str):
+
+    url = "api/transactions/receive_taro/"
+
+    return (yield Request("transactions_receive_taproot_asset", "POST", url, data={"amount":amount, "currency":asset, "description":description}))
+
+
+@endpoint
+def transactions_wait_status(client, transaction_id:int, status_wait_for:str, timeout:float=None):
+    """
+    Wait until a transaction reaches a status
+
+    The transaction is polled by the shared waiter of the client together
+    with all other awaited transactions.
+
+    Args:
+        transaction_id (int):
+        status_wait_for (str):
+        timeout (float): Seconds to wait, None for the waiter default
+    """
+
+    return (yield WaitStatus(transaction_id, status_wait_for, timeout))
+
+
+@endpoint
+def transactions_receive_taproot_asset_get_invoice(client, amount:int, asset: int, description: str):
+
+    transaction_receive = yield from transactions_receive_taproot_asset(client, amount, asset, description)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='inbound_invoice_generated')
+
+    return (transaction_receive["invoice_inbound"])
+
+
+@endpoint
+def transactions_receive_btc(client, amount:int, description: str):
+    url = "api/transactions/receive_btc/"
+
+    return (yield Request("transactions_receive_btc", "POST", url, data={"amount":amount, "description":description}))
+
+
+@endpoint
+def transactions_receive_btc_get_invoice(client, amount:int, description: str):
+
+    transaction_receive = yield from transactions_receive_btc(client, amount, description)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='inbound_invoice_generated')
+
+    return (transaction_receive)
+
+
+@endpoint
+def transactions_receive_btc_lnd(client, amount:int, description: str):
+    url = "api/transactions/receive_btc_lnd/"
+
+    return (yield Request("transactions_receive_btc_lnd", "POST", url, data={"amount":amount,"description":description}))
+
+
+@endpoint
+def transactions(client, offset=0, limit=100, destination_username=None, description=None, currency_id=None):
+    url = "api/transactions/"
+
+    params = {"limit":limit, "offset":offset}
+
+    if destination_username:
+        params["destination_user__username"] = destination_username
+
+    if description:
+        params["description"] = description
+
+    if currency_id:
+        params["currency_id"] = currency_id
+
+    return (yield Request("transactions", "GET", url, params = params))
+
+
+@endpoint
+def transaction(client, id):
+    url = f"api/transactions/{id}"
+
+    return (yield Request("transaction", "GET", url))
+
+
+@endpoint
+def list_asset(client, asset:int):
+    url = "api/list_asset/"
+
+    return (yield Request("list_asset", "POST", url, data={"currency":asset}))
+
+
+@endpoint
+def list_nft_asset(client, asset:int, price_sat:int):
+    url = "api/list_nft_asset/"
+
+    return (yield Request("list_nft_asset", "POST", url, data={"currency":asset, "price_sat":price_sat}))
+
+
+@endpoint
+def listings(client, offset=0, limit=100):
+    """
+    Listings of fungible assets on the exchange
+    """
+
+    url = "api/listings/"
+
+    return (yield Request("listings", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def listings_nfts(client, offset=0, limit=100):
+    """
+    Listings of NFTs on the exchange
+    """
+
+    url = "api/listings_nfts/"
+
+    return (yield Request("listings_nfts", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def listings_my(client, offset=0, limit=100):
+    url = "api/listings_my/"
+
+    return (yield Request("listings_my", "GET", url, params = {"limit":limit, "offset":offset}))
+
+
+@endpoint
+def buy_taproot_asset_asset(client, asset:int, amount:int):
+    url = "api/buy_taro_asset/"
+
+    return (yield Request("buy_taproot_asset_asset", "POST", url, data={"currency":asset, "amount":amount}))
+
+
+@endpoint
+def buy_taproot_asset_asset_wait_finished(client, asset:int, amount:int):
+
+    transaction_receive = yield from buy_taproot_asset_asset(client, asset, amount)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
+    return transaction_receive
+
+
+@endpoint
+def buy_nft_asset(client, asset:int):
+    url = "api/buy_nft_asset/"
+
+    return (yield Request("buy_nft_asset", "POST", url, data={"currency":asset}))
+
+
+@endpoint
+def buy_nft_asset_wait_finished(client, asset:int):
+
+    transaction_receive = yield from buy_nft_asset(client, asset)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
+    return transaction_receive
+
+
+@endpoint
+def sell_taproot_asset(client, asset:int, amount:int):
+    url = "api/sell_taro_asset/"
+
+    return (yield Request("sell_taproot_asset", "POST", url, data={"currency":asset, "amount":amount}))
+
+
+@endpoint
+def sell_taproot_asset_wait_finished(client, asset:int, amount:int):
+
+    transaction_receive = yield from sell_taproot_asset(client, asset, amount)
+    transaction_receive = yield from transactions_wait_status(client, transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
+    return transaction_receive
+
+
+@endpoint
+def get_info(client):
+    url = "api/get_info/"
+
+    return (yield Request("get_info", "GET", url))
@@ -0,0 +1,907 @@
+"""
+Streams of new notifications and transaction status changes.
+
+client.stream_events() yields an Event for every new notification and
+every status change of a transaction (including new transactions). All
+streams of a client are fed by one EventHub: it polls the newest-first
+notifications and transactions pages down to the largest ids it has seen,
+refreshes the transactions not yet in a final status, and fans the events
+out to every consumer. The poll interval backs off while nothing happens
+and drops back once something does. With push_url the hub reads the
+events from a server-sent events stream instead and only polls while the
+stream is down.
+
+An EventCursor records what a consumer has seen (the largest ids and the
+last status of every pending transaction). Streams drop events the cursor
+already covers, and a cursor saved to a file makes a restarted consumer
+catch up on what happened while it was stopped. An event is recorded once
+the consumer asks for the next one.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+from .models import Notification, Transaction
+from .pagination import aiter_pages_since, iter_pages_since
+from .store import FINAL_STATUSES, is_final
+from .waiter import Backoff
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION = "notification"
+TRANSACTION = "transaction"
+KINDS = (NOTIFICATION, TRANSACTION)
+
+# model of the records pushed per event kind, for clients with models=True
+_PUSH_MODELS = {NOTIFICATION: Notification, TRANSACTION: Transaction}
+
+# seconds without data, not even a keep-alive comment, after which the
+# event push is considered dead and reconnected
+PUSH_READ_TIMEOUT = 90
+
+# put into the queues of the consumers when the hub closes
+_CLOSED = object()
+
+
+class Event():
+    """
+    A new notification, or a transaction that is new or changed its status
+
+    Args:
+        kind (str): "notification" or "transaction"
+        data (dict): The notification or transaction
+        previous_status (str): Status the transaction had before, None for
+        new transactions and notifications
+    """
+
+    __slots__ = ("kind", "data", "previous_status")
+
+    def __init__(self, kind:str, data:dict, previous_status:str=None) -> None:
+        self.kind = kind
+        self.data = data
+        self.previous_status = previous_status
+
+    @property
+    def id(self) -> int:
+        return self.data["id"]
+
+    @property
+    def status(self) -> str:
+        return self.data.get("status")
+
+    def __repr__(self) -> str:
+        if self.kind == TRANSACTION:
+            return f"Event(transaction {self.id}: {self.previous_status} -> {self.status})"
+
+        return f"Event(notification {self.id})"
+
+
+class EventCursor():
+    """
+    Position of a consumer in the event stream
+
+    Args:
+        path (str): JSON file the cursor is loaded from and saved to, None
+        to keep it in memory
+        final_statuses (set): Transaction statuses after which no change is
+        expected, in addition to statuses ending in "_finished" or "_paid"
+    """
+
+    def __init__(self, path:str=None, final_statuses:set=FINAL_STATUSES) -> None:
+        self.path = path
+        self.final_statuses = frozenset(final_statuses)
+
+        self.notification_mark = None
+        self.transaction_mark = None
+        self.statuses = {}
+
+        if path is not None:
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (FileNotFoundError, ValueError):
+                state = {}
+
+            self.notification_mark = state.get("notification_mark")
+            self.transaction_mark = state.get("transaction_mark")
+            self.statuses = {int(transaction_id): status for transaction_id, status in state.get("statuses", {}).items()}
+
+    @property
+    def seeded(self) -> bool:
+        """
+        Whether the cursor has a position, a new cursor starts at the current one of the hub
+        """
+
+        return self.notification_mark is not None and self.transaction_mark is not None
+
+    def event_for(self, kind:str, record:dict) -> Event:
+        """
+        Event for a record, None when the cursor has seen it already
+        """
+
+        if kind == NOTIFICATION:
+            if self.notification_mark is None or record["id"] > self.notification_mark:
+                return Event(NOTIFICATION, record)
+
+            return None
+
+        previous_status = self.statuses.get(record["id"])
+
+        if previous_status is not None:
+            return None if previous_status == record["status"] else Event(TRANSACTION, record, previous_status)
+
+        if self.transaction_mark is None or record["id"] > self.transaction_mark:
+            return Event(TRANSACTION, record)
+
+        return None
+
+    def advance(self, event:Event):
+        """
+        Record an event as seen
+        """
+
+        if event.kind == NOTIFICATION:
+            self.notification_mark = event.id if self.notification_mark is None else max(self.notification_mark, event.id)
+            return
+
+        self.transaction_mark = event.id if self.transaction_mark is None else max(self.transaction_mark, event.id)
+
+        if is_final(event.status, self.final_statuses):
+            self.statuses.pop(event.id, None)
+        else:
+            self.statuses[event.id] = event.status
+
+    def collect(self, kind:str, records) -> list:
+        """
+        Events of the unseen records, oldest first, recorded as seen
+        """
+
+        events = []
+
+        for record in sorted(records, key=lambda record: record["id"]):
+            event = self.event_for(kind, record)
+
+            if event is not None:
+                self.advance(event)
+                events.append(event)
+
+        return events
+
+    def seed(self, notifications:list, transactions:list):
+        """
+        Start at the newest of the records of the first pages, without events
+        """
+
+        self.notification_mark = max((record["id"] for record in notifications), default=0)
+        self.transaction_mark = max((record["id"] for record in transactions), default=0)
+        self.statuses = {record["id"]: record["status"] for record in transactions if not is_final(record["status"], self.final_statuses)}
+
+    def move_to(self, other):
+        """
+        Take the position of another cursor
+        """
+
+        self.notification_mark = other.notification_mark
+        self.transaction_mark = other.transaction_mark
+        self.statuses = dict(other.statuses)
+
+    def copy(self):
+        """
+        Cursor in memory at the same position
+        """
+
+        cursor = EventCursor(None, self.final_statuses)
+        cursor.move_to(self)
+
+        return cursor
+
+    def save(self):
+        if self.path is None:
+            return
+
+        tmp_path = f"{self.path}.tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump({"notification_mark": self.notification_mark, "transaction_mark": self.transaction_mark, "statuses": self.statuses}, f)
+
+        os.replace(tmp_path, self.path)
+
+
+def as_cursor(cursor) -> EventCursor:
+    """
+    EventCursor from a cursor, a path or None
+    """
+
+    if cursor is None or isinstance(cursor, EventCursor):
+        return cursor
+
+    return EventCursor(os.fspath(cursor))
+
+
+def parse_sse(lines):
+    """
+    Yield the (event, data) pairs of the lines of a text/event-stream
+    """
+
+    event, data = None, []
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+
+        line = line.rstrip("\r\n")
+
+        if not line:
+            if data:
+                yield event or "message", "\n".join(data)
+
+            event, data = None, []
+            continue
+
+        if line.startswith(":"):
+            continue
+
+        field, _, value = line.partition(":")
+
+        if value.startswith(" "):
+            value = value[1:]
+
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+
+
+def _response_lines(res):
+    """
+    Lines of a streamed requests response as soon as they arrive
+    """
+
+    read1 = getattr(res.raw, "read1", None)
+
+    if read1 is not None:
+        chunks = iter(lambda: read1(65536), b"")
+    else:
+        # older urllib3, chunked bodies still arrive chunk by chunk
+        chunks = res.iter_content(chunk_size=None)
+
+    buffer = b""
+
+    for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+
+        yield from lines
+
+
+class _Subscription():
+
+    def __init__(self, cursor:EventCursor, kinds, events) -> None:
+        self.cursor = cursor
+        self.kinds = frozenset(kinds or KINDS)
+        self.events = events
+        # events of the hub are held here until the catch-up of the cursor is queued
+        self.held = []
+        self.ready = False
+
+    def deliver(self, events:list):
+        events = [event for event in events if event.kind in self.kinds]
+
+        if not self.ready:
+            self.held.extend(events)
+            return
+
+        for event in events:
+            self.events.put_nowait(event)
+
+    def start(self, events:list):
+        self.ready = True
+        self.deliver(events + self.held)
+        self.held = []
+
+
+def _push_record(client, kind:str, data:str) -> dict:
+    record = client.json_decoder.loads(data)
+
+    return _PUSH_MODELS[kind].from_dict(record) if client.models else record
+
+
+class _PushUnavailable(Exception):
+    pass
+
+
+class EventHub():
+    """
+    One poll loop, or push connection, feeding all event streams of a client
+
+    The hub polls from a background thread while at least one stream is
+    open.
+
+    Args:
+        client (TiramisuClient):
+        backoff (Backoff): Poll intervals, from initial while events arrive
+        up to maximum while nothing happens
+        page_size (int): Page size of the list endpoints
+        max_concurrency (int): Pending transactions refreshed at once
+        push_url (str): Path of a server-sent events endpoint relative to
+        the API URL, e.g. "api/events/". Events arrive as "notification" or
+        "transaction" events with the record as JSON data. Polling is used
+        when it is not set or the server does not offer it
+        final_statuses (set): Transaction statuses after which a transaction
+        is not refreshed any more
+    """
+
+    def __init__(self, client, backoff:Backoff=None, page_size:int=100, max_concurrency:int=8, push_url:str=None, final_statuses:set=FINAL_STATUSES) -> None:
+        self.client = client
+        self.backoff = backoff or Backoff(initial=1, maximum=30)
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.push_url = push_url
+
+        self._state = EventCursor(final_statuses=final_statuses)
+        self._subscriptions = []
+        self._catch_ups = []
+        self._cond = threading.Condition()
+        self._dispatch_lock = threading.RLock()
+        self._thread = None
+        self._executor = None
+        self._closed = False
+
+        self._listener = None
+        self._pushing = False
+        self._push_disabled = push_url is None
+        self._push_attempt = None
+        self._response = None
+
+    def stream(self, cursor=None, kinds=KINDS, timeout:float=None):
+        """
+        Yield events as they happen, see TiramisuClient.stream_events
+        """
+
+        cursor = as_cursor(cursor)
+        subscription = self.subscribe(cursor, kinds)
+
+        try:
+            while True:
+                try:
+                    event = subscription.events.get(timeout=timeout)
+                except queue.Empty:
+                    return
+
+                if event is _CLOSED:
+                    return
+
+                if isinstance(event, Exception):
+                    raise event
+
+                if cursor is not None:
+                    event = cursor.event_for(event.kind, event.data)
+
+                    if event is None:
+                        continue
+
+                yield event
+
+                if cursor is not None:
+                    cursor.advance(event)
+                    cursor.save()
+        finally:
+            self.unsubscribe(subscription)
+
+    def subscribe(self, cursor:EventCursor=None, kinds=KINDS) -> _Subscription:
+        """
+        Register a consumer, its events are put into subscription.events
+        """
+
+        subscription = _Subscription(cursor, kinds, queue.Queue())
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EventHub is closed")
+
+            self._subscriptions.append(subscription)
+            self._catch_ups.append(subscription)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="tiramisu-events", daemon=True)
+                self._thread.start()
+
+            self._cond.notify()
+
+        return subscription
+
+    def unsubscribe(self, subscription:_Subscription):
+        with self._cond:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+            if subscription in self._catch_ups:
+                self._catch_ups.remove(subscription)
+
+            self._cond.notify()
+
+    def subscribers(self) -> int:
+        with self._cond:
+            return len(self._subscriptions)
+
+    def close(self):
+        """
+        Stop polling and end all streams
+        """
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+            subscriptions = list(self._subscriptions)
+
+        self._close_response()
+
+        if thread is not None:
+            thread.join()
+
+        for subscription in subscriptions:
+            subscription.events.put_nowait(_CLOSED)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _loop(self):
+
+        interval = self.backoff.initial
+
+        while True:
+            with self._cond:
+                while not self._closed and not self._subscriptions:
+                    self._cond.wait()
+
+                if self._closed:
+                    return
+
+            failed = False
+
+            try:
+                if not self._state.seeded:
+                    self._seed()
+
+                while True:
+                    with self._cond:
+                        if not self._catch_ups:
+                            break
+
+                        subscription = self._catch_ups.pop(0)
+
+                    self._catch_up(subscription)
+
+                self._start_push()
+
+                if self._pushing:
+                    interval = self.backoff.maximum
+                else:
+                    events = self._poll_round()
+                    interval = self.backoff.initial if events else self.backoff.increase(interval)
+            except Exception as e:
+                logger.warning("Polling events failed: %s", e, extra={"event": "events_poll_failed", "error": repr(e)})
+                interval = self.backoff.increase(interval)
+                failed = True
+
+            with self._cond:
+                if not self._closed and (failed or not self._catch_ups):
+                    self._cond.wait(self.backoff.jittered(interval))
+
+    def _first_pages(self) -> tuple:
+        return (self.client.notifications(offset=0, limit=self.page_size)["results"], self.client.transactions(offset=0, limit=self.page_size)["results"])
+
+    def _seed(self):
+
+        notifications, transactions = self._first_pages()
+
+        with self._dispatch_lock:
+            self._state.seed(list(notifications), list(transactions))
+
+    def _fetch_since(self, cursor:EventCursor) -> tuple:
+        """
+        Notifications and transactions created since the position of a
+        cursor, and its pending transactions
+        """
+
+        notifications = [record for page in iter_pages_since(self.client.notifications, cursor.notification_mark, self.page_size) for record in page["results"]]
+        transactions = [record for page in iter_pages_since(self.client.transactions, cursor.transaction_mark, self.page_size) for record in page["results"]]
+
+        missing = set(cursor.statuses) - {record["id"] for record in transactions}
+
+        if missing:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tiramisu-events")
+
+            transactions.extend(self._executor.map(self.client.transaction, sorted(missing)))
+
+        return notifications, transactions
+
+    def _poll_round(self) -> list:
+
+        with self._dispatch_lock:
+            position = self._state.copy()
+
+        notifications, transactions = self._fetch_since(position)
+
+        with self._dispatch_lock:
+            return self._dispatch(self._state.collect(NOTIFICATION, notifications) + self._state.collect(TRANSACTION, transactions))
+
+    def _dispatch(self, events:list) -> list:
+
+        if events:
+            with self._cond:
+                subscriptions = list(self._subscriptions)
+
+            for subscription in subscriptions:
+                subscription.deliver(events)
+
+        return events
+
+    def _catch_up(self, subscription:_Subscription):
+        """
+        Queue what happened since the position of a consumer's cursor
+        """
+
+        cursor = subscription.cursor
+
+        with self._dispatch_lock:
+            if cursor is None:
+                subscription.start([])
+                return
+
+            if not cursor.seeded:
+                cursor.move_to(self._state)
+                cursor.save()
+                subscription.start([])
+                return
+
+        try:
+            notifications, transactions = self._fetch_since(cursor)
+        except Exception as e:
+            subscription.events.put_nowait(e)
+            return
+
+        probe = cursor.copy()
+
+        with self._dispatch_lock:
+            subscription.start(probe.collect(NOTIFICATION, notifications) + probe.collect(TRANSACTION, transactions))
+
+    def _start_push(self):
+
+        if self._push_disabled or (self._listener is not None and self._listener.is_alive()):
+            return
+
+        if self._push_attempt is not None and time.monotonic() - self._push_attempt < self.backoff.maximum:
+            return
+
+        self._push_attempt = time.monotonic()
+        self._listener = threading.Thread(target=self._listen, name="tiramisu-events-push", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+
+        client = self.client
+        headers = dict(client.headers, Accept="text/event-stream")
+        connect_timeout = client.timeout[0] if isinstance(client.timeout, tuple) else client.timeout
+
+        try:
+            with client.session.get(client.base_url + self.push_url, headers=headers, stream=True, timeout=(connect_timeout, PUSH_READ_TIMEOUT)) as res:
+                if res.status_code != 200 or not res.headers.get("Content-Type", "").startswith("text/event-stream"):
+                    raise _PushUnavailable(f"{res.status_code} {res.headers.get('Content-Type')}")
+
+                self._response = res
+                self._pushing = True
+
+                logger.info("Receiving events from %s", self.push_url, extra={"event": "events_push_connected", "url": self.push_url})
+
+                for kind, data in parse_sse(_response_lines(res)):
+                    if self._closed:
+                        return
+
+                    if kind not in KINDS:
+                        continue
+
+                    record = _push_record(client, kind, data)
+
+                    with self._dispatch_lock:
+                        self._dispatch(self._state.collect(kind, [record]))
+        except _PushUnavailable as e:
+            logger.info("No event push at %s (%s), polling", self.push_url, e, extra={"event": "events_push_unavailable", "url": self.push_url})
+            self._push_disabled = True
+        except Exception as e:
+            if not self._closed:
+                logger.warning("Event push disconnected: %s", e, extra={"event": "events_push_disconnected", "error": repr(e)})
+        finally:
+            self._pushing = False
+            self._response = None
+
+            # poll right away for what the stream missed
+            with self._cond:
+                self._cond.notify()
+
+    def _close_response(self):
+        res = self._response
+
+        if res is None:
+            return
+
+        # closing the response would wait for the read blocked on it, shutting
+        # the socket down ends that read instead. Servers closing the stream
+        # detach the socket, the listener then ends with its next read.
+        sock = getattr(getattr(res.raw, "connection", None), "sock", None)
+
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class AsyncEventHub():
+    """
+    asyncio counterpart of EventHub for AsyncTiramisuClient, polling from a single task
+    """
+
+    def __init__(self, client, backoff:Backoff=None, page_size:int=100, max_concurrency:int=8, push_url:str=None, final_statuses:set=FINAL_STATUSES) -> None:
+        self.client = client
+        self.backoff = backoff or Backoff(initial=1, maximum=30)
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.push_url = push_url
+
+        self._state = EventCursor(final_statuses=final_statuses)
+        self._subscriptions = []
+        self._catch_ups = []
+        self._wakeup = None
+        self._task = None
+        self._closed = False
+
+        self._listener = None
+        self._pushing = False
+        self._push_disabled = push_url is None
+        self._push_attempt = None
+
+    async def stream(self, cursor=None, kinds=KINDS, timeout:float=None):
+        """
+        Yield events as they happen, see AsyncTiramisuClient.stream_events
+        """
+
+        cursor = as_cursor(cursor)
+        subscription = self.subscribe(cursor, kinds)
+
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.events.get(), timeout)
+                except asyncio.TimeoutError:
+                    return
+
+                if event is _CLOSED:
+                    return
+
+                if isinstance(event, Exception):
+                    raise event
+
+                if cursor is not None:
+                    event = cursor.event_for(event.kind, event.data)
+
+                    if event is None:
+                        continue
+
+                yield event
+
+                if cursor is not None:
+                    cursor.advance(event)
+                    cursor.save()
+        finally:
+            self.unsubscribe(subscription)
+
+    def subscribe(self, cursor:EventCursor=None, kinds=KINDS) -> _Subscription:
+
+        if self._closed:
+            raise RuntimeError("AsyncEventHub is closed")
+
+        subscription = _Subscription(cursor, kinds, asyncio.Queue())
+
+        self._subscriptions.append(subscription)
+        self._catch_ups.append(subscription)
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+        self._wakeup.set()
+
+        return subscription
+
+    def unsubscribe(self, subscription:_Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+        if subscription in self._catch_ups:
+            self._catch_ups.remove(subscription)
+
+    def subscribers(self) -> int:
+        return len(self._subscriptions)
+
+    async def close(self):
+        """
+        Stop polling and end all streams
+        """
+
+        self._closed = True
+
+        for task in (self._task, self._listener):
+            if task is not None:
+                task.cancel()
+
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        self._task = self._listener = None
+
+        for subscription in self._subscriptions:
+            subscription.events.put_nowait(_CLOSED)
+
+    async def _loop(self):
+
+        interval = self.backoff.initial
+
+        # stops when the last stream is closed, the next subscribe starts it again
+        while self._subscriptions:
+            failed = False
+
+            try:
+                if not self._state.seeded:
+                    notifications, transactions = await asyncio.gather(self.client.notifications(offset=0, limit=self.page_size), self.client.transactions(offset=0, limit=self.page_size))
+                    self._state.seed(list(notifications["results"]), list(transactions["results"]))
+
+                while self._catch_ups:
+                    await self._catch_up(self._catch_ups.pop(0))
+
+                self._start_push()
+
+                if self._pushing:
+                    interval = self.backoff.maximum
+                else:
+                    notifications, transactions = await self._fetch_since(self._state)
+                    events = self._dispatch(self._state.collect(NOTIFICATION, notifications) + self._state.collect(TRANSACTION, transactions))
+                    interval = self.backoff.initial if events else self.backoff.increase(interval)
+            except Exception as e:
+                logger.warning("Polling events failed: %s", e, extra={"event": "events_poll_failed", "error": repr(e)})
+                interval = self.backoff.increase(interval)
+                failed = True
+
+            if self._catch_ups and not failed:
+                continue
+
+            self._wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.backoff.jittered(interval))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fetch_since(self, cursor:EventCursor) -> tuple:
+
+        notifications = [record async for page in aiter_pages_since(self.client.notifications, cursor.notification_mark, self.page_size) for record in page["results"]]
+        transactions = [record async for page in aiter_pages_since(self.client.transactions, cursor.transaction_mark, self.page_size) for record in page["results"]]
+
+        missing = set(cursor.statuses) - {record["id"] for record in transactions}
+
+        if missing:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def fetch(transaction_id):
+                async with semaphore:
+                    return await self.client.transaction(transaction_id)
+
+            transactions.extend(await asyncio.gather(*(fetch(transaction_id) for transaction_id in sorted(missing))))
+
+        return notifications, transactions
+
+    def _dispatch(self, events:list) -> list:
+
+        for subscription in list(self._subscriptions):
+            subscription.deliver(events)
+
+        return events
+
+    async def _catch_up(self, subscription:_Subscription):
+
+        cursor = subscription.cursor
+
+        if cursor is None:
+            subscription.start([])
+            return
+
+        if not cursor.seeded:
+            cursor.move_to(self._state)
+            cursor.save()
+            subscription.start([])
+            return
+
+        try:
+            notifications, transactions = await self._fetch_since(cursor)
+        except Exception as e:
+            subscription.events.put_nowait(e)
+            return
+
+        probe = cursor.copy()
+
+        subscription.start(probe.collect(NOTIFICATION, notifications) + probe.collect(TRANSACTION, transactions))
+
+    def _start_push(self):
+
+        if self._push_disabled or (self._listener is not None and not self._listener.done()):
+            return
+
+        if self._push_attempt is not None and time.monotonic() - self._push_attempt < self.backoff.maximum:
+            return
+
+        self._push_attempt = time.monotonic()
+        self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+
+        import aiohttp
+
+        client = self.client
+        headers = dict(client.headers, Accept="text/event-stream")
+
+        try:
+            async with client._get_session().get(client.base_url + self.push_url, headers=headers, timeout=aiohttp.ClientTimeout(connect=client.timeout.connect or client.timeout.total, sock_read=PUSH_READ_TIMEOUT)) as res:
+                if res.status != 200 or not res.headers.get("Content-Type", "").startswith("text/event-stream"):
+                    raise _PushUnavailable(f"{res.status} {res.headers.get('Content-Type')}")
+
+                self._pushing = True
+
+                logger.info("Receiving events from %s", self.push_url, extra={"event": "events_push_connected", "url": self.push_url})
+
+                async for kind, data in _aparse_sse(res.content):
+                    if kind not in KINDS:
+                        continue
+
+                    self._dispatch(self._state.collect(kind, [_push_record(client, kind, data)]))
+        except _PushUnavailable as e:
+            logger.info("No event push at %s (%s), polling", self.push_url, e, extra={"event": "events_push_unavailable", "url": self.push_url})
+            self._push_disabled = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Event push disconnected: %s", e, extra={"event": "events_push_disconnected", "error": repr(e)})
+        finally:
+            self._pushing = False
+
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+
+async def _aparse_sse(content):
+    """
+    parse_sse over the lines of an aiohttp response body
+    """
+
+    lines = []
+
+    async for line in content:
+        lines.append(line)
+
+        if line.strip(b"\r\n"):
+            continue
+
+        for item in parse_sse(lines):
+            yield item
+
+        lines = []
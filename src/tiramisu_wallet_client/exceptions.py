@@ -0,0 +1,56 @@
+class TiramisuError(Exception):
+    """
+    Base class of the errors raised by the client
+    """
+
+
+class RequestError(TiramisuError):
+    """
+    The server answered with an error status, the message is the response body
+
+    Args:
+        text (str): Body of the response
+        status (int): HTTP status
+        retry_after (float): Seconds asked for by a Retry-After header
+    """
+
+    def __init__(self, text:str, status:int=None, retry_after:float=None) -> None:
+        super().__init__(text)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TransactionError(TiramisuError):
+    """
+    A transaction ended in the 'error' status
+
+    Args:
+        transaction (dict): Last state of the transaction
+    """
+
+    def __init__(self, transaction:dict) -> None:
+        super().__init__(f"Transaction error: {transaction.get('status_description')}")
+        self.transaction = transaction
+
+
+class TransactionTimeout(TiramisuError):
+    """
+    A transaction did not reach the awaited status in time
+    """
+
+
+class InsufficientBalance(TiramisuError):
+    """
+    A send was refused locally because the balance does not cover it
+
+    Args:
+        asset (int): Id of the asset
+        amount (int): Amount of the send
+        available (int): Balance not held by pending sends
+    """
+
+    def __init__(self, asset:int, amount:int, available:int) -> None:
+        super().__init__(f"Balance of asset {asset} is {available}, {amount} needed")
+        self.asset = asset
+        self.amount = amount
+        self.available = available
@@ -0,0 +1,459 @@
+"""
+Inbound invoices generated ahead of time.
+
+transactions_receive_btc_get_invoice() and
+transactions_receive_taproot_asset_get_invoice() wait until the server has
+generated the invoice, which takes seconds. An InvoicePool keeps a number
+of generated invoices per (asset, amount) and replaces them in the
+background as they are taken, so take() returns at once. Invoices older
+than max_age are dropped before they expire unpaid.
+
+All invoices of a pool carry the description of the pool, the transaction
+id of a taken invoice identifies the deposit.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from .endpoints import transactions_receive_btc, transactions_receive_taproot_asset, transactions_wait_status
+from .waiter import Backoff
+
+logger = logging.getLogger(__name__)
+
+# Asset of bitcoin invoices in the sizes of a pool
+BTC = None
+
+
+class PooledInvoice():
+    """
+    Inbound invoice of a receive transaction
+
+    Args:
+        transaction (dict): Receive transaction in the
+        inbound_invoice_generated status
+        asset (int): Asset id, None for bitcoin
+        amount (int):
+        created (float): time.monotonic() when the invoice was requested
+        pooled (bool): Taken from the pool rather than generated on demand
+    """
+
+    __slots__ = ("transaction", "asset", "amount", "created", "pooled")
+
+    def __init__(self, transaction:dict, asset:int, amount:int, created:float, pooled:bool=True) -> None:
+        self.transaction = transaction
+        self.asset = asset
+        self.amount = amount
+        self.created = created
+        self.pooled = pooled
+
+    @property
+    def transaction_id(self) -> int:
+        return self.transaction["id"]
+
+    @property
+    def invoice(self) -> str:
+        return self.transaction["invoice_inbound"]
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def __repr__(self):
+        return f"PooledInvoice({self.transaction_id}, asset={self.asset}, amount={self.amount})"
+
+
+def generate_invoice(client, asset:int, amount:int, description:str, timeout:float=None):
+    """
+    Create a receive transaction and wait until its invoice is generated
+
+    Args:
+        asset (int): Asset id, None for a bitcoin invoice
+        amount (int):
+        description (str):
+        timeout (float): Seconds to wait for the invoice
+
+    Returns:
+        Transaction holding the invoice as invoice_inbound
+    """
+
+    if asset is BTC:
+        transaction = yield from transactions_receive_btc(client, amount, description)
+    else:
+        transaction = yield from transactions_receive_taproot_asset(client, amount, asset, description)
+
+    return (yield from transactions_wait_status(client, transaction_id=transaction["id"], status_wait_for="inbound_invoice_generated", timeout=timeout))
+
+
+class _Pool():
+    """
+    Bookkeeping shared by the sync and async pools
+    """
+
+    def __init__(self, sizes:dict, max_age:float, backoff:Backoff) -> None:
+        self.sizes = dict(sizes)
+        self.max_age = max_age
+        self.backoff = backoff
+
+        self.ready = {key: collections.deque() for key in self.sizes}
+        self.pending = collections.Counter()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+        self.expired = collections.Counter()
+        self.refills = collections.Counter()
+        self.refill_errors = collections.Counter()
+        self.refill_latencies = collections.deque(maxlen=1000)
+
+        self.delay = None
+        self.retry_at = 0
+
+    def expire(self, now:float):
+        for key, ready in self.ready.items():
+            while ready and now - ready[0].created >= self.max_age:
+                ready.popleft()
+                self.expired[key] += 1
+
+    def pop(self, key:tuple) -> PooledInvoice:
+        self.expire(time.monotonic())
+
+        ready = self.ready.get(key)
+
+        if ready:
+            self.hits[key] += 1
+
+            return ready.popleft()
+
+        self.misses[key] += 1
+
+        return None
+
+    def deficits(self, now:float) -> list:
+        """
+        Keys of the invoices to generate now, counted as pending
+        """
+
+        if now < self.retry_at:
+            return []
+
+        keys = []
+
+        for key, size in self.sizes.items():
+            missing = size - len(self.ready[key]) - self.pending[key]
+
+            if missing > 0:
+                self.pending[key] += missing
+                keys.extend([key] * missing)
+
+        return keys
+
+    def added(self, key:tuple, invoice:PooledInvoice):
+        self.pending[key] -= 1
+        self.refills[key] += 1
+        self.refill_latencies.append(time.monotonic() - invoice.created)
+        self.delay = None
+
+        # keep the deque ordered by age, refills can finish out of order
+        ready = self.ready[key]
+        ready.append(invoice)
+
+        if len(ready) > 1 and ready[-2].created > invoice.created:
+            self.ready[key] = collections.deque(sorted(ready, key=lambda pooled: pooled.created))
+
+    def failed(self, key:tuple, error:Exception):
+        self.pending[key] -= 1
+        self.refill_errors[key] += 1
+        self.delay = self.backoff.initial if self.delay is None else self.backoff.increase(self.delay)
+        self.retry_at = time.monotonic() + self.backoff.jittered(self.delay)
+
+        logger.warning("Generating a pooled invoice failed: %s", error, extra={"event": "invoice_refill_failed", "asset": key[0], "amount": key[1], "error": repr(error)})
+
+    def wait_time(self) -> float:
+        """
+        Seconds until the pool has to be checked for expired invoices or a retry
+        """
+
+        now = time.monotonic()
+        deadlines = [ready[0].created + self.max_age for ready in self.ready.values() if ready]
+
+        if self.retry_at > now:
+            deadlines.append(self.retry_at)
+
+        return max(0, min(deadlines) - now) if deadlines else None
+
+    def snapshot(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        latencies = sorted(self.refill_latencies)
+
+        def quantile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "expired": sum(self.expired.values()),
+            "refills": sum(self.refills.values()),
+            "refill_errors": sum(self.refill_errors.values()),
+            "refill_latency_p50": quantile(0.5),
+            "refill_latency_p99": quantile(0.99),
+            "pools": {key: {"size": size, "ready": len(self.ready[key]), "pending": self.pending[key], "hits": self.hits[key], "misses": self.misses[key], "expired": self.expired[key]} for key, size in self.sizes.items()},
+        }
+
+
+class InvoicePool():
+    """
+    Invoices generated in the background for instant deposits
+
+    Refilling starts when the pool is created.
+
+        pool = InvoicePool(client, {(BTC, 10000): 5, (asset_id, 100): 2})
+        deposit = pool.take(10000)
+        show(deposit.invoice, deposit.transaction_id)
+
+    Args:
+        client (TiramisuClient):
+        sizes (dict): Number of invoices to keep ready per (asset, amount),
+        asset BTC (None) for bitcoin invoices
+        description (str): Description of the receive transactions
+        max_age (float): Seconds after which an unused invoice is dropped,
+        shorter than the expiry of the invoices
+        refill_concurrency (int): Invoices generated at once
+        timeout (float): Seconds to wait for one invoice, None for the
+        waiter default
+        backoff (Backoff): Delay between refills after failures
+    """
+
+    def __init__(self, client, sizes:dict, description:str="Deposit", max_age:float=1800, refill_concurrency:int=4, timeout:float=None, backoff:Backoff=None) -> None:
+        self.client = client
+        self.description = description
+        self.timeout = timeout
+
+        self._pool = _Pool(sizes, max_age, backoff or Backoff(1, 60))
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=refill_concurrency, thread_name_prefix="tiramisu-invoices")
+        self._thread = threading.Thread(target=self._loop, name="tiramisu-invoice-pool", daemon=True)
+        self._thread.start()
+
+    def take(self, amount:int, asset:int=BTC) -> PooledInvoice:
+        """
+        A ready invoice, generated on the spot when the pool has none
+
+        Args:
+            amount (int):
+            asset (int): Asset id, BTC (None) for a bitcoin invoice
+
+        Returns:
+            PooledInvoice, never handed out twice
+        """
+
+        key = (asset, amount)
+
+        with self._cond:
+            invoice = self._pool.pop(key)
+            self._cond.notify()
+
+        if invoice is not None:
+            return invoice
+
+        created = time.monotonic()
+        transaction = self.client._run(generate_invoice(self.client, asset, amount, self.description, timeout=self.timeout))
+
+        return PooledInvoice(transaction, asset, amount, created, pooled=False)
+
+    def ready(self, amount:int, asset:int=BTC) -> int:
+        """
+        Number of invoices ready for the amount
+        """
+
+        with self._cond:
+            return len(self._pool.ready.get((asset, amount), ()))
+
+    def stats(self) -> dict:
+        """
+        Plain dict with the hits, misses and hit_rate of take(), the
+        expired invoices, the refills and their latency in seconds, and
+        the counts of every (asset, amount) under "pools"
+        """
+
+        with self._cond:
+            return self._pool.snapshot()
+
+    def close(self):
+        """
+        Stop refilling, invoices being generated are left to finish
+        """
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _loop(self):
+
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+
+                self._pool.expire(time.monotonic())
+                keys = self._pool.deficits(time.monotonic())
+
+                if not keys:
+                    self._cond.wait(self._pool.wait_time())
+                    continue
+
+            for key in keys:
+                self._executor.submit(self._refill, key)
+
+    def _refill(self, key:tuple):
+
+        if self._closed:
+            return
+
+        created = time.monotonic()
+
+        try:
+            transaction = self.client._run(generate_invoice(self.client, key[0], key[1], self.description, timeout=self.timeout))
+        except Exception as e:
+            with self._cond:
+                self._pool.failed(key, e)
+                self._cond.notify()
+
+            return
+
+        with self._cond:
+            self._pool.added(key, PooledInvoice(transaction, key[0], key[1], created))
+            self._cond.notify()
+
+
+class AsyncInvoicePool():
+    """
+    asyncio counterpart of InvoicePool for AsyncTiramisuClient
+
+    Refilling starts with start() or async with.
+    """
+
+    def __init__(self, client, sizes:dict, description:str="Deposit", max_age:float=1800, refill_concurrency:int=4, timeout:float=None, backoff:Backoff=None) -> None:
+        self.client = client
+        self.description = description
+        self.refill_concurrency = refill_concurrency
+        self.timeout = timeout
+
+        self._pool = _Pool(sizes, max_age, backoff or Backoff(1, 60))
+        self._wakeup = None
+        self._semaphore = None
+        self._task = None
+        self._refills = set()
+        self._closed = False
+
+    async def start(self):
+
+        if self._task is None:
+            self._closed = False
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.refill_concurrency)
+            self._task = asyncio.ensure_future(self._loop())
+
+        return self
+
+    async def take(self, amount:int, asset:int=BTC) -> PooledInvoice:
+        """
+        A ready invoice, see InvoicePool.take
+        """
+
+        key = (asset, amount)
+        invoice = self._pool.pop(key)
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+        if invoice is not None:
+            return invoice
+
+        created = time.monotonic()
+        transaction = await self.client._run(generate_invoice(self.client, asset, amount, self.description, timeout=self.timeout))
+
+        return PooledInvoice(transaction, asset, amount, created, pooled=False)
+
+    def ready(self, amount:int, asset:int=BTC) -> int:
+        return len(self._pool.ready.get((asset, amount), ()))
+
+    def stats(self) -> dict:
+        """
+        Statistics of the pool, see InvoicePool.stats
+        """
+
+        return self._pool.snapshot()
+
+    async def close(self):
+        """
+        Stop refilling and cancel the invoices being generated
+        """
+
+        self._closed = True
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+        # the loop exits on _closed, cancelling it could be swallowed by wait_for before Python 3.12
+        refills = list(self._refills)
+
+        for task in refills:
+            task.cancel()
+
+        await asyncio.gather(*[task for task in [self._task, *refills] if task is not None], return_exceptions=True)
+
+        self._task = None
+        self._refills.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _loop(self):
+
+        while not self._closed:
+            self._pool.expire(time.monotonic())
+
+            for key in self._pool.deficits(time.monotonic()):
+                task = asyncio.ensure_future(self._refill(key))
+                self._refills.add(task)
+                task.add_done_callback(self._refills.discard)
+
+            self._wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._pool.wait_time())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, key:tuple):
+
+        async with self._semaphore:
+            created = time.monotonic()
+
+            try:
+                transaction = await self.client._run(generate_invoice(self.client, key[0], key[1], self.description, timeout=self.timeout))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._pool.failed(key, e)
+            else:
+                self._pool.added(key, PooledInvoice(transaction, key[0], key[1], created))
+
+        self._wakeup.set()
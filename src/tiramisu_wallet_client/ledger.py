@@ -0,0 +1,627 @@
+"""
+Balances kept locally so checks before a send need no request.
+
+A BalanceLedger reads all balances once. Transactions submitted through
+it hold their amount at once: a send lowers the available balance
+immediately, a buy is counted once it settles. Every held transaction
+is watched by the shared waiter of the client. When it finishes its
+amount is booked, when it ends in 'error' the hold is dropped.
+
+A receive is only held until its invoice is generated, the last status
+the client can watch for. Its payment shows up at the next reconcile.
+
+The server balance is assumed to change when a transaction finishes. The
+ledger reads the balances again every reconcile_interval seconds, and at
+once when it cannot know the outcome. That is the case when a send was
+rejected, a watch timed out, or the counter amount of an exchange (the BTC
+paid or received) is unknown. Differences found then are logged as
+"balance_discrepancy" events and the server amounts are taken over.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from .exceptions import InsufficientBalance, TransactionError
+from .models import currency_id
+from .pagination import aiter_results, iter_results
+
+logger = logging.getLogger(__name__)
+
+
+class _Hold():
+
+    __slots__ = ("asset", "amount", "counterpart", "book", "recheck")
+
+    def __init__(self, asset:int, amount:int, counterpart:bool) -> None:
+        self.asset = asset
+        self.amount = amount
+        self.counterpart = counterpart
+        self.book = True
+        # pending during a read of the balances, which may already include it
+        self.recheck = False
+
+
+class _Ledger():
+    """
+    Bookkeeping shared by the sync and async ledgers
+    """
+
+    def __init__(self) -> None:
+        self.amounts = {}
+        self.debits = collections.Counter()
+        self.credits = collections.Counter()
+        self.holds = set()
+
+        self.loaded = False
+        self.stale = False
+        self.fetching = False
+        self.settled_during_fetch = False
+        self.reconciled_at = None
+        self.reconciles = 0
+        self.discrepancies = 0
+
+    def available(self, asset:int) -> int:
+        return self.amounts.get(asset, 0) - self.debits[asset]
+
+    def expected(self, asset:int) -> int:
+        return self.available(asset) + self.credits[asset]
+
+    def hold(self, asset:int, amount:int, counterpart:bool=False) -> _Hold:
+        hold = _Hold(asset, amount, counterpart)
+
+        if amount < 0:
+            self.debits[asset] -= amount
+        else:
+            self.credits[asset] += amount
+
+        self.holds.add(hold)
+
+        return hold
+
+    def release(self, hold:_Hold):
+
+        if hold not in self.holds:
+            return
+
+        self.holds.discard(hold)
+
+        if hold.amount < 0:
+            self.debits[hold.asset] += hold.amount
+        else:
+            self.credits[hold.asset] -= hold.amount
+
+    def settle(self, hold:_Hold, error:Exception=None):
+
+        if hold not in self.holds:
+            return
+
+        self.release(hold)
+
+        if error is None and not hold.book:
+            self.stale = self.stale or hold.recheck
+            return
+
+        if error is None:
+            self.amounts[hold.asset] = self.amounts.get(hold.asset, 0) + hold.amount
+            self.stale = self.stale or hold.counterpart
+            self.settled_during_fetch = self.settled_during_fetch or self.fetching
+        elif not isinstance(error, TransactionError):
+            # timed out or could not be polled, the outcome is unknown
+            self.stale = True
+
+    def apply(self, balances:list):
+        amounts = {currency_id(balance): int(balance["amount"]) for balance in balances}
+
+        if self.loaded and not self.settled_during_fetch:
+            # pending holds may or may not be included in the read amounts
+            low, high = collections.Counter(), collections.Counter()
+
+            for hold in self.holds:
+                if hold.book or hold.recheck:
+                    (low if hold.amount < 0 else high)[hold.asset] += hold.amount
+
+            for asset in set(amounts) | set(self.amounts):
+                old, new = self.amounts.get(asset, 0), amounts.get(asset, 0)
+
+                if not old + low[asset] <= new <= old + high[asset]:
+                    self.discrepancies += 1
+                    logger.info("Balance of asset %s is %s, ledger had %s", asset, new, old, extra={"event": "balance_discrepancy", "asset": asset, "amount": new, "ledger_amount": old})
+
+        self.amounts = amounts
+
+        # a held transaction may have finished before the read, do not book
+        # it again when it settles but read the balances once more
+        for hold in self.holds:
+            if hold.book:
+                hold.book = False
+                hold.recheck = True
+
+        # a transaction finished while reading may or may not be included, read again
+        self.stale = self.settled_during_fetch
+        self.settled_during_fetch = False
+        self.fetching = False
+        self.loaded = True
+        self.reconciled_at = time.monotonic()
+        self.reconciles += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "assets": {asset: {"amount": amount, "available": self.available(asset), "pending_debits": self.debits[asset], "pending_credits": self.credits[asset]} for asset, amount in self.amounts.items()},
+            "pending": len(self.holds),
+            "reconciles": self.reconciles,
+            "discrepancies": self.discrepancies,
+            "reconciled_age": time.monotonic() - self.reconciled_at if self.reconciled_at is not None else None,
+        }
+
+
+class BalanceLedger():
+    """
+    Local balances with optimistic updates for TiramisuClient
+
+        ledger = BalanceLedger(client)
+        ledger.balance()                       # BTC, no request after the first
+        ledger.send_internal(user_id, asset_id, 10, "payout")
+
+    Args:
+        client (TiramisuClient):
+        reconcile_interval (float): Seconds between reads of the server
+        balances, None to read them only when needed
+        timeout (float): Seconds to watch a held transaction, None for the
+        waiter default
+    """
+
+    def __init__(self, client, reconcile_interval:float=60, timeout:float=None) -> None:
+        self.client = client
+        self.reconcile_interval = reconcile_interval
+        self.timeout = timeout
+
+        self._ledger = _Ledger()
+        self._cond = threading.Condition()
+        self._fetch_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+    def _asset(self, asset:int) -> int:
+        return self.client.btc_asset_id if asset is None else asset
+
+    def _load(self):
+
+        if not self._ledger.loaded:
+            self.reconcile()
+
+    def balance(self, asset:int=None) -> int:
+        """
+        Amount of an asset not held by pending sends
+
+        Args:
+            asset (int): Asset id, the BTC asset by default
+        """
+
+        asset = self._asset(asset)
+        self._load()
+
+        with self._cond:
+            return self._ledger.available(asset)
+
+    def expected_balance(self, asset:int=None) -> int:
+        """
+        Amount of an asset once all pending transactions finished
+        """
+
+        asset = self._asset(asset)
+        self._load()
+
+        with self._cond:
+            return self._ledger.expected(asset)
+
+    def can_spend(self, amount:int, asset:int=None) -> bool:
+        return self.balance(asset) >= amount
+
+    def reconcile(self):
+        """
+        Read the server balances now and take them over
+        """
+
+        with self._fetch_lock:
+            with self._cond:
+                self._ledger.fetching = True
+
+            try:
+                balances = list(iter_results(self.client.balances))
+            except Exception:
+                with self._cond:
+                    self._ledger.fetching = False
+
+                raise
+
+            with self._cond:
+                self._ledger.apply(balances)
+
+                if self._thread is None and not self._closed:
+                    self._thread = threading.Thread(target=self._loop, name="tiramisu-ledger", daemon=True)
+                    self._thread.start()
+
+    def mark_stale(self):
+        """
+        Have the background thread read the server balances soon
+        """
+
+        with self._cond:
+            self._ledger.stale = True
+            self._cond.notify()
+
+    def track(self, transaction:dict, asset:int, amount:int, status_wait_for:str, counterpart:bool=False) -> dict:
+        """
+        Hold the amount of a transaction submitted elsewhere until it finishes
+
+        Args:
+            transaction (dict): The submitted transaction
+            asset (int): Asset id, the BTC asset when None
+            amount (int): Negative for a debit, positive for a credit
+            status_wait_for (str): Status of the finished transaction
+            counterpart (bool): The transaction also changes another
+            balance by an unknown amount, read the balances once it finished
+        """
+
+        self._load()
+
+        with self._cond:
+            hold = self._ledger.hold(self._asset(asset), amount, counterpart)
+
+        self._watch(hold, transaction, status_wait_for)
+
+        return transaction
+
+    def send_internal(self, destination_user:int, asset:int, amount:int, description:str, idempotency_key:str=None) -> dict:
+        """
+        transactions_send_internal() checked against and held on the ledger
+
+        Raises:
+            InsufficientBalance: The balance does not cover amount, even
+            after reading it again
+        """
+
+        return self._submit(asset, -amount, "internal_finished", lambda asset: self.client.transactions_send_internal(destination_user, asset, amount, description, idempotency_key=idempotency_key))
+
+    def send_btc(self, invoice_outbound:str, amount:int, idempotency_key:str=None) -> dict:
+        """
+        transactions_send_btc() checked against and held on the ledger
+        """
+
+        return self._submit(None, -amount, "outbound_invoice_paid", lambda asset: self.client.transactions_send_btc(invoice_outbound, amount, idempotency_key=idempotency_key))
+
+    def receive_btc(self, amount:int, description:str) -> dict:
+        """
+        transactions_receive_btc(), an expected credit until the invoice is generated
+        """
+
+        return self._submit(None, amount, "inbound_invoice_generated", lambda asset: self.client.transactions_receive_btc(amount, description), book=False)
+
+    def receive_taproot_asset(self, amount:int, asset:int, description:str) -> dict:
+        """
+        transactions_receive_taproot_asset(), an expected credit until the invoice is generated
+        """
+
+        return self._submit(asset, amount, "inbound_invoice_generated", lambda asset: self.client.transactions_receive_taproot_asset(amount, asset, description), book=False)
+
+    def buy_taproot_asset(self, asset:int, amount:int) -> dict:
+        """
+        buy_taproot_asset_asset(), credited once the exchange finished
+        """
+
+        return self._submit(asset, amount, "exchange_finished", lambda asset: self.client.buy_taproot_asset_asset(asset, amount), counterpart=True)
+
+    def buy_nft(self, asset:int) -> dict:
+        """
+        buy_nft_asset(), credited once the exchange finished
+        """
+
+        return self._submit(asset, 1, "exchange_finished", lambda asset: self.client.buy_nft_asset(asset), counterpart=True)
+
+    def sell_taproot_asset(self, asset:int, amount:int) -> dict:
+        """
+        sell_taproot_asset() checked against and held on the ledger
+        """
+
+        return self._submit(asset, -amount, "exchange_finished", lambda asset: self.client.sell_taproot_asset(asset, amount), counterpart=True)
+
+    def snapshot(self) -> dict:
+        """
+        Plain dict with the amount, available amount and pending debits and
+        credits per asset id under "assets", and the reconcile counters
+        """
+
+        with self._cond:
+            return self._ledger.snapshot()
+
+    def close(self):
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _hold(self, asset:int, amount:int, counterpart:bool):
+
+        for attempt in range(2):
+            self._load()
+
+            with self._cond:
+                available = self._ledger.available(asset)
+
+                if amount >= 0 or available >= -amount:
+                    return self._ledger.hold(asset, amount, counterpart)
+
+            if attempt == 0:
+                self.reconcile()
+
+        raise InsufficientBalance(asset, -amount, available)
+
+    def _submit(self, asset:int, amount:int, status_wait_for:str, submit, counterpart:bool=False, book:bool=True) -> dict:
+        asset = self._asset(asset)
+        hold = self._hold(asset, amount, counterpart)
+        hold.book = book
+
+        try:
+            transaction = submit(asset)
+        except Exception:
+            with self._cond:
+                self._ledger.release(hold)
+                self._ledger.stale = True
+                self._cond.notify()
+
+            raise
+
+        self._watch(hold, transaction, status_wait_for)
+
+        return transaction
+
+    def _watch(self, hold:_Hold, transaction:dict, status_wait_for:str):
+
+        def settled(future):
+            error = concurrent.futures.CancelledError() if future.cancelled() else future.exception()
+
+            with self._cond:
+                self._ledger.settle(hold, error)
+                self._cond.notify()
+
+        self.client.waiter.watch(transaction["id"], status_wait_for, client=self.client, callback=settled, timeout=self.timeout)
+
+    def _loop(self):
+
+        retry_at = None
+
+        while True:
+            with self._cond:
+                while not self._closed:
+                    now = time.monotonic()
+
+                    if retry_at is not None and now < retry_at:
+                        self._cond.wait(retry_at - now)
+                        continue
+
+                    due = None if self.reconcile_interval is None else self._ledger.reconciled_at + self.reconcile_interval - now
+
+                    if self._ledger.stale or (due is not None and due <= 0):
+                        break
+
+                    self._cond.wait(due)
+
+                if self._closed:
+                    return
+
+            try:
+                self.reconcile()
+                retry_at = None
+            except Exception as e:
+                retry_at = time.monotonic() + min(self.reconcile_interval or 10, 10)
+                logger.warning("Reading balances failed: %s", e, extra={"event": "ledger_reconcile_failed", "error": repr(e)})
+
+
+class AsyncBalanceLedger():
+    """
+    asyncio counterpart of BalanceLedger for AsyncTiramisuClient
+
+    Reconciling runs in a task started by the first read of the balances,
+    close() stops it.
+    """
+
+    def __init__(self, client, reconcile_interval:float=60, timeout:float=None) -> None:
+        self.client = client
+        self.reconcile_interval = reconcile_interval
+        self.timeout = timeout
+
+        self._ledger = _Ledger()
+        self._fetch_lock = None
+        self._wakeup = None
+        self._task = None
+
+    async def _asset(self, asset:int) -> int:
+
+        if asset is None:
+            if self.client.btc_asset_id is None:
+                await self.client.login()
+
+            return self.client.btc_asset_id
+
+        return asset
+
+    async def _load(self):
+
+        if not self._ledger.loaded:
+            await self.reconcile()
+
+    async def balance(self, asset:int=None) -> int:
+        """
+        Amount of an asset not held by pending sends, see BalanceLedger.balance
+        """
+
+        asset = await self._asset(asset)
+        await self._load()
+
+        return self._ledger.available(asset)
+
+    async def expected_balance(self, asset:int=None) -> int:
+        asset = await self._asset(asset)
+        await self._load()
+
+        return self._ledger.expected(asset)
+
+    async def can_spend(self, amount:int, asset:int=None) -> bool:
+        return await self.balance(asset) >= amount
+
+    async def reconcile(self):
+        """
+        Read the server balances now and take them over
+        """
+
+        if self._fetch_lock is None:
+            self._fetch_lock = asyncio.Lock()
+            self._wakeup = asyncio.Event()
+
+        async with self._fetch_lock:
+            self._ledger.fetching = True
+
+            try:
+                balances = [balance async for balance in aiter_results(self.client.balances)]
+            finally:
+                self._ledger.fetching = False
+
+            self._ledger.apply(balances)
+
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    def mark_stale(self):
+        self._ledger.stale = True
+
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def track(self, transaction:dict, asset:int, amount:int, status_wait_for:str, counterpart:bool=False) -> dict:
+        """
+        Hold the amount of a transaction submitted elsewhere, see BalanceLedger.track
+        """
+
+        asset = await self._asset(asset)
+        await self._load()
+
+        self._watch(self._ledger.hold(asset, amount, counterpart), transaction, status_wait_for)
+
+        return transaction
+
+    async def send_internal(self, destination_user:int, asset:int, amount:int, description:str, idempotency_key:str=None) -> dict:
+        return await self._submit(asset, -amount, "internal_finished", lambda asset: self.client.transactions_send_internal(destination_user, asset, amount, description, idempotency_key=idempotency_key))
+
+    async def send_btc(self, invoice_outbound:str, amount:int, idempotency_key:str=None) -> dict:
+        return await self._submit(None, -amount, "outbound_invoice_paid", lambda asset: self.client.transactions_send_btc(invoice_outbound, amount, idempotency_key=idempotency_key))
+
+    async def receive_btc(self, amount:int, description:str) -> dict:
+        return await self._submit(None, amount, "inbound_invoice_generated", lambda asset: self.client.transactions_receive_btc(amount, description), book=False)
+
+    async def receive_taproot_asset(self, amount:int, asset:int, description:str) -> dict:
+        return await self._submit(asset, amount, "inbound_invoice_generated", lambda asset: self.client.transactions_receive_taproot_asset(amount, asset, description), book=False)
+
+    async def buy_taproot_asset(self, asset:int, amount:int) -> dict:
+        return await self._submit(asset, amount, "exchange_finished", lambda asset: self.client.buy_taproot_asset_asset(asset, amount), counterpart=True)
+
+    async def buy_nft(self, asset:int) -> dict:
+        return await self._submit(asset, 1, "exchange_finished", lambda asset: self.client.buy_nft_asset(asset), counterpart=True)
+
+    async def sell_taproot_asset(self, asset:int, amount:int) -> dict:
+        return await self._submit(asset, -amount, "exchange_finished", lambda asset: self.client.sell_taproot_asset(asset, amount), counterpart=True)
+
+    def snapshot(self) -> dict:
+        return self._ledger.snapshot()
+
+    async def close(self):
+
+        if self._task is not None:
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _hold(self, asset:int, amount:int, counterpart:bool):
+
+        for attempt in range(2):
+            await self._load()
+
+            available = self._ledger.available(asset)
+
+            if amount >= 0 or available >= -amount:
+                return self._ledger.hold(asset, amount, counterpart)
+
+            if attempt == 0:
+                await self.reconcile()
+
+        raise InsufficientBalance(asset, -amount, available)
+
+    async def _submit(self, asset:int, amount:int, status_wait_for:str, submit, counterpart:bool=False, book:bool=True) -> dict:
+        asset = await self._asset(asset)
+        hold = await self._hold(asset, amount, counterpart)
+        hold.book = book
+
+        try:
+            transaction = await submit(asset)
+        except Exception:
+            self._ledger.release(hold)
+            self.mark_stale()
+
+            raise
+
+        self._watch(hold, transaction, status_wait_for)
+
+        return transaction
+
+    def _watch(self, hold:_Hold, transaction:dict, status_wait_for:str):
+
+        def settled(future):
+            self._ledger.settle(hold, asyncio.CancelledError() if future.cancelled() else future.exception())
+
+            if self._ledger.stale:
+                self._wakeup.set()
+
+        self.client.waiter.watch(transaction["id"], status_wait_for, client=self.client, callback=settled, timeout=self.timeout)
+
+    async def _loop(self):
+
+        while True:
+            timeout = None if self.reconcile_interval is None else max(0, self._ledger.reconciled_at + self.reconcile_interval - time.monotonic())
+
+            if not self._ledger.stale:
+                self._wakeup.clear()
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.warning("Reading balances failed: %s", e, extra={"event": "ledger_reconcile_failed", "error": repr(e)})
+                await asyncio.sleep(min(self.reconcile_interval or 10, 10))
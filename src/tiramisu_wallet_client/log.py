@@ -0,0 +1,36 @@
+"""
+Logging helpers.
+
+All modules log to children of the "tiramisu_wallet_client" logger.
+Records carry an "event" attribute and the fields of the event as extra
+attributes, e.g. event="http_response" with method, url, status and
+endpoint, or event="transaction_status" with transaction_id, status and
+previous_status. Per-request and per-poll records are logged at DEBUG
+level, raise the level of the logger to turn them off:
+
+    logging.getLogger("tiramisu_wallet_client").setLevel(logging.WARNING)
+"""
+
+import logging
+import random
+
+
+class SampleFilter(logging.Filter):
+    """
+    Pass only a random fraction of the records below a level
+
+    Attach it to a handler, filters of a logger do not see records of its
+    child loggers.
+
+    Args:
+        rate (float): Fraction of the records passed, between 0 and 1
+        level (int): Records at this level or above are always passed
+    """
+
+    def __init__(self, rate:float, level:int=logging.INFO) -> None:
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record) -> bool:
+        return record.levelno >= self.level or random.random() < self.rate
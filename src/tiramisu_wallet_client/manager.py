@@ -0,0 +1,439 @@
+"""
+Many user accounts served by one process.
+
+A ClientManager hosts one client per account. The clients share one
+connection pool, one response cache (asset metadata is the same for every
+user), one transaction waiter, one token store and one user id cache.
+Clients log in on first use, log in again when their token is rejected,
+and save new tokens to the store. The BTC asset id is looked up once for
+all accounts. map() calls a function for many accounts with bounded
+concurrency, e.g. manager.get_btc_balances() for all of them.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+from .async_client import AsyncTiramisuClient
+from .cache import ResponseCache
+from .endpoints import resolve_base_url
+from .session import create_async_session, create_session
+from .tiramisu_client import TiramisuClient
+from .tokens import MemoryTokenStore
+from .users import UserResolver
+from .waiter import AsyncTransactionWaiter, TransactionWaiter
+
+
+class FanOutReport():
+    """
+    Results of a call made for many accounts
+
+    Args:
+        results (dict): Return value per username
+        errors (dict): Exception per username of the failed calls
+        elapsed (float): Seconds the calls took
+    """
+
+    def __init__(self, results:dict, errors:dict, elapsed:float=None) -> None:
+        self.results = results
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def __len__(self) -> int:
+        return len(self.results) + len(self.errors)
+
+    def __str__(self) -> str:
+        text = f"{len(self.results)}/{len(self)} succeeded"
+
+        if self.elapsed:
+            text += f" in {self.elapsed:.1f}s ({len(self) / self.elapsed:.1f}/s)"
+
+        return text + f", {len(self.errors)} failed"
+
+
+class _Accounts():
+    """
+    Bookkeeping shared by the sync and async managers
+    """
+
+    def __init__(self) -> None:
+        self.clients = {}
+        self.btc_asset_id = None
+
+    def select(self, usernames) -> list:
+        if usernames is None:
+            return list(self.clients.values())
+
+        return [self.clients[username] for username in usernames]
+
+    def set_btc_asset_id(self, btc_asset_id:int):
+        self.btc_asset_id = btc_asset_id
+
+        for client in self.clients.values():
+            if client._btc_asset_id is None:
+                client.btc_asset_id = btc_asset_id
+
+
+def _login(client) -> str:
+
+    if client.auth_token is None:
+        client._authenticate(None)
+
+    return client.auth_token
+
+
+def _refresh_token(client) -> str:
+    client._authenticate(client.auth_token)
+
+    return client.auth_token
+
+
+async def _alogin(client) -> str:
+
+    if client.auth_token is None:
+        await client._authenticate(None)
+
+    return client.auth_token
+
+
+async def _arefresh_token(client) -> str:
+    await client._authenticate(client.auth_token)
+
+    return client.auth_token
+
+
+class ClientManager():
+    """
+    TiramisuClient per account sharing pool, cache, waiter and tokens
+
+    Args:
+        network (str): "testnet" or "mainnet"
+        server_url (str): Overrides the URL derived from network
+        max_concurrency (int): Default number of accounts map() serves at
+        once, also the size of the connection pool it creates
+        session (requests.Session): Connection pool to share, one is created
+        by default
+        cache (ResponseCache): Response cache to share, one is created by default
+        waiter (TransactionWaiter): Waiter to share, one is created by default
+        token_store (MemoryTokenStore or FileTokenStore): Store of the auth
+        tokens, a FileTokenStore keeps them across restarts
+        user_resolver (UserResolver): Cache of the user ids looked up by
+        username, one is created by default
+        **client_kwargs: Other arguments of TiramisuClient, e.g. retry_policy,
+        rate_limiter or hooks
+    """
+
+    def __init__(self, network:str="testnet", server_url:str=None, max_concurrency:int=32, session=None, cache:ResponseCache=None, waiter:TransactionWaiter=None, token_store=None, user_resolver:UserResolver=None, **client_kwargs) -> None:
+        self.base_url = resolve_base_url(network, server_url)
+        self.max_concurrency = max_concurrency
+
+        self._owns_session = session is None
+        self.session = session or create_session(pool_maxsize=max_concurrency)
+        self.cache = cache or ResponseCache()
+        self._owns_waiter = waiter is None
+        self.waiter = waiter or TransactionWaiter()
+        self.token_store = token_store or MemoryTokenStore()
+        self.user_resolver = user_resolver or UserResolver()
+        self.client_kwargs = client_kwargs
+
+        self._accounts = _Accounts()
+        self._lock = threading.Lock()
+
+    def add(self, username:str, password:str=None, auth_token:str=None) -> TiramisuClient:
+        """
+        Add an account, replacing an earlier one of the same username
+
+        The client logs in on first use. A password is needed to log in and
+        to get a new token when the stored one is rejected.
+
+        Returns:
+            TiramisuClient of the account
+        """
+
+        client = TiramisuClient(username, password, server_url=self.base_url, session=self.session, cache=self.cache, waiter=self.waiter, token_store=self.token_store, user_resolver=self.user_resolver, auth_token=auth_token, btc_asset_id=self._accounts.btc_asset_id, lazy=True, **self.client_kwargs)
+
+        with self._lock:
+            old = self._accounts.clients.pop(username, None)
+            self._accounts.clients[username] = client
+
+        if old is not None:
+            old.close()
+
+        return client
+
+    def remove(self, username:str):
+        with self._lock:
+            client = self._accounts.clients.pop(username)
+
+        client.close()
+
+    def __getitem__(self, username:str) -> TiramisuClient:
+        return self._accounts.clients[username]
+
+    def __contains__(self, username:str) -> bool:
+        return username in self._accounts.clients
+
+    def __len__(self) -> int:
+        return len(self._accounts.clients)
+
+    def __iter__(self):
+        return iter(list(self._accounts.clients))
+
+    @property
+    def btc_asset_id(self) -> int:
+        """
+        Id of the BTC asset, looked up once with the first account
+        """
+
+        with self._lock:
+            if self._accounts.btc_asset_id is not None:
+                return self._accounts.btc_asset_id
+
+            if not self._accounts.clients:
+                raise LookupError("Add an account before looking up the BTC asset")
+
+            client = next(iter(self._accounts.clients.values()))
+
+        # logs in and reads the assets, without blocking add() and remove()
+        btc_asset_id = client.btc_asset_id
+
+        with self._lock:
+            if self._accounts.btc_asset_id is None:
+                self._accounts.set_btc_asset_id(btc_asset_id)
+
+            return self._accounts.btc_asset_id
+
+    def map(self, function, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        """
+        Call function(client) for many accounts
+
+        Args:
+            function (callable): Called with the client of every account
+            usernames (iterable): Accounts to call it for, all by default
+            max_concurrency (int): Calls made at once, the max_concurrency of
+            the manager by default
+
+        Returns:
+            FanOutReport with the results and errors per username
+        """
+
+        clients = self._accounts.select(usernames)
+        results, errors = {}, {}
+        start = time.monotonic()
+
+        if clients:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_concurrency or self.max_concurrency, len(clients)), thread_name_prefix="tiramisu-manager") as executor:
+                futures = {executor.submit(function, client): client.username for client in clients}
+
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        errors[futures[future]] = e
+
+        return FanOutReport(results, errors, elapsed=time.monotonic() - start)
+
+    def login(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        """
+        Log in the accounts without a token
+
+        Returns:
+            FanOutReport with the auth token per username
+        """
+
+        return self.map(_login, usernames, max_concurrency)
+
+    def refresh_tokens(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        """
+        Replace the tokens of the accounts by new ones, e.g. before they expire
+        """
+
+        return self.map(_refresh_token, usernames, max_concurrency)
+
+    def get_btc_balances(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        """
+        BTC balance of many accounts
+
+        Returns:
+            FanOutReport with the balance dict per username
+        """
+
+        if self._accounts.clients:
+            self.btc_asset_id
+
+        return self.map(lambda client: client.get_btc_balance(), usernames, max_concurrency)
+
+    def close(self):
+        """
+        Close all clients and the pool and waiter unless they were passed in
+        """
+
+        with self._lock:
+            clients = list(self._accounts.clients.values())
+
+        # the resolver is shared, save it once instead of once per client
+        for client in clients:
+            client._release()
+
+        self.user_resolver.save()
+
+        if self._owns_waiter:
+            self.waiter.close()
+
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncClientManager():
+    """
+    asyncio counterpart of ClientManager for AsyncTiramisuClient
+
+    map() takes a coroutine function and awaits it for at most
+    max_concurrency accounts at once.
+    """
+
+    def __init__(self, network:str="testnet", server_url:str=None, max_concurrency:int=32, session=None, cache:ResponseCache=None, waiter:AsyncTransactionWaiter=None, token_store=None, user_resolver:UserResolver=None, **client_kwargs) -> None:
+        self.base_url = resolve_base_url(network, server_url)
+        self.max_concurrency = max_concurrency
+
+        self._owns_session = session is None
+        self.session = session
+        self.cache = cache or ResponseCache()
+        self._owns_waiter = waiter is None
+        self.waiter = waiter or AsyncTransactionWaiter()
+        self.token_store = token_store or MemoryTokenStore()
+        self.user_resolver = user_resolver or UserResolver()
+        self.client_kwargs = client_kwargs
+
+        self._accounts = _Accounts()
+        self._lock = None
+        self._closing = set()
+
+    def _get_session(self):
+
+        if self.session is None:
+            self.session = create_async_session(limit=self.max_concurrency)
+
+        return self.session
+
+    def add(self, username:str, password:str=None, auth_token:str=None) -> AsyncTiramisuClient:
+        """
+        Add an account, see ClientManager.add
+        """
+
+        client = AsyncTiramisuClient(username, password, server_url=self.base_url, session=self._get_session(), cache=self.cache, waiter=self.waiter, token_store=self.token_store, user_resolver=self.user_resolver, auth_token=auth_token, btc_asset_id=self._accounts.btc_asset_id, **self.client_kwargs)
+
+        old = self._accounts.clients.pop(username, None)
+        self._accounts.clients[username] = client
+
+        # add() is not a coroutine, close() waits for the replaced client
+        if old is not None:
+            task = asyncio.ensure_future(old.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+        return client
+
+    async def remove(self, username:str):
+        await self._accounts.clients.pop(username).close()
+
+    def __getitem__(self, username:str) -> AsyncTiramisuClient:
+        return self._accounts.clients[username]
+
+    def __contains__(self, username:str) -> bool:
+        return username in self._accounts.clients
+
+    def __len__(self) -> int:
+        return len(self._accounts.clients)
+
+    def __iter__(self):
+        return iter(list(self._accounts.clients))
+
+    async def resolve_btc_asset_id(self) -> int:
+        """
+        Id of the BTC asset, looked up once with the first account
+        """
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if self._accounts.btc_asset_id is None:
+                if not self._accounts.clients:
+                    raise LookupError("Add an account before looking up the BTC asset")
+
+                client = next(iter(self._accounts.clients.values()))
+                await client.login()
+                self._accounts.set_btc_asset_id(client.btc_asset_id)
+
+            return self._accounts.btc_asset_id
+
+    async def map(self, function, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        """
+        Await function(client) for many accounts, see ClientManager.map
+        """
+
+        clients = self._accounts.select(usernames)
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        results, errors = {}, {}
+        start = time.monotonic()
+
+        async def call(client):
+            async with semaphore:
+                try:
+                    results[client.username] = await function(client)
+                except Exception as e:
+                    errors[client.username] = e
+
+        await asyncio.gather(*(call(client) for client in clients))
+
+        return FanOutReport(results, errors, elapsed=time.monotonic() - start)
+
+    async def login(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        return await self.map(_alogin, usernames, max_concurrency)
+
+    async def refresh_tokens(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+        return await self.map(_arefresh_token, usernames, max_concurrency)
+
+    async def get_btc_balances(self, usernames=None, max_concurrency:int=None) -> FanOutReport:
+
+        if self._accounts.clients:
+            await self.resolve_btc_asset_id()
+
+        return await self.map(lambda client: client.get_btc_balance(), usernames, max_concurrency)
+
+    async def close(self):
+        """
+        Close all clients and the pool and waiter unless they were passed in
+        """
+
+        await asyncio.gather(*self._closing)
+
+        for client in list(self._accounts.clients.values()):
+            await client._release()
+
+        self.user_resolver.save()
+
+        if self._owns_waiter:
+            await self.waiter.close()
+
+        if self._owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
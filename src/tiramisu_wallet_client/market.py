@@ -0,0 +1,427 @@
+"""
+Exchange listings held in memory and batches of buy and sell orders.
+
+A Market reads the listings of the exchange (listings() and
+listings_nfts()) into a ListingIndex keyed by currency and sorted by
+price. It reads them again once they are older than max_age. A refresh
+applies only the difference to the index.
+
+execute() submits a batch of orders with bounded concurrency, at most
+rate orders per second, and waits for all of them through the shared
+waiter of the client (see bulk.run_batch). The report has the latency
+of every order from submitting it until its exchange finished.
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+from .bulk import BulkSendReport, arun_batch, run_batch
+from .models import currency_id
+from .pagination import aiter_results, iter_results
+from .ratelimit import TokenBucket
+
+BUY = "buy"
+BUY_NFT = "buy_nft"
+SELL = "sell"
+SIDES = (BUY, BUY_NFT, SELL)
+
+LISTING_ENDPOINTS = ("listings", "listings_nfts")
+
+
+def _price(listing) -> float:
+    price = listing.get("price_sat")
+
+    return float("inf") if price is None else price
+
+
+def _fingerprint(listing) -> tuple:
+    return (currency_id(listing), listing.get("price_sat"), listing.get("amount"))
+
+
+class ListingIndex():
+    """
+    Listings by id and by currency id, each currency sorted by price_sat
+
+    Listings without a price_sat sort last.
+
+    Args:
+        listings (iterable): Listings as dicts or Listing models
+    """
+
+    def __init__(self, listings=()) -> None:
+        self._by_id = {}
+        self._by_currency = {}
+
+        for listing in listings:
+            self.add(listing)
+
+    def add(self, listing) -> bool:
+        """
+        Add or update a listing
+
+        Returns:
+            True when the listing is new or changed
+        """
+
+        old = self._by_id.get(listing["id"])
+
+        if old is not None:
+            if _fingerprint(old) == _fingerprint(listing):
+                self._by_id[listing["id"]] = listing
+                return False
+
+            self.remove(listing["id"])
+
+        self._by_id[listing["id"]] = listing
+        bisect.insort(self._by_currency.setdefault(currency_id(listing), []), (_price(listing), listing["id"]))
+
+        return True
+
+    def remove(self, listing_id:int):
+        """
+        Remove a listing and return it, None when it is not indexed
+        """
+
+        listing = self._by_id.pop(listing_id, None)
+
+        if listing is None:
+            return None
+
+        key = currency_id(listing)
+        entries = self._by_currency[key]
+        del entries[bisect.bisect_left(entries, (_price(listing), listing_id))]
+
+        if not entries:
+            del self._by_currency[key]
+
+        return listing
+
+    def replace(self, listings) -> dict:
+        """
+        Make the index hold exactly the given listings
+
+        Returns:
+            dict with the number of listings "added", "changed" and "removed"
+        """
+
+        seen = set()
+        added = changed = 0
+
+        for listing in listings:
+            seen.add(listing["id"])
+            known = listing["id"] in self._by_id
+
+            if self.add(listing):
+                if known:
+                    changed += 1
+                else:
+                    added += 1
+
+        removed = [listing_id for listing_id in self._by_id if listing_id not in seen]
+
+        for listing_id in removed:
+            self.remove(listing_id)
+
+        return {"added": added, "changed": changed, "removed": len(removed)}
+
+    def get(self, listing_id:int, default=None):
+        return self._by_id.get(listing_id, default)
+
+    def for_currency(self, currency_id:int, max_price:float=None) -> list:
+        """
+        Listings of an asset from the cheapest, up to max_price sats when given
+        """
+
+        entries = self._by_currency.get(currency_id, ())
+
+        if max_price is not None:
+            entries = entries[:bisect.bisect_right(entries, (max_price, float("inf")))]
+
+        return [self._by_id[listing_id] for _, listing_id in entries]
+
+    def cheapest(self, currency_id:int):
+        entries = self._by_currency.get(currency_id)
+
+        return self._by_id[entries[0][1]] if entries else None
+
+    def currencies(self) -> list:
+        return list(self._by_currency)
+
+    def __getitem__(self, listing_id:int):
+        return self._by_id[listing_id]
+
+    def __contains__(self, listing_id:int) -> bool:
+        return listing_id in self._by_id
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+
+class Order():
+    """
+    Buy or sell order of a batch
+
+    Args:
+        side (str): BUY, BUY_NFT or SELL
+        asset (int): Id of the asset
+        amount (int): Units to buy or sell, 1 for an NFT
+        key (str): Key of the order in the report, derived from the
+        other fields by default
+    """
+
+    __slots__ = ("side", "asset", "amount", "key")
+
+    def __init__(self, side:str, asset:int, amount:int=1, key:str=None) -> None:
+        if side not in SIDES:
+            raise ValueError(f"Unknown order side {side!r}, use one of {SIDES}")
+
+        self.side = side
+        self.asset = asset
+        self.amount = amount
+        self.key = key
+
+    def __repr__(self) -> str:
+        return f"Order({self.side!r}, {self.asset!r}, {self.amount!r})"
+
+
+def _keyed_orders(orders) -> list:
+    keyed = []
+    seen = {}
+
+    for order in orders:
+        if not isinstance(order, Order):
+            order = Order(*order)
+
+        key = order.key
+
+        if key is None:
+            key = f"{order.side}:{order.asset}:{order.amount}"
+            seen[key] = seen.get(key, 0) + 1
+
+            if seen[key] > 1:
+                key = f"{key}#{seen[key]}"
+
+        keyed.append((key, order))
+
+    return keyed
+
+
+def _submit(client, order:Order):
+    """
+    Endpoint call submitting an order, a coroutine for the async client
+    """
+
+    if order.side == BUY:
+        return client.buy_taproot_asset_asset(order.asset, order.amount)
+
+    if order.side == BUY_NFT:
+        return client.buy_nft_asset(order.asset)
+
+    return client.sell_taproot_asset(order.asset, order.amount)
+
+
+def _bucket(rate) -> TokenBucket:
+
+    if rate is None or isinstance(rate, TokenBucket):
+        return rate
+
+    return TokenBucket(rate)
+
+
+class ExecutionReport(BulkSendReport):
+    """
+    Results of a batch of orders in the order of the batch, the item of
+    every SendResult is its Order and its latency the seconds from the
+    start of its submission, including the wait for the rate budget, until
+    the exchange finished
+    """
+
+    def latency(self, q:float) -> float:
+        """
+        Latency quantile of the orders, e.g. latency(0.99)
+        """
+
+        latencies = sorted(result.latency for result in self.results if result.latency is not None)
+
+        if not latencies:
+            return None
+
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def __str__(self) -> str:
+        text = super().__str__()
+
+        if self.latency(0.5) is not None:
+            text += f", latency p50 {self.latency(0.5):.2f}s p99 {self.latency(0.99):.2f}s"
+
+        return text
+
+
+class Market():
+    """
+    Listings index and order batches for TiramisuClient
+
+        market = Market(client)
+        listing = market.cheapest(asset_id)
+        report = market.execute([Order(BUY, asset_id, 10), Order(SELL, other_id, 5)], rate=2)
+
+    Args:
+        client (TiramisuClient):
+        max_age (float): Seconds after which the listings are read again
+        when queried
+        concurrency (int): Pages of the listings read in parallel
+        endpoints (tuple): List endpoints to read the listings from
+    """
+
+    def __init__(self, client, max_age:float=30, concurrency:int=4, endpoints:tuple=LISTING_ENDPOINTS) -> None:
+        self.client = client
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.endpoints = endpoints
+
+        self.index = ListingIndex()
+        self.refreshed_at = None
+        self._lock = threading.RLock()
+
+    def refresh(self) -> dict:
+        """
+        Read all listings and apply the changes to the index
+
+        Returns:
+            dict with the number of listings "added", "changed" and "removed"
+        """
+
+        listings = []
+
+        for name in self.endpoints:
+            listings.extend(iter_results(getattr(self.client, name), concurrency=self.concurrency))
+
+        with self._lock:
+            changes = self.index.replace(listings)
+            self.refreshed_at = time.monotonic()
+
+        return changes
+
+    def _fresh(self):
+
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.max_age:
+            self.refresh()
+
+    def listings(self, currency_id:int, max_price:float=None) -> list:
+        """
+        Listings of an asset from the cheapest, see ListingIndex.for_currency
+        """
+
+        self._fresh()
+
+        with self._lock:
+            return self.index.for_currency(currency_id, max_price)
+
+    def cheapest(self, currency_id:int):
+        self._fresh()
+
+        with self._lock:
+            return self.index.cheapest(currency_id)
+
+    def execute(self, orders, max_concurrency:int=8, rate=None, timeout:float=None) -> ExecutionReport:
+        """
+        Submit a batch of orders and wait until all exchanges finished
+
+        Args:
+            orders (iterable): Order objects or (side, asset, amount) tuples
+            max_concurrency (int): Maximum number of orders submitted at once
+            rate (float or TokenBucket): Orders submitted per second, a
+            TokenBucket shares the budget between batches or processes
+            timeout (float): Seconds to wait for each exchange, None for
+            the waiter default
+
+        Returns:
+            ExecutionReport in the order of orders
+        """
+
+        bucket = _bucket(rate)
+
+        def send(key, order):
+            if bucket is not None:
+                time.sleep(bucket.reserve())
+
+            return _submit(self.client, order)["id"]
+
+        report = run_batch(self.client, _keyed_orders(orders), send, lambda key, order: [], max_concurrency=max_concurrency, status_wait_for="exchange_finished", timeout=timeout)
+
+        # fills change the listings, read them again on the next query
+        self.refreshed_at = None
+
+        return ExecutionReport(report.results, elapsed=report.elapsed)
+
+
+class AsyncMarket():
+    """
+    asyncio counterpart of Market for AsyncTiramisuClient
+    """
+
+    def __init__(self, client, max_age:float=30, concurrency:int=4, endpoints:tuple=LISTING_ENDPOINTS) -> None:
+        self.client = client
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.endpoints = endpoints
+
+        self.index = ListingIndex()
+        self.refreshed_at = None
+
+    async def refresh(self) -> dict:
+        """
+        Read all listings and apply the changes to the index, see Market.refresh
+        """
+
+        listings = []
+
+        for name in self.endpoints:
+            listings.extend([listing async for listing in aiter_results(getattr(self.client, name), concurrency=self.concurrency)])
+
+        changes = self.index.replace(listings)
+        self.refreshed_at = time.monotonic()
+
+        return changes
+
+    async def _fresh(self):
+
+        if self.refreshed_at is None or time.monotonic() - self.refreshed_at >= self.max_age:
+            await self.refresh()
+
+    async def listings(self, currency_id:int, max_price:float=None) -> list:
+        await self._fresh()
+
+        return self.index.for_currency(currency_id, max_price)
+
+    async def cheapest(self, currency_id:int):
+        await self._fresh()
+
+        return self.index.cheapest(currency_id)
+
+    async def execute(self, orders, max_concurrency:int=8, rate=None, timeout:float=None) -> ExecutionReport:
+        """
+        Submit a batch of orders and wait until all exchanges finished, see Market.execute
+        """
+
+        bucket = _bucket(rate)
+
+        async def send(key, order):
+            if bucket is not None:
+                await asyncio.sleep(bucket.reserve())
+
+            return (await _submit(self.client, order))["id"]
+
+        async def lookup(key, order):
+            return []
+
+        report = await arun_batch(self.client, _keyed_orders(orders), send, lookup, max_concurrency=max_concurrency, status_wait_for="exchange_finished", timeout=timeout)
+
+        self.refreshed_at = None
+
+        return ExecutionReport(report.results, elapsed=report.elapsed)
@@ -0,0 +1,202 @@
+"""
+Request instrumentation.
+
+Clients call every hook passed as hooks=[...] with a RequestEvent after
+each HTTP call. RequestMetrics is such a hook collecting per-endpoint
+latency histograms.
+"""
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestEvent():
+    """
+    One HTTP call made by a client
+
+    Args:
+        endpoint (str): Name of the endpoint, e.g. "balances"
+        method (str): HTTP method
+        url (str): Full URL without query string
+        status (int): HTTP status, None when no response was received
+        bytes_sent (int): Size of the request body when known
+        bytes_received (int): Size of the response body
+        latency (float): Seconds from sending the request to reading the
+        whole response
+        error (Exception): Error raised while sending, if any
+    """
+
+    __slots__ = ("endpoint", "method", "url", "status", "bytes_sent", "bytes_received", "latency", "error")
+
+    def __init__(self, endpoint:str, method:str, url:str, status:int, bytes_sent:int, bytes_received:int, latency:float, error:Exception=None) -> None:
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.status = status
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.latency = latency
+        self.error = error
+
+    def __repr__(self):
+        return f"RequestEvent({self.method} {self.endpoint} {self.status} {self.latency:.3f}s)"
+
+
+def emit(hooks, event:RequestEvent):
+    """
+    Call every hook with the event, a failing hook never fails the request
+    """
+
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception("Request hook %r failed", hook)
+
+
+class _Histogram():
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size:int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class RequestMetrics():
+    """
+    Hook collecting latency histograms and counters per endpoint
+
+    Args:
+        buckets (tuple): Upper bounds of the latency buckets in seconds
+        slow_threshold (float): Log a warning for calls taking at least
+        this many seconds, None disables the slow-call log
+    """
+
+    def __init__(self, buckets:tuple=DEFAULT_BUCKETS, slow_threshold:float=None) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.slow_threshold = slow_threshold
+
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._requests = collections.Counter()
+        self._bytes_sent = collections.Counter()
+        self._bytes_received = collections.Counter()
+
+    def __call__(self, event:RequestEvent):
+
+        status = str(event.status) if event.status is not None else "error"
+
+        with self._lock:
+            histogram = self._latency.get(event.endpoint)
+
+            if histogram is None:
+                histogram = self._latency[event.endpoint] = _Histogram(len(self.buckets))
+
+            for i, bound in enumerate(self.buckets):
+                if event.latency <= bound:
+                    histogram.counts[i] += 1
+                    break
+
+            histogram.total += event.latency
+            histogram.count += 1
+
+            self._requests[(event.endpoint, event.method, status)] += 1
+            self._bytes_sent[event.endpoint] += event.bytes_sent or 0
+            self._bytes_received[event.endpoint] += event.bytes_received or 0
+
+        if self.slow_threshold is not None and event.latency >= self.slow_threshold:
+            logger.warning("Slow call %s %s took %.3fs (status %s)", event.method, event.url, event.latency, status)
+
+    def reset(self):
+        with self._lock:
+            self._latency.clear()
+            self._requests.clear()
+            self._bytes_sent.clear()
+            self._bytes_received.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Plain dict with the metrics of every endpoint
+        """
+
+        with self._lock:
+            endpoints = {}
+
+            for endpoint, histogram in self._latency.items():
+                endpoints[endpoint] = {
+                    "count": histogram.count,
+                    "latency_sum": histogram.total,
+                    "latency_avg": histogram.total / histogram.count,
+                    "latency_buckets": dict(zip(self.buckets, histogram.counts)),
+                    "latency_p50": self._quantile(histogram, 0.5),
+                    "latency_p99": self._quantile(histogram, 0.99),
+                    "bytes_sent": self._bytes_sent[endpoint],
+                    "bytes_received": self._bytes_received[endpoint],
+                    "statuses": {},
+                }
+
+            for (endpoint, method, status), count in self._requests.items():
+                endpoints[endpoint]["statuses"][status] = endpoints[endpoint]["statuses"].get(status, 0) + count
+
+            return endpoints
+
+    def _quantile(self, histogram:_Histogram, q:float) -> float:
+        """
+        Upper bound of the bucket containing the quantile, inf above the last bucket
+        """
+
+        rank = q * histogram.count
+        seen = 0
+
+        for bound, count in zip(self.buckets, histogram.counts):
+            seen += count
+
+            if seen >= rank:
+                return bound
+
+        return float("inf")
+
+    def prometheus(self, prefix:str="tiramisu_client") -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+
+        lines = []
+
+        with self._lock:
+            lines.append(f"# HELP {prefix}_request_duration_seconds Latency of HTTP calls to the wallet server")
+            lines.append(f"# TYPE {prefix}_request_duration_seconds histogram")
+
+            for endpoint, histogram in sorted(self._latency.items()):
+                cumulative = 0
+
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+
+                lines.append(f'{prefix}_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{prefix}_request_duration_seconds_sum{{endpoint="{endpoint}"}} {histogram.total}')
+                lines.append(f'{prefix}_request_duration_seconds_count{{endpoint="{endpoint}"}} {histogram.count}')
+
+            lines.append(f"# HELP {prefix}_requests_total HTTP calls to the wallet server")
+            lines.append(f"# TYPE {prefix}_requests_total counter")
+
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'{prefix}_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            for name, counter in (("sent", self._bytes_sent), ("received", self._bytes_received)):
+                lines.append(f"# HELP {prefix}_bytes_{name}_total Body bytes {name}")
+                lines.append(f"# TYPE {prefix}_bytes_{name}_total counter")
+
+                for endpoint, count in sorted(counter.items()):
+                    lines.append(f'{prefix}_bytes_{name}_total{{endpoint="{endpoint}"}} {count}')
+
+        return "\n".join(lines) + "\n"
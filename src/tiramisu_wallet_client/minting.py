@@ -0,0 +1,210 @@
+"""
+Batch minting of NFT collections.
+
+A manifest lists the NFTs to mint, one per row of a CSV file or object of
+a JSON list, with a name, a description and the path of the image
+(relative paths are relative to the manifest). assets_mint_nft_many()
+uploads the images with bounded concurrency, waits for all minting
+transactions with the shared waiter and, with a SendJournal, checkpoints
+every item so a crashed run resumes where it stopped. Items interrupted
+while uploading are looked up with nfts(name=...) before they are minted
+again, names should be unique within a collection.
+"""
+
+import csv
+import json
+import os
+import threading
+
+from .bulk import BulkSendReport, SendJournal, arun_batch, run_batch
+
+IMAGE_FIELDS = ("image", "image_path", "file_path")
+
+
+def load_manifest(path:str) -> list:
+    """
+    Read a CSV or JSON manifest
+
+    CSV files need a header row with the columns name, description and
+    image (or image_path/file_path), JSON files hold a list of objects with
+    the same keys. An optional key column identifies items in the journal.
+
+    Returns:
+        list of dicts with name, description, image and key
+    """
+
+    if path.lower().endswith(".json"):
+        with open(path) as f:
+            rows = json.load(f)
+
+        if isinstance(rows, dict):
+            rows = rows["items"]
+    else:
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+
+    for number, row in enumerate(rows, 1):
+        image = next((row[field] for field in IMAGE_FIELDS if row.get(field)), None)
+
+        if not row.get("name") or image is None:
+            raise ValueError(f"Manifest item {number} needs a name and an image")
+
+        items.append({
+            "name": row["name"],
+            "description": row.get("description") or "",
+            "image": image if isinstance(image, str) and os.path.isabs(image) else os.path.join(base, image),
+            "key": row.get("key") or None,
+        })
+
+    return items
+
+
+def _keyed_manifest(items) -> list:
+    """
+    Pair every manifest item with its key, the name unless a key is given
+    """
+
+    keyed = []
+    seen = {}
+
+    for item in items:
+        key = str(item.get("key") or item["name"])
+        seen[key] = seen.get(key, 0) + 1
+
+        if seen[key] > 1:
+            key = f"{key}#{seen[key]}"
+
+        keyed.append((key, item))
+
+    return keyed
+
+
+def _minting_transaction_id(minted:dict) -> int:
+    return minted.get("minting_transaction") or minted["id"]
+
+
+def _nft_transactions(page:dict, item:dict) -> list:
+    """
+    Minting transactions of the NFTs an interrupted upload may have created
+    """
+
+    return [nft["minting_transaction"] for nft in page["results"] if nft.get("name") == item["name"] and nft.get("minting_transaction")]
+
+
+class MintReport(BulkSendReport):
+    """
+    Results of a minting batch with its upload volume
+
+    Args:
+        results (list): SendResult per manifest item
+        elapsed (float): Seconds the batch took
+        bytes_uploaded (int): Image bytes uploaded by this run
+    """
+
+    def __init__(self, results:list, elapsed:float=None, bytes_uploaded:int=0) -> None:
+        super().__init__(results, elapsed=elapsed)
+        self.bytes_uploaded = bytes_uploaded
+
+    @property
+    def upload_rate(self) -> float:
+        """
+        Bytes uploaded per second
+        """
+
+        if not self.elapsed:
+            return None
+
+        return self.bytes_uploaded / self.elapsed
+
+    def __str__(self) -> str:
+        text = super().__str__()
+
+        if self.elapsed:
+            text += f", {self.bytes_uploaded / 1e6:.1f} MB uploaded ({self.upload_rate / 1e6:.2f} MB/s)"
+
+        return text
+
+
+class _Uploaded():
+    """
+    Thread-safe sum of the bytes uploaded by a batch
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def add(self, path:str):
+        size = os.path.getsize(path) if isinstance(path, str) else 0
+
+        with self._lock:
+            self.total += size
+
+
+def _progress(progress, key:str):
+    if progress is None:
+        return None
+
+    return lambda sent, total: progress(key, sent, total)
+
+
+def assets_mint_nft_many(client, manifest, max_concurrency:int=4, journal:SendJournal=None, timeout:float=None, progress=None) -> MintReport:
+    """
+    Mint the NFTs of a manifest and wait until all of them are minted
+
+    Args:
+        client (TiramisuClient):
+        manifest: Path of a CSV or JSON manifest, or a list of dicts with
+        name, description and image
+        max_concurrency (int): Maximum number of images uploaded at once
+        journal (SendJournal): Checkpoint file to record progress to and
+        resume from
+        timeout (float): Seconds to wait for each minting transaction, None
+        for the waiter default
+        progress (callable): Called as progress(key, bytes_sent, total_bytes)
+        while images are uploaded
+
+    Returns:
+        MintReport in the order of the manifest
+    """
+
+    items = load_manifest(manifest) if isinstance(manifest, str) else manifest
+    uploaded = _Uploaded()
+
+    def send(key, item):
+        minted = client.assets_mint_nft(item["name"], item["description"], item["image"], progress=_progress(progress, key))
+        uploaded.add(item["image"])
+
+        return _minting_transaction_id(minted)
+
+    def lookup(key, item):
+        return _nft_transactions(client.nfts(name=item["name"]), item)
+
+    report = run_batch(client, _keyed_manifest(items), send, lookup, journal=journal, max_concurrency=max_concurrency, status_wait_for='minted', timeout=timeout)
+
+    return MintReport(report.results, elapsed=report.elapsed, bytes_uploaded=uploaded.total)
+
+
+async def aassets_mint_nft_many(client, manifest, max_concurrency:int=4, journal:SendJournal=None, timeout:float=None, progress=None) -> MintReport:
+    """
+    asyncio counterpart of assets_mint_nft_many for AsyncTiramisuClient
+    """
+
+    items = load_manifest(manifest) if isinstance(manifest, str) else manifest
+    uploaded = _Uploaded()
+
+    async def send(key, item):
+        minted = await client.assets_mint_nft(item["name"], item["description"], item["image"], progress=_progress(progress, key))
+        uploaded.add(item["image"])
+
+        return _minting_transaction_id(minted)
+
+    async def lookup(key, item):
+        return _nft_transactions(await client.nfts(name=item["name"]), item)
+
+    report = await arun_batch(client, _keyed_manifest(items), send, lookup, journal=journal, max_concurrency=max_concurrency, status_wait_for='minted', timeout=timeout)
+
+    return MintReport(report.results, elapsed=report.elapsed, bytes_uploaded=uploaded.total)
@@ -0,0 +1,417 @@
+"""
+Typed response models.
+
+With models=True a client returns Transaction, Balance, Asset, Collection,
+Listing and Notification objects instead of dicts, and Page objects for
+list endpoints. Models keep the known fields in __slots__ and any other
+field in a small extra dict, which takes a fraction of the memory of the
+decoded JSON. Pages convert their results to models when they are first
+accessed. Models and pages still support the dict interface
+(model["id"], model.get("status"), "amount" in model), so code written
+for dicts keeps working, and to_dict() gives the plain dict back.
+
+ModelIndex looks records up by id and currency id in O(1).
+"""
+
+import collections.abc
+import sys
+
+
+class Model():
+    """
+    Base class of the response models
+
+    Subclasses list their fields in __slots__, nested maps fields to the
+    model class of nested objects and interned lists fields with few
+    distinct string values, stored once in memory.
+    """
+
+    __slots__ = ("_extra",)
+
+    nested = {}
+    interned = ()
+
+    def __init__(self, **fields) -> None:
+        self._load(fields)
+
+    def _load(self, data:dict):
+        found = 0
+
+        for name, setter, model, interned in self._plan():
+            value = data.get(name)
+
+            if value is not None:
+                found += 1
+
+                if model is not None and isinstance(value, dict):
+                    value = model.from_dict(value)
+                elif interned and type(value) is str:
+                    value = sys.intern(value)
+            elif name in data:
+                found += 1
+
+            setter(self, value)
+
+        # fields unknown to the model are rare, only look for them when some key was not used
+        self._extra = None if found == len(data) else {name: value for name, value in data.items() if name not in self._field_set()}
+
+    @classmethod
+    def _fields(cls) -> tuple:
+        fields = cls.__dict__.get("_field_cache")
+
+        if fields is None:
+            fields = tuple(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get("__slots__", ()) if not name.startswith("_"))
+            cls._field_cache = fields
+            cls._field_set_cache = frozenset(fields)
+
+        return fields
+
+    @classmethod
+    def _field_set(cls) -> frozenset:
+        cls._fields()
+
+        return cls._field_set_cache
+
+    @classmethod
+    def _plan(cls) -> tuple:
+        """
+        (name, slot setter, nested model, interned) per field, the steps of _load
+        """
+
+        plan = cls.__dict__.get("_plan_cache")
+
+        if plan is None:
+            plan = tuple((name, getattr(cls, name).__set__, cls.nested.get(name), name in cls.interned) for name in cls._fields())
+            cls._plan_cache = plan
+
+        return plan
+
+    @classmethod
+    def from_dict(cls, data:dict):
+        self = cls.__new__(cls)
+        self._load(data)
+
+        return self
+
+    def to_dict(self) -> dict:
+        """
+        Plain dict of the fields present in the response
+        """
+
+        data = {}
+
+        for name in self._fields():
+            value = getattr(self, name)
+
+            if value is not None:
+                data[name] = value.to_dict() if isinstance(value, Model) else value
+
+        if self._extra:
+            data.update(self._extra)
+
+        return data
+
+    def __getitem__(self, key:str):
+        if key in self._field_set():
+            return getattr(self, key)
+
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+
+        raise KeyError(key)
+
+    def get(self, key:str, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+
+        return default if value is None else value
+
+    def __contains__(self, key:str) -> bool:
+        if key in self._field_set():
+            return getattr(self, key) is not None
+
+        return self._extra is not None and key in self._extra
+
+    def keys(self) -> list:
+        return list(self.to_dict())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Model, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, Model) else other)
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields()[:4] if getattr(self, name) is not None)
+
+        return f"{type(self).__name__}({fields})"
+
+
+def currency_id(record) -> int:
+    """
+    Id of the asset of a record given as a dict or model, with a nested or plain currency
+    """
+
+    currency = record.get("currency")
+
+    if isinstance(currency, (dict, Model)):
+        return currency.get("id")
+
+    return currency
+
+
+class Collection(Model):
+    __slots__ = ("id", "name", "description", "picture_orig")
+
+
+class Asset(Model):
+    __slots__ = ("id", "name", "acronym", "description", "supply", "asset_id", "minting_transaction", "is_nft", "collection", "picture_orig")
+
+    nested = {"collection": Collection}
+    interned = ("name", "acronym")
+
+
+class Transaction(Model):
+    __slots__ = ("id", "status", "status_description", "amount", "description", "currency", "direction", "invoice_inbound", "invoice_outbound", "created_timestamp")
+
+    nested = {"currency": Asset}
+    interned = ("status", "status_description", "direction")
+
+    @property
+    def currency_id(self) -> int:
+        return currency_id(self)
+
+
+class Balance(Model):
+    __slots__ = ("id", "amount", "currency")
+
+    nested = {"currency": Asset}
+
+    @property
+    def currency_id(self) -> int:
+        return currency_id(self)
+
+
+class Listing(Model):
+    __slots__ = ("id", "currency", "amount", "price_sat", "user", "created_timestamp")
+
+    nested = {"currency": Asset}
+
+    @property
+    def currency_id(self) -> int:
+        return currency_id(self)
+
+
+class Notification(Model):
+    __slots__ = ("id", "title", "message", "read", "created_timestamp")
+
+
+class LazyList(collections.abc.Sequence):
+    """
+    List of raw records converted to models on first access
+
+    The raw records are never modified, they may be shared with the
+    response cache and with clients returning dicts.
+    """
+
+    __slots__ = ("_items", "_models", "_model")
+
+    def __init__(self, items:list, model:type) -> None:
+        self._items = items
+        self._models = [None] * len(items)
+        self._model = model
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._items)))]
+
+        item = self._models[index]
+
+        if item is None:
+            item = self._items[index]
+
+            if isinstance(item, dict):
+                item = self._model.from_dict(item)
+
+            self._models[index] = item
+
+        return item
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other) if isinstance(other, (list, LazyList)) else NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"LazyList({len(self._items)} {self._model.__name__})"
+
+
+class Page():
+    """
+    One page of a list endpoint
+
+    Args:
+        count (int): Number of records of the whole list
+        next (str): URL of the next page, None on the last one
+        previous (str): URL of the previous page
+        results (LazyList): Records of the page
+    """
+
+    __slots__ = ("count", "next", "previous", "results")
+
+    def __init__(self, count:int, next:str, previous:str, results:LazyList) -> None:
+        self.count = count
+        self.next = next
+        self.previous = previous
+        self.results = results
+
+    @classmethod
+    def from_dict(cls, data:dict, model:type):
+        return cls(data.get("count"), data.get("next"), data.get("previous"), LazyList(data.get("results", []), model))
+
+    def index(self):
+        return ModelIndex(self.results)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "next": self.next, "previous": self.previous, "results": [to_raw(record) for record in self.results]}
+
+    def __getitem__(self, key:str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def get(self, key:str, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __contains__(self, key:str) -> bool:
+        return key in self.__slots__
+
+    def __repr__(self) -> str:
+        return f"Page(count={self.count}, results={self.results!r})"
+
+
+class ModelIndex():
+    """
+    Records by id and by currency id, for models or dicts
+
+    Args:
+        records (iterable): Records with an "id" and optionally a "currency"
+    """
+
+    def __init__(self, records=()) -> None:
+        self._by_id = {}
+        self._by_currency = {}
+
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        old = self._by_id.get(record["id"])
+
+        if old is not None:
+            self.remove(old)
+
+        self._by_id[record["id"]] = record
+        self._by_currency.setdefault(currency_id(record), []).append(record)
+
+    def remove(self, record):
+        self._by_id.pop(record["id"], None)
+
+        records = self._by_currency.get(currency_id(record))
+
+        if records is not None:
+            records[:] = [other for other in records if other["id"] != record["id"]]
+
+    def get(self, record_id:int, default=None):
+        return self._by_id.get(record_id, default)
+
+    def by_currency(self, currency_id:int) -> list:
+        """
+        Records of an asset, e.g. its balance or its transactions
+        """
+
+        return list(self._by_currency.get(currency_id, ()))
+
+    def __getitem__(self, record_id:int):
+        return self._by_id[record_id]
+
+    def __contains__(self, record_id:int) -> bool:
+        return record_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+
+# Model of the response of each endpoint, list endpoints return a Page of them
+MODELS = {
+    "transaction": Transaction,
+    "transactions_send_taproot_asset": Transaction,
+    "transactions_send_btc": Transaction,
+    "transactions_send_btc_lnd": Transaction,
+    "transactions_send_internal": Transaction,
+    "transactions_receive_taproot_asset": Transaction,
+    "transactions_receive_btc": Transaction,
+    "transactions_receive_btc_lnd": Transaction,
+    "asset": Asset,
+    "assets_mint": Asset,
+    "assets_mint_nft": Asset,
+    "collection": Collection,
+}
+
+PAGE_MODELS = {
+    "transactions": Transaction,
+    "balances": Balance,
+    "balances_rgb": Balance,
+    "balances_nft": Balance,
+    "assets": Asset,
+    "nfts": Asset,
+    "collections": Collection,
+    "notifications": Notification,
+    "listings": Listing,
+    "listings_nfts": Listing,
+    "listings_my": Listing,
+}
+
+
+def decode_response(name:str, data):
+    """
+    Model or Page for the decoded JSON response of an endpoint, data itself
+    for endpoints without model
+    """
+
+    if not isinstance(data, dict):
+        return data
+
+    model = PAGE_MODELS.get(name)
+
+    if model is not None and "results" in data:
+        return Page.from_dict(data, model)
+
+    model = MODELS.get(name)
+
+    if model is not None:
+        return model.from_dict(data)
+
+    return data
+
+
+def to_raw(value):
+    """
+    Plain dict of a model or page, other values unchanged
+    """
+
+    if isinstance(value, (Model, Page)):
+        return value.to_dict()
+
+    return value
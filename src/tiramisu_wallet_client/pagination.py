@@ -0,0 +1,310 @@
+"""
+Helpers walking offset/limit paginated list endpoints.
+
+A page is the JSON returned by a list endpoint:
+{"count": ..., "next": ..., "previous": ..., "results": [...]}. At most
+the current page and, with prefetch, the next one are held in memory.
+With concurrency above 1 the offsets of all remaining pages are derived
+from the count of the first page and fetched in parallel, holding at most
+concurrency pages at once. An endpoint answering with a plain list is
+walked as one complete page.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+
+
+def _as_page(page) -> dict:
+    """
+    A response that is a plain list, as one complete page
+    """
+
+    if isinstance(page, list):
+        return {"count": len(page), "next": None, "previous": None, "results": page}
+
+    return page
+
+
+def _paged(fetch_page):
+
+    def fetch(**params):
+        return _as_page(fetch_page(**params))
+
+    return fetch
+
+
+def _apaged(fetch_page):
+
+    async def fetch(**params):
+        return _as_page(await fetch_page(**params))
+
+    return fetch
+
+
+def _has_next(page:dict, offset:int) -> bool:
+
+    if not page["results"]:
+        return False
+
+    if "next" in page:
+        return bool(page["next"])
+
+    return offset + len(page["results"]) < page.get("count", 0)
+
+
+def _remaining_offsets(page:dict, offset:int):
+    """
+    Offsets of the pages following the first one, based on its count
+    """
+
+    step = len(page["results"])
+
+    return range(offset + step, page.get("count", 0), step)
+
+
+def iter_pages(fetch_page, page_size:int=100, prefetch:bool=False, offset:int=0, concurrency:int=1, ordered:bool=True):
+    """
+    Yield the pages of a list endpoint one after another
+
+    Args:
+        fetch_page (callable): Called as fetch_page(offset=..., limit=...)
+        page_size (int): Number of results requested per page
+        prefetch (bool): Fetch the next page in a background thread while
+        the current one is consumed
+        offset (int): Offset of the first page
+        concurrency (int): Number of pages fetched in parallel after the
+        first one. Records created while the pages are fetched can shift
+        the offsets, use 1 for a consistent walk of a changing list
+        ordered (bool): Yield parallel pages in offset order, otherwise in
+        the order they arrive
+    """
+
+    fetch_page = _paged(fetch_page)
+
+    if concurrency > 1:
+        yield from _iter_pages_parallel(fetch_page, page_size, offset, concurrency, ordered)
+        return
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiramisu-prefetch") if prefetch else None
+    pending = None
+
+    try:
+        page = fetch_page(offset=offset, limit=page_size)
+
+        while True:
+            has_next = _has_next(page, offset)
+
+            if has_next:
+                offset += len(page["results"])
+
+                if executor is not None:
+                    pending = executor.submit(fetch_page, offset=offset, limit=page_size)
+
+            yield page
+
+            if not has_next:
+                return
+
+            if pending is not None:
+                page = pending.result()
+                pending = None
+            else:
+                page = fetch_page(offset=offset, limit=page_size)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _iter_pages_parallel(fetch_page, page_size:int, offset:int, concurrency:int, ordered:bool):
+
+    first = fetch_page(offset=offset, limit=page_size)
+
+    yield first
+
+    if not _has_next(first, offset):
+        return
+
+    offsets = iter(_remaining_offsets(first, offset))
+    in_flight = collections.deque()
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tiramisu-pages")
+
+    def submit_next():
+        for next_offset in offsets:
+            in_flight.append(executor.submit(fetch_page, offset=next_offset, limit=page_size))
+            return
+
+    try:
+        for _ in range(concurrency):
+            submit_next()
+
+        while in_flight:
+            if ordered:
+                done = [in_flight.popleft()]
+            else:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                for future in done:
+                    in_flight.remove(future)
+
+            for future in done:
+                page = future.result()
+                submit_next()
+
+                yield page
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+        executor.shutdown(wait=False)
+
+
+def iter_pages_since(fetch_page, high_water_mark:int, page_size:int=100):
+    """
+    Yield the pages of a newest-first list endpoint down to a high-water mark
+
+    Pages are read until one holds no id above high_water_mark, so only the
+    records created since the mark was taken are read (plus one page).
+
+    Args:
+        fetch_page (callable): Called as fetch_page(offset=..., limit=...)
+        high_water_mark (int): Largest id seen before
+        page_size (int): Number of results requested per page
+    """
+
+    fetch_page = _paged(fetch_page)
+    offset = 0
+
+    while True:
+        page = fetch_page(offset=offset, limit=page_size)
+
+        yield page
+
+        if not any(record["id"] > high_water_mark for record in page["results"]) or not _has_next(page, offset):
+            return
+
+        offset += len(page["results"])
+
+
+def iter_results(fetch_page, page_size:int=100, prefetch:bool=False, offset:int=0, concurrency:int=1, ordered:bool=True):
+    """
+    Yield the results of all pages of a list endpoint, see iter_pages
+    """
+
+    for page in iter_pages(fetch_page, page_size=page_size, prefetch=prefetch, offset=offset, concurrency=concurrency, ordered=ordered):
+        yield from page["results"]
+
+
+async def aiter_pages(fetch_page, page_size:int=100, prefetch:bool=False, offset:int=0, concurrency:int=1, ordered:bool=True):
+    """
+    Async version of iter_pages, fetch_page is a coroutine function
+    """
+
+    fetch_page = _apaged(fetch_page)
+
+    if concurrency > 1:
+        async for page in _aiter_pages_parallel(fetch_page, page_size, offset, concurrency, ordered):
+            yield page
+
+        return
+
+    pending = None
+
+    try:
+        page = await fetch_page(offset=offset, limit=page_size)
+
+        while True:
+            has_next = _has_next(page, offset)
+
+            if has_next:
+                offset += len(page["results"])
+
+                if prefetch:
+                    pending = asyncio.ensure_future(fetch_page(offset=offset, limit=page_size))
+
+            yield page
+
+            if not has_next:
+                return
+
+            if pending is not None:
+                page = await pending
+                pending = None
+            else:
+                page = await fetch_page(offset=offset, limit=page_size)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def _aiter_pages_parallel(fetch_page, page_size:int, offset:int, concurrency:int, ordered:bool):
+
+    first = await fetch_page(offset=offset, limit=page_size)
+
+    yield first
+
+    if not _has_next(first, offset):
+        return
+
+    offsets = iter(_remaining_offsets(first, offset))
+    in_flight = collections.deque()
+
+    def submit_next():
+        for next_offset in offsets:
+            in_flight.append(asyncio.ensure_future(fetch_page(offset=next_offset, limit=page_size)))
+            return
+
+    try:
+        for _ in range(concurrency):
+            submit_next()
+
+        while in_flight:
+            if ordered:
+                done = [in_flight.popleft()]
+            else:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    in_flight.remove(task)
+
+            for task in done:
+                page = await task
+                submit_next()
+
+                yield page
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+async def aiter_pages_since(fetch_page, high_water_mark:int, page_size:int=100):
+    """
+    Async version of iter_pages_since, fetch_page is a coroutine function
+    """
+
+    fetch_page = _apaged(fetch_page)
+    offset = 0
+
+    while True:
+        page = await fetch_page(offset=offset, limit=page_size)
+
+        yield page
+
+        if not any(record["id"] > high_water_mark for record in page["results"]) or not _has_next(page, offset):
+            return
+
+        offset += len(page["results"])
+
+
+async def aiter_results(fetch_page, page_size:int=100, prefetch:bool=False, offset:int=0, concurrency:int=1, ordered:bool=True):
+    """
+    Async version of iter_results, fetch_page is a coroutine function
+    """
+
+    async for page in aiter_pages(fetch_page, page_size=page_size, prefetch=prefetch, offset=offset, concurrency=concurrency, ordered=ordered):
+        for result in page["results"]:
+            yield result
@@ -0,0 +1,328 @@
+"""
+Client-side rate limiting.
+
+A RateLimiter holds one token bucket per endpoint class ("read", "send",
+"mint", "exchange", "auth") and optionally caps the number of requests in
+flight. One limiter can be passed to many clients, sync and async, in one
+process. FileTokenBucket keeps its state in a locked file so worker
+processes on one host share a budget.
+
+Buckets adapt to throttling: a 429 response halves the rate of the bucket
+and pauses it for the Retry-After period, every successful request then
+gives back a small part of the configured rate.
+"""
+
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def endpoint_class(request) -> str:
+    """
+    Endpoint class of a request, used to pick its bucket
+    """
+
+    name = request.name
+
+    if name in ("get_token", "register_user"):
+        return "auth"
+
+    if request.method == "GET":
+        return "read"
+
+    if "mint" in name or name == "asset_create":
+        return "mint"
+
+    if name.startswith(("buy_", "sell_", "list_")):
+        return "exchange"
+
+    return "send"
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket with reservations
+
+    reserve() always takes the tokens and returns how long the caller has
+    to wait before using them, so sync and async callers can share a bucket.
+
+    Args:
+        rate (float): Tokens added per second
+        burst (float): Size of the bucket, defaults to max(1, rate)
+        min_rate (float): Lowest rate after throttling, defaults to rate / 20
+        recovery (float): Fraction of the rate given back per successful request
+    """
+
+    def __init__(self, rate:float, burst:float=None, min_rate:float=None, recovery:float=0.05) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.recovery = recovery
+
+        self._lock = threading.Lock()
+        self._state = self._initial_state()
+        self._last_rate = rate
+
+    def _initial_state(self) -> dict:
+        return {"tokens": self.burst, "updated": self._now(), "rate": self.rate, "paused_until": 0}
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with self._lock:
+            yield self._state
+            self._last_rate = self._state["rate"]
+
+    def reserve(self, tokens:float=1) -> float:
+        """
+        Take tokens and return the seconds to wait before using them
+        """
+
+        with self._locked_state() as state:
+            now = self._now()
+
+            state["tokens"] = min(self.burst, state["tokens"] + (now - state["updated"]) * state["rate"])
+            state["updated"] = now
+            state["tokens"] -= tokens
+
+            wait = -state["tokens"] / state["rate"] if state["tokens"] < 0 else 0.0
+
+            return max(wait, state["paused_until"] - now)
+
+    def throttled(self, retry_after:float=None):
+        """
+        The server throttled a request, slow down
+        """
+
+        with self._locked_state() as state:
+            state["rate"] = max(self.min_rate, state["rate"] / 2)
+
+            if retry_after:
+                state["paused_until"] = max(state["paused_until"], self._now() + retry_after)
+
+    def succeeded(self):
+        """
+        A request went through, recover towards the configured rate
+        """
+
+        # rate seen by the last locked access, saves taking the lock (and
+        # for FileTokenBucket the file lock) while the bucket is at full rate
+        if self._last_rate >= self.rate:
+            return
+
+        with self._locked_state() as state:
+            state["rate"] = min(self.rate, state["rate"] + self.rate * self.recovery)
+
+    @property
+    def current_rate(self) -> float:
+        with self._locked_state() as state:
+            return state["rate"]
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket whose state lives in a file locked with flock, shared by
+    all processes on the host using the same path (POSIX only)
+
+    Args:
+        path (str): Path of the state file
+        rate (float): Tokens added per second
+        burst (float): Size of the bucket, defaults to max(1, rate)
+        min_rate (float): Lowest rate after throttling, defaults to rate / 20
+        recovery (float): Fraction of the rate given back per successful request
+    """
+
+    def __init__(self, path:str, rate:float, burst:float=None, min_rate:float=None, recovery:float=0.05) -> None:
+        if fcntl is None:
+            raise ImportError("FileTokenBucket requires fcntl, which is not available on this platform")
+
+        self.path = path
+
+        super().__init__(rate, burst=burst, min_rate=min_rate, recovery=recovery)
+
+    def _now(self) -> float:
+        return time.time()
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+
+                raw = os.read(fd, 4096)
+
+                try:
+                    state = json.loads(raw)
+                except ValueError:
+                    state = self._initial_state()
+
+                yield state
+
+                self._last_rate = state["rate"]
+
+                data = json.dumps(state).encode()
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+
+
+class RateLimiter():
+    """
+    Rate limits per endpoint class and a cap on requests in flight
+
+    Args:
+        buckets (dict): Token bucket per endpoint class, classes without a
+        bucket are not rate limited
+        max_in_flight (int): Maximum number of requests sent at the same
+        time, None for no cap
+        classify (callable): Maps a Request to its endpoint class
+    """
+
+    def __init__(self, buckets:dict=None, max_in_flight:int=None, classify=endpoint_class) -> None:
+        self.buckets = dict(buckets or {})
+        self.max_in_flight = max_in_flight
+        self.classify = classify
+
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        # (loop, future) of async callers waiting for a slot, oldest first
+        self._async_waiters = collections.deque()
+
+    def _bucket(self, request):
+        return self.buckets.get(self.classify(request))
+
+    async def _enter_async(self):
+
+        while True:
+            with self._cond:
+                if self.max_in_flight is None or self._in_flight < self.max_in_flight:
+                    self._in_flight += 1
+                    return
+
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+                    elif waiter.done() and not waiter.cancelled():
+                        # woken but not entering, hand the slot on
+                        self._wake_async()
+
+                raise
+
+    def _wake_async(self):
+        """
+        Wake the oldest async caller waiting for a slot, called holding _cond
+        """
+
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+
+            try:
+                loop.call_soon_threadsafe(self._resolve, waiter)
+                return
+            except RuntimeError:
+                # its loop is closed
+                continue
+
+    def _resolve(self, waiter):
+
+        if waiter.cancelled():
+            with self._cond:
+                self._wake_async()
+        else:
+            waiter.set_result(None)
+
+    @contextlib.contextmanager
+    def limit(self, request):
+        """
+        Wait for a token and a free slot, blocking the calling thread
+        """
+
+        bucket = self._bucket(request)
+
+        if bucket is not None:
+            wait = bucket.reserve()
+
+            if wait > 0:
+                time.sleep(wait)
+
+        with self._cond:
+            while self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+                self._cond.wait()
+
+            self._in_flight += 1
+
+        try:
+            yield
+        finally:
+            self._leave()
+
+    @contextlib.asynccontextmanager
+    async def limit_async(self, request):
+        """
+        Wait for a token and a free slot without blocking the event loop
+        """
+
+        bucket = self._bucket(request)
+
+        if bucket is not None:
+            wait = bucket.reserve()
+
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        await self._enter_async()
+
+        try:
+            yield
+        finally:
+            self._leave()
+
+    def _leave(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+            self._wake_async()
+
+    def record(self, request, status:int, retry_after:float=None):
+        """
+        Adapt the bucket of a request to the status of its response
+        """
+
+        if status == 429:
+            self.throttled(request, retry_after)
+        elif status < 400:
+            self.succeeded(request)
+
+    def throttled(self, request, retry_after:float=None):
+        bucket = self._bucket(request)
+
+        if bucket is not None:
+            bucket.throttled(retry_after)
+
+    def succeeded(self, request):
+        bucket = self._bucket(request)
+
+        if bucket is not None:
+            bucket.succeeded()
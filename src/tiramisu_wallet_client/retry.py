@@ -0,0 +1,170 @@
+"""
+Retry policy for failed requests.
+
+Requests are retried when they are safe to repeat: reads, requests
+carrying an idempotency key and requests that failed before anything was
+sent. Other requests are only retried by endpoints that can confirm the
+failed attempt did not land (see RetryPolicy.confirm_sends).
+"""
+
+import email.utils
+import threading
+import time
+
+from .waiter import Backoff
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class RetryBudget():
+    """
+    Limits retries to a fraction of the requests to avoid retry storms
+
+    Every request deposits ratio tokens, every retry takes one. A floor of
+    min_per_second retries is always allowed.
+
+    Args:
+        ratio (float): Retries allowed per request
+        min_per_second (float): Retries allowed per second regardless of traffic
+        max_tokens (float): Most tokens that can be saved up
+        initial_tokens (float): Tokens available right away
+    """
+
+    def __init__(self, ratio:float=0.2, min_per_second:float=1, max_tokens:float=100, initial_tokens:float=10) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+
+        self._tokens = min(float(initial_tokens), max_tokens)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, tokens:float):
+        now = time.monotonic()
+        self._tokens = min(self.max_tokens, self._tokens + tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            self._refill(0)
+
+            if self._tokens < 1:
+                return False
+
+            self._tokens -= 1
+
+            return True
+
+
+class ErrorInfo():
+    """
+    What a client knows about a failed request
+
+    Args:
+        status (int): HTTP status of the response, None without response
+        retry_after (float): Seconds asked for by a Retry-After header
+        sent (bool): The request may have reached the server
+    """
+
+    __slots__ = ("status", "retry_after", "sent")
+
+    def __init__(self, status:int=None, retry_after:float=None, sent:bool=True) -> None:
+        self.status = status
+        self.retry_after = retry_after
+        self.sent = sent
+
+
+def parse_retry_after(value:str) -> float:
+    """
+    Seconds to wait from a Retry-After header, given in seconds or as a date
+    """
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy():
+    """
+    Decides whether and when a failed request is sent again
+
+    Args:
+        max_attempts (int): Attempts including the first one, 1 disables retries
+        backoff (Backoff): Delays between attempts
+        retry_statuses (tuple): HTTP statuses worth retrying
+        respect_retry_after (bool): Wait at least as long as a Retry-After
+        header asks for
+        max_retry_after (float): Give up when Retry-After asks for longer
+        budget (RetryBudget): Shared limit on the number of retries, None for
+        no limit
+        confirm_sends (bool): Let send endpoints that can look their
+        transaction up by description retry without an idempotency key. This
+        costs one extra request per send
+    """
+
+    def __init__(self, max_attempts:int=4, backoff:Backoff=None, retry_statuses:tuple=RETRY_STATUSES, respect_retry_after:bool=True, max_retry_after:float=60, budget:RetryBudget=None, confirm_sends:bool=False) -> None:
+        self.max_attempts = max_attempts
+        self.backoff = backoff or Backoff(initial=0.5, maximum=30, factor=2, jitter=0.2)
+        self.retry_statuses = retry_statuses
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+        self.budget = budget if budget is not None else RetryBudget()
+        self.confirm_sends = confirm_sends
+
+    def is_idempotent(self, request) -> bool:
+        return request.method in SAFE_METHODS or request.idempotency_key is not None
+
+    def record_request(self):
+        if self.budget is not None:
+            self.budget.deposit()
+
+    def retry_delay(self, request, attempt:int, error_info:ErrorInfo, confirmed:bool=False) -> float:
+        """
+        Seconds to wait before the next attempt, None when not retrying
+
+        Args:
+            request (Request): The failed request
+            attempt (int): Number of the failed attempt, starting at 1
+            error_info (ErrorInfo): Details of the failure, None when the
+            failure is not a transport or HTTP error
+            confirmed (bool): The caller confirmed that the failed attempt
+            did not land
+        """
+
+        if error_info is None or attempt >= self.max_attempts:
+            return None
+
+        if error_info.status is not None and error_info.status not in self.retry_statuses:
+            return None
+
+        if error_info.sent and not confirmed and not self.is_idempotent(request):
+            return None
+
+        delay = self.backoff.initial * self.backoff.factor ** (attempt - 1)
+        delay = self.backoff.jittered(min(delay, self.backoff.maximum))
+
+        if self.respect_retry_after and error_info.retry_after is not None:
+            if error_info.retry_after > self.max_retry_after:
+                return None
+
+            delay = max(delay, error_info.retry_after)
+
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+
+        return delay
@@ -0,0 +1,55 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 30
+
+
+def create_session(pool_connections:int=10, pool_maxsize:int=10, pool_block:bool=False, keep_alive:bool=True) -> requests.Session:
+    """
+    Create a pooled HTTP session that can be shared by many TiramisuClient objects
+
+    Args:
+        pool_connections (int): Number of per-host connection pools to keep
+        pool_maxsize (int): Maximum number of open connections kept per host
+        pool_block (bool): Block when all connections of a host are in use
+        instead of opening throwaway connections above pool_maxsize
+        keep_alive (bool): Reuse connections between requests. When disabled
+        every request sends "Connection: close"
+    """
+
+    session = requests.Session()
+
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    return session
+
+
+def create_async_session(limit:int=100, limit_per_host:int=0, keep_alive:bool=True, keepalive_timeout:float=15):
+    """
+    Create a pooled aiohttp session that can be shared by many AsyncTiramisuClient objects
+
+    Must be called while an event loop is running. Requires the optional
+    aiohttp dependency (pip install tiramisu-wallet-client[async]).
+
+    Args:
+        limit (int): Maximum number of open connections
+        limit_per_host (int): Maximum number of open connections per host,
+        0 means no per-host limit
+        keep_alive (bool): Reuse connections between requests
+        keepalive_timeout (float): Seconds an idle connection is kept open
+    """
+
+    import aiohttp
+
+    if keep_alive:
+        connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, keepalive_timeout=keepalive_timeout)
+    else:
+        connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit_per_host, force_close=True)
+
+    return aiohttp.ClientSession(connector=connector)
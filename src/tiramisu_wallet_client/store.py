@@ -0,0 +1,279 @@
+"""
+Local SQLite mirror of transactions, balances and notifications.
+
+SyncStore.sync() loads the whole history once and afterwards only what
+changed: the list endpoints return the newest records first, so pages are
+read until one holds nothing above the stored high-water mark (the largest
+id seen). Transactions not yet in a final status are refreshed on every
+sync, from the pages already read when they are on them and one by one
+otherwise. Balances are small and replaced on every sync.
+
+Queries on the store read the local database and make no requests.
+"""
+
+import concurrent.futures
+import json
+import sqlite3
+import threading
+
+from .models import currency_id as _currency_id, to_raw
+from .pagination import iter_pages, iter_pages_since
+
+# Statuses after which a transaction does not change any more, statuses
+# ending in "_finished" or "_paid" are final as well
+FINAL_STATUSES = frozenset(("error", "minted", "internal_finished", "exchange_finished", "outbound_invoice_paid", "lnd_inbound_invoice_paid"))
+
+
+def is_final(status:str, final_statuses=FINAL_STATUSES) -> bool:
+    """
+    Whether a transaction in this status does not change any more
+    """
+
+    return status in final_statuses or status.endswith(("_finished", "_paid"))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (id INTEGER PRIMARY KEY, status TEXT, currency_id INTEGER, description TEXT, final INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS transactions_status ON transactions (status);
+CREATE INDEX IF NOT EXISTS transactions_currency_id ON transactions (currency_id);
+CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description);
+CREATE INDEX IF NOT EXISTS transactions_pending ON transactions (final) WHERE final = 0;
+CREATE TABLE IF NOT EXISTS balances (id INTEGER PRIMARY KEY, currency_id INTEGER, data TEXT);
+CREATE INDEX IF NOT EXISTS balances_currency_id ON balances (currency_id);
+CREATE TABLE IF NOT EXISTS notifications (id INTEGER PRIMARY KEY, data TEXT);
+CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+
+class SyncStore():
+    """
+    SQLite database mirroring the wallet of one user
+
+    Args:
+        path (str): Path of the database file, ":memory:" for a temporary store
+        final_statuses (set): Transaction statuses that end polling, in
+        addition to statuses ending in "_finished" or "_paid"
+    """
+
+    def __init__(self, path:str, final_statuses:set=FINAL_STATUSES) -> None:
+        self.path = path
+        self.final_statuses = frozenset(final_statuses)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def is_final(self, status:str) -> bool:
+        return is_final(status, self.final_statuses)
+
+    def high_water_mark(self, name:str) -> int:
+        """
+        Largest id synced of "transactions" or "notifications", None before the first sync
+        """
+
+        with self._lock:
+            row = self._db.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+
+        return None if row is None else row[0]
+
+    def sync(self, client, transactions:bool=True, balances:bool=True, notifications:bool=True, page_size:int=100, concurrency:int=8) -> dict:
+        """
+        Bring the store up to date
+
+        Args:
+            client (TiramisuClient):
+            transactions (bool): Sync transactions
+            balances (bool): Sync balances
+            notifications (bool): Sync notifications
+            page_size (int): Page size of the list endpoints
+            concurrency (int): Pending transactions refreshed at once
+
+        Returns:
+            dict with the number of new and updated records per kind
+        """
+
+        stats = {}
+
+        if transactions:
+            stats.update(self._sync_transactions(client, page_size, concurrency))
+
+        if balances:
+            stats["balances"] = self._sync_balances(client, page_size)
+
+        if notifications:
+            stats["notifications_new"] = self._sync_notifications(client, page_size)
+
+        return stats
+
+    def _pages_since(self, fetch_page, high_water_mark:int, page_size:int):
+        """
+        Pages of a newest-first list endpoint down to the high-water mark
+        """
+
+        # pages fetched in parallel can miss records shifted across page
+        # boundaries while walking, and the high-water mark would skip them for good
+        if high_water_mark is None:
+            return iter_pages(fetch_page, page_size=page_size)
+
+        return iter_pages_since(fetch_page, high_water_mark, page_size=page_size)
+
+    def _sync_transactions(self, client, page_size:int, concurrency:int) -> dict:
+
+        high_water_mark = self.high_water_mark("transactions")
+
+        with self._lock:
+            pending = {row[0] for row in self._db.execute("SELECT id FROM transactions WHERE final = 0")}
+
+        new, updated, top = 0, 0, high_water_mark
+
+        for page in self._pages_since(client.transactions, high_water_mark, page_size):
+            records = page["results"]
+
+            for transaction_dict in records:
+                top = transaction_dict["id"] if top is None else max(top, transaction_dict["id"])
+
+                if high_water_mark is None or transaction_dict["id"] > high_water_mark:
+                    new += 1
+                elif transaction_dict["id"] in pending:
+                    updated += 1
+
+                pending.discard(transaction_dict["id"])
+
+            self._save_transactions(records)
+
+        if pending:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tiramisu-sync") as executor:
+                refreshed = list(executor.map(client.transaction, sorted(pending)))
+
+            self._save_transactions(refreshed)
+            updated += len(refreshed)
+
+        self._set_high_water_mark("transactions", top)
+
+        return {"transactions_new": new, "transactions_updated": updated}
+
+    def _save_transactions(self, records:list):
+
+        rows = [(record["id"], record.get("status"), _currency_id(record), record.get("description"), int(self.is_final(record.get("status") or "")), json.dumps(to_raw(record))) for record in records]
+
+        if not rows:
+            return
+
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO transactions (id, status, currency_id, description, final, data) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def _sync_balances(self, client, page_size:int) -> int:
+
+        rows = [(record["id"], _currency_id(record), json.dumps(to_raw(record))) for page in iter_pages(client.balances, page_size=page_size) for record in page["results"]]
+
+        with self._lock:
+            self._db.execute("DELETE FROM balances")
+            self._db.executemany("INSERT INTO balances (id, currency_id, data) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+        return len(rows)
+
+    def _sync_notifications(self, client, page_size:int) -> int:
+
+        high_water_mark = self.high_water_mark("notifications")
+
+        new, top = 0, high_water_mark
+
+        for page in self._pages_since(client.notifications, high_water_mark, page_size):
+            rows = [(record["id"], json.dumps(to_raw(record))) for record in page["results"] if high_water_mark is None or record["id"] > high_water_mark]
+
+            if not rows:
+                continue
+
+            with self._lock:
+                self._db.executemany("INSERT OR REPLACE INTO notifications (id, data) VALUES (?, ?)", rows)
+                self._db.commit()
+
+            new += len(rows)
+            top = max(row[0] for row in rows) if top is None else max(top, *(row[0] for row in rows))
+
+        self._set_high_water_mark("notifications", top)
+
+        return new
+
+    def _set_high_water_mark(self, name:str, value:int):
+        # only moved once a walk is complete, so an interrupted sync starts
+        # over from the previous mark instead of skipping records
+        if value is None:
+            return
+
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO sync_state (name, value) VALUES (?, ?)", (name, value))
+            self._db.execute("UPDATE sync_state SET value = max(value, ?) WHERE name = ?", (value, name))
+            self._db.commit()
+
+    def transactions(self, status:str=None, currency_id:int=None, description:str=None, pending:bool=None, limit:int=None) -> list:
+        """
+        Transactions of the store, newest first
+
+        Args:
+            status (str): Only transactions in this status
+            currency_id (int): Only transactions of this asset
+            description (str): Only transactions with this description
+            pending (bool): Only transactions not (True) or already (False)
+            in a final status
+            limit (int): Maximum number of transactions returned
+        """
+
+        where, args = [], []
+
+        for column, value in (("status", status), ("currency_id", currency_id), ("description", description)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+
+        if pending is not None:
+            where.append("final = ?")
+            args.append(0 if pending else 1)
+
+        query = "SELECT data FROM transactions"
+
+        if where:
+            query += " WHERE " + " AND ".join(where)
+
+        query += " ORDER BY id DESC"
+
+        if limit is not None:
+            query += " LIMIT ?"
+            args.append(limit)
+
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute(query, args)]
+
+    def transaction(self, transaction_id:int) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM transactions WHERE id = ?", (transaction_id,)).fetchone()
+
+        return None if row is None else json.loads(row[0])
+
+    def balances(self) -> list:
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute("SELECT data FROM balances ORDER BY id")]
+
+    def balance(self, currency_id:int) -> dict:
+        """
+        Balance of an asset, None when the wallet holds none
+        """
+
+        with self._lock:
+            row = self._db.execute("SELECT data FROM balances WHERE currency_id = ?", (currency_id,)).fetchone()
+
+        return None if row is None else json.loads(row[0])
+
+    def notifications(self, limit:int=None) -> list:
+        """
+        Notifications of the store, newest first
+        """
+
+        with self._lock:
+            return [json.loads(row[0]) for row in self._db.execute("SELECT data FROM notifications ORDER BY id DESC LIMIT ?", (-1 if limit is None else limit,))]
+
+    def close(self):
+        self._db.close()
@@ -1,526 +1,493 @@
+import functools
+import logging
+import threading
+import time
 
 import requests
-import time 
-import socket
-import sys
-import urllib.parse
-
+import urllib3
+
+from .bulk import BulkSendReport, SendJournal, send_internal_many
+from .cache import ResponseCache
+from .decoding import JSONDecoder, get_decoder
+from .endpoints import (
+    Sleep,
+    WaitStatus,
+    authenticate,
+    bind_endpoints,
+    login,
+    resolve_base_url,
+    resolve_btc_asset_id,
+)
+from .events import KINDS, EventHub
+from .exceptions import RequestError
+from .metrics import RequestEvent, emit
+from .minting import MintReport, assets_mint_nft_many
+from .models import decode_response
+from .pagination import iter_results
+from .ratelimit import RateLimiter
+from .retry import ErrorInfo, RetryPolicy, parse_retry_after
+from .session import DEFAULT_TIMEOUT, create_session
+from .tokens import token_key
+from .upload import MultipartEncoder
+from .users import UserResolver, get_user_ids
+from .waiter import TransactionWaiter
+
+logger = logging.getLogger(__name__)
+
+
+@bind_endpoints
 class TiramisuClient():
-    
-    def __init__(self, username:str, password:str, network:str="testnet", server_url:str=None, register_new_user:bool=False) -> None:
-        
-        if server_url:
-            self.base_url = server_url
-        else:
-            if network=='testnet':
-                self.base_url = "https://testnet.tarowallet.net/walletapp/"
-            elif network=='mainnet':
-                self.base_url = "https://mainnet.tiramisuwallet.com/walletapp/"
-            else:    
-                raise Exception(f"Unknown value '{network}' supplies for network argument.")
-        
+    """
+    Blocking client for the Tiramisu wallet API
+
+    Every endpoint defined in the endpoints module is available as a method,
+    e.g. client.balances(), client.transaction(id) or
+    client.transactions_send_internal_wait_sent(...).
+    """
+
+    def __init__(self, username:str, password:str, network:str="testnet", server_url:str=None, register_new_user:bool=False, session:requests.Session=None, timeout=DEFAULT_TIMEOUT, pool_connections:int=10, pool_maxsize:int=10, keep_alive:bool=True, waiter:TransactionWaiter=None, cache:ResponseCache=None, lazy:bool=False, token_store=None, auth_token:str=None, btc_asset_id:int=None, hooks:list=None, retry_policy:RetryPolicy=None, rate_limiter:RateLimiter=None, models:bool=False, json_decoder:JSONDecoder=None, user_resolver:UserResolver=None) -> None:
+        """
+        Create a client and log in
+
+        Credentials found in token_store or passed as auth_token and
+        btc_asset_id are used without network calls. With lazy=True the
+        missing ones are fetched on first use instead of here.
+
+        Args:
+            username (str):
+            password (str):
+            network (str): "testnet" or "mainnet"
+            server_url (str): Overrides the URL derived from network
+            register_new_user (bool): Register the user before logging in
+            session (requests.Session): Connection pool to use. Pass the same
+            session (see create_session) to many clients to share one pool
+            timeout (float or tuple): Timeout in seconds for every request,
+            or a (connect, read) tuple
+            pool_connections (int): Number of per-host pools when the client
+            creates its own session
+            pool_maxsize (int): Connections kept per host when the client
+            creates its own session
+            keep_alive (bool): Reuse connections when the client creates its
+            own session
+            waiter (TransactionWaiter): Poller used by the *_wait_* methods.
+            Pass the same waiter to many clients to poll from one place
+            cache (ResponseCache): Cache for read-mostly endpoints such as
+            asset() and assets(). Pass the same cache to many clients to
+            share it
+            lazy (bool): Defer logging in and the BTC asset lookup until
+            they are needed
+            token_store (MemoryTokenStore or FileTokenStore): Store to load
+            credentials from and save new ones to
+            auth_token (str): Auth token obtained earlier
+            btc_asset_id (int): Id of the BTC asset obtained earlier
+            hooks (list): Callables called with a RequestEvent after every
+            HTTP call, e.g. a RequestMetrics object
+            retry_policy (RetryPolicy): When to repeat failed requests,
+            RetryPolicy(max_attempts=1) disables retries
+            rate_limiter (RateLimiter): Limits the request rate per endpoint
+            class and the requests in flight, can be shared between clients
+            models (bool): Return typed models (Transaction, Balance, Page,
+            ...) instead of dicts, see the models module
+            json_decoder (JSONDecoder): Decoder of response bodies, defaults
+            to the fastest installed JSON backend
+            user_resolver (UserResolver): Cache of the user ids looked up by
+            get_user_id(), can be shared between clients
+        """
+
+        self._owns_session = session is None
+
+        if session is None:
+            session = create_session(pool_connections=pool_connections, pool_maxsize=pool_maxsize, keep_alive=keep_alive)
+
+        self.session = session
+        self.timeout = timeout
+
+        self.base_url = resolve_base_url(network, server_url)
+
+        self._owns_waiter = waiter is None
+        self.waiter = waiter or TransactionWaiter(self)
+
+        self.cache = cache
+        self.hooks = list(hooks or [])
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.models = models
+        self.json_decoder = json_decoder or get_decoder()
+        self.user_resolver = user_resolver or UserResolver()
+        self._event_hub = None
+        self._event_hub_lock = threading.Lock()
+
         self.username = username
         self.password = password
-        
-        if register_new_user:
-            self.register_user()
-            
-        self.auth_token = self.get_token()
-        
-        self.headers = {'Authorization':f'Token {self.auth_token}'}
-    
-        assets = self.assets(limit=10,name="Bitcoin")
-        
-        self.btc_asset_id = assets["results"][0]["id"]
-        
-    def register_user(self):
+
+        self.token_store = token_store
+        self.auth_token = auth_token
+        self._btc_asset_id = btc_asset_id
+        self._register_new_user = register_new_user
+        self._auth_lock = threading.Lock()
+
+        if token_store is not None and auth_token is None:
+            stored = token_store.load(token_key(self.base_url, username))
+
+            if stored:
+                self.auth_token = stored.get("auth_token")
+                self._btc_asset_id = self._btc_asset_id or stored.get("btc_asset_id")
+
+        if not lazy:
+            self._run(login(self))
+
+    @classmethod
+    def from_token(cls, username:str, auth_token:str, btc_asset_id:int=None, password:str=None, **kwargs):
         """
-        Register a new user
+        Create a client from credentials obtained earlier without network calls
 
         Args:
+            username (str):
+            auth_token (str):
+            btc_asset_id (int): Looked up on first use when not given
+            password (str): Needed to log in again when the token is rejected
+            **kwargs: Other arguments of TiramisuClient
         """
-        
-        url = "api/user/register/"
-        
-        res = requests.post(self.base_url + url, data={"username": self.username, "password":self.password})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
 
-    def get_token(self):
+        return cls(username, password, auth_token=auth_token, btc_asset_id=btc_asset_id, lazy=True, **kwargs)
+
+    @property
+    def btc_asset_id(self) -> int:
+        if self._btc_asset_id is None:
+            self._run(resolve_btc_asset_id(self))
+
+        return self._btc_asset_id
+
+    @btc_asset_id.setter
+    def btc_asset_id(self, value:int):
+        self._btc_asset_id = value
+
+    @property
+    def event_hub(self) -> EventHub:
+        """
+        Hub feeding stream_events(), created on first use. Assign an
+        EventHub(client, ...) before streaming to configure it
         """
-        Register a new user
 
-        Args:
-            username (str): 
-            password (str): 
+        with self._event_hub_lock:
+            if self._event_hub is None:
+                self._event_hub = EventHub(self)
+
+        return self._event_hub
+
+    @event_hub.setter
+    def event_hub(self, value:EventHub):
+        self._event_hub = value
+
+    @property
+    def headers(self) -> dict:
+        if self.auth_token is None:
+            self._authenticate(None)
+
+        return {'Authorization':f'Token {self.auth_token}'}
+
+    def _authenticate(self, rejected_token:str):
+        """
+        Log in unless another thread replaced the rejected token meanwhile
         """
-        
-        url = "api/token-auth/"
-        
-        res = requests.post(self.base_url + url, data={"username": self.username, "password":self.password})
-        
-        self.raise_with_text(res)
-        
-        return res.json()["token"]
 
-        
-    def raise_with_text(self, res:dict):
-        print(res.url)
-        try: 
-            res.raise_for_status()
-        except Exception as e:
-            # with open("error.txt",'w') as f:
-            #     f.write(res.text)
-            raise Exception(res.text) from e
-    
-    def balance_create(self, asset: str):
+        with self._auth_lock:
+            if self.auth_token == rejected_token:
+                self._run(authenticate(self))
+
+    @staticmethod
+    def _endpoint_method(op):
+
+        def method(self, *args, **kwargs):
+            return self._run(op(self, *args, **kwargs))
+
+        return method
+
+    @staticmethod
+    def _iter_method(name):
+
+        def method(self, page_size:int=100, prefetch:bool=False, concurrency:int=1, ordered:bool=True, **filters):
+            return iter_results(functools.partial(getattr(self, name), **filters), page_size=page_size, prefetch=prefetch, concurrency=concurrency, ordered=ordered)
+
+        return method
+
+    def _run(self, operation):
+        """
+        Execute the requests yielded by an endpoint generator and return its result
         """
-        Create a new balance in the current user account
 
-        Args:
-            asset (str): Acronym of the asset to create 
-            new balance for
+        result, error = None, None
+
+        while True:
+            try:
+                if error is not None:
+                    step = operation.throw(error)
+                else:
+                    step = operation.send(result)
+            except StopIteration as stop:
+                return stop.value
+
+            result, error = None, None
+
+            try:
+                if isinstance(step, WaitStatus):
+                    result = self.waiter.wait(step.transaction_id, step.status_wait_for, client=self, timeout=step.timeout)
+                elif isinstance(step, Sleep):
+                    time.sleep(step.seconds)
+                else:
+                    result = self._send(step)
+
+                    if self.models and step.decode:
+                        result = decode_response(step.name, result)
+            except Exception as e:
+                error = e
+
+    def _send(self, request):
+
+        if self.cache is not None and self.cache.cacheable(request):
+            cache_key = self.cache.key(self.base_url, request)
+            cached = self.cache.get(cache_key, request.name)
+
+            if cached is not None:
+                return cached
+
+            result = self._fetch_retrying(request)
+            self.cache.set(cache_key, request.name, result)
+
+            return result
+
+        result = self._fetch_retrying(request)
+
+        if self.cache is not None:
+            for name in request.invalidates:
+                self.cache.invalidate(name)
+
+        return result
+
+    def _fetch_retrying(self, request):
+
+        self.retry_policy.record_request()
+
+        attempt = 1
+
+        while True:
+            try:
+                return self._fetch(request)
+            except Exception as error:
+                delay = self.retry_policy.retry_delay(request, attempt, self._error_info(error))
+
+                if delay is None:
+                    raise
+
+                logger.debug("Retrying %s %s in %.2fs after attempt %s failed: %r", request.method, request.url, delay, attempt, error, extra={"event": "retry", "endpoint": request.name, "attempt": attempt, "delay": delay})
+
+                time.sleep(delay)
+
+                attempt += 1
+
+    def _error_info(self, error:Exception) -> ErrorInfo:
+        """
+        Describe a failed request for the retry policy, None if it is not an HTTP or transport error
         """
-        
-        url = "api/balance/create/"
-        
-        res = requests.post(self.base_url + url, data={"currency": asset}, headers=self.headers)
-        
+
+        if isinstance(error, RequestError):
+            return ErrorInfo(status=error.status, retry_after=error.retry_after)
+
+        if isinstance(error, requests.ConnectTimeout):
+            return ErrorInfo(sent=False)
+
+        if isinstance(error, requests.ConnectionError):
+            reason = getattr(error.args[0], "reason", None) if error.args else None
+
+            return ErrorInfo(sent=not isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError)))
+
+        if isinstance(error, requests.Timeout):
+            return ErrorInfo()
+
+        return None
+
+    def _fetch(self, request):
+
+        headers = self.headers if request.auth else None
+
+        if request.idempotency_key is not None:
+            headers = dict(headers or {}, **{"Idempotency-Key": request.idempotency_key})
+
+        res = self._perform_limited(request, headers)
+
+        if res.status_code == 401 and request.auth and self.password is not None:
+            self._authenticate(headers['Authorization'][len('Token '):])
+
+            headers = dict(headers, Authorization=self.headers['Authorization'])
+
+            res = self._perform_limited(request, headers)
+
         self.raise_with_text(res)
-        
-    def get_btc_balance(self):
+
+        if request.decode:
+            return self.json_decoder.loads(res.content)
+
+    def _perform_limited(self, request, headers:dict):
         """
-        List all asset balances in the current user account
+        Wait for the rate limiter before the HTTP call and report the status to it
         """
-        
-        balances = self.balances()
-        
-        balances_dict = {bal["currency"]["id"]: bal for bal in balances["results"]}
-        
-        return balances_dict[self.btc_asset_id]
-        
-    def balances(self, offset=0, limit=100):
+
+        if self.rate_limiter is None:
+            return self._perform(request, headers)
+
+        with self.rate_limiter.limit(request):
+            res = self._perform(request, headers)
+
+        self.rate_limiter.record(request, res.status_code, parse_retry_after(res.headers.get("Retry-After")))
+
+        return res
+
+    def _perform(self, request, headers:dict):
         """
-        List all asset balances in the current user account
+        Make the HTTP call of a request and report it to the hooks
         """
-        url = "api/balances/"
-        
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def balances_rgb(self, offset=0, limit=100):
+
+        data = request.data
+
+        if request.files:
+            # rebuilt for every attempt, it streams the uploads from the start
+            data = MultipartEncoder(request.data, request.files)
+            headers = dict(headers or {}, **data.headers)
+
+        if not self.hooks:
+            return self._request(request.method, request.url, params=request.params, data=data, headers=headers)
+
+        status, bytes_sent, bytes_received, error = None, 0, 0, None
+        start = time.perf_counter()
+
+        try:
+            res = self._request(request.method, request.url, params=request.params, data=data, headers=headers)
+
+            status = res.status_code
+            bytes_sent = int(res.request.headers.get("Content-Length") or 0)
+            bytes_received = len(res.content)
+
+            return res
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            emit(self.hooks, RequestEvent(request.name, request.method, self.base_url + request.url, status, bytes_sent, bytes_received, time.perf_counter() - start, error))
+
+    def _request(self, method:str, url:str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+
+        return self.session.request(method, self.base_url + url, **kwargs)
+
+    def send_internal_many(self, items, max_concurrency:int=8, journal:SendJournal=None, status_wait_for:str='internal_finished', timeout:float=None, idempotency_prefix:str=None) -> BulkSendReport:
         """
-        List all asset RGB balances in the current user account
+        Send many internal transfers with bounded concurrency and wait for
+        all of them with the shared waiter, see bulk.send_internal_many
+
+        Args:
+            items (iterable): (destination_user, asset, amount, description)
+            tuples, optionally with a unique key as fifth element
+            max_concurrency (int): Maximum number of transfers submitted at once
+            journal (SendJournal): Journal making the batch resumable
+            status_wait_for (str): Status of a finished transfer
+            timeout (float): Seconds to wait for each transaction
+            idempotency_prefix (str): Send every transfer with the
+            idempotency key prefix + key
+
+        Returns:
+            BulkSendReport with one SendResult per item
         """
-        url = "api/balances-rgb/"
-        
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def balances_nft(self, offset=0, limit=100):
+
+        return send_internal_many(self, items, max_concurrency=max_concurrency, journal=journal, status_wait_for=status_wait_for, timeout=timeout, idempotency_prefix=idempotency_prefix)
+
+    def assets_mint_nft_many(self, manifest, max_concurrency:int=4, journal:SendJournal=None, timeout:float=None, progress=None) -> MintReport:
         """
-        List all NFT balances in the current user account
+        Mint the NFTs of a CSV or JSON manifest with bounded concurrency and
+        wait until all are minted, see minting.assets_mint_nft_many
+
+        Args:
+            manifest: Path of the manifest or list of dicts with name,
+            description and image
+            max_concurrency (int): Maximum number of images uploaded at once
+            journal (SendJournal): Checkpoint file making the run resumable
+            timeout (float): Seconds to wait for each minting transaction
+            progress (callable): Called as progress(key, bytes_sent, total_bytes)
+
+        Returns:
+            MintReport with one SendResult per item
         """
-        
-        url = "api/balances-nft/"
-        
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def asset_create(self, acronym:str, asset_id:str, file_path:str=None):
-        url = "api/currency/create/"
-        
-        if file_path:
-            with open(file_path,'rb') as f:
-                picture_orig = f.read()
-        else:
-            picture_orig = None
-        
-        res = requests.post(self.base_url + url, data={"acronym": acronym, "asset_id":asset_id}, files={"picture_orig":picture_orig }, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def assets_mint(self, acronym:str, name:str, description:str, supply:int, file_path:str):
-        url = "api/currencies/mint/"
-        
-        if file_path:
-            with open(file_path,'rb') as f:
-                picture_orig = f.read()
-        else:
-            picture_orig = None
-        
-        data = {
-                "acronym": acronym, 
-                "name":name, 
-                "description":description, 
-                "supply":str(supply), 
-            }
-        
-        files = {'picture_orig': ('test_image.jpg', picture_orig,'image/' + file_path.split(".")[0])}
-        
-        res = requests.post(self.base_url + url, data=data,files=files, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def assets_mint_wait_finished(self, acronym:str, name:str, description:str, supply:int, file_path:str):
-        
-        asset = self.assets_mint(acronym, name, description, supply, file_path)
-        asset = self.asset(asset['id'])
-        minting_transaction = self.transactions_wait_status(transaction_id=asset['minting_transaction'], status_wait_for='minted')
-        
-        return asset
-
-    def assets_mint_nft(self, name:str, description:str, file_path:str):
-        url = "api/currencies/mint-nft/"
-        
-        if file_path:
-            with open(file_path,'rb') as f:
-                picture_orig = f.read()
-        else:
-            picture_orig = None
-        
-        data = {
-                "name":name, 
-                "description":description, 
-            }
-        
-        files = {'picture_orig': ('test_image.jpg', picture_orig,'image/' + file_path.split(".")[0])}
-        
-        res = requests.post(self.base_url + url, data=data,files=files, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def assets_mint_nft_wait_finished(self, acronym:str, name:str, description:str, supply:int, file_path:str):
-        
-        minting_transaction = self.assets_mint_nft(acronym, name, description, supply, file_path)
-        minting_transaction = self.transactions_wait_status(transaction_id=minting_transaction["id"], status_wait_for='minted')
-        
-        return minting_transaction
-
-    def assets(self, offset=0, limit=100, name=None):
-        
-        url = "api/currencies/"
-        params = {"limit":limit, "offset":offset}
-        
-        if name:
-            params["name"]=name
-            
-        res = requests.get(self.base_url + url, headers=self.headers, params = params)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
 
-    def nfts(self, offset=0, limit=100, name=None, collection_name=None):
-        url = "api/nfts/"
-        
-        params = {"limit":limit, "offset":offset}
-        
-        if collection_name:
-            params[f"collection__name"]=collection_name
+        return assets_mint_nft_many(self, manifest, max_concurrency=max_concurrency, journal=journal, timeout=timeout, progress=progress)
 
-        if name:
-            params[f"name"]=name
+    def get_user_ids(self, usernames, max_concurrency:int=8) -> dict:
+        """
+        Ids of many users with bounded concurrency, see users.get_user_ids
 
+        Cached ids are used without a lookup. The resolver is saved
+        afterwards when it has a path.
 
-        res = requests.get(self.base_url + url, headers=self.headers, params = params)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def asset(self, id):
-        url = f"api/currencies/{id}"
-    
-        res = requests.get(self.base_url + url, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-
-    def collections(self, offset=0, limit=100):
-        url = f"api/collections/"
-    
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def collection(self, id):
-        url = f"api/collection/{id}"
-    
-        res = requests.get(self.base_url + url, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def notifications(self, offset=0, limit=100):
-        url = f"api/notifications/"
-    
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def transactions_send_taproot_asset(self, invoice_outbound):
-        url = "api/transactions/send_taro/"
-
-        res = requests.post(self.base_url + url,data={"invoice_outbound":invoice_outbound}, headers=self.headers)
-    
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def transactions_send_btc(self, invoice_outbound:str, amount:int):
-        url = "api/transactions/send_btc/"
-        
-        res = requests.post(self.base_url + url,data={"invoice_outbound":invoice_outbound, "amount":amount}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def transactions_send_btc_lnd(self, invoice_outbound:str):
-        url = "api/transactions/send_btc_lnd/"
-        
-        res = requests.post(self.base_url + url,data={"invoice_outbound":invoice_outbound}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def transactions_send_btc_wait_sent(self, invoice_outbound:str, amount:int):
-        
-        transaction_receive = self.transactions_send_btc(invoice_outbound, amount)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='outbound_invoice_paid')
-        
-        return transaction_receive
-    
-    def transactions_send_btc_lns_wait_sent(self, invoice_outbound:str):
-        
-        transaction_receive = self.transactions_send_btc_lnd(invoice_outbound)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='lnd_inbound_invoice_paid')
-        
-        return transaction_receive
-    
-    def transactions_send_internal(self,destination_user:int,asset:int,amount:int,description:str):
-        url = "api/transactions/send_internal/"
-        
-        res = requests.post(self.base_url + url,data={"destination_user":destination_user, "currency":asset, "amount":amount, "description":description}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-
-    def transactions_send_internal_wait_sent(self,destination_user:int,asset:int,amount:int,description:str):
-        
-        transaction_receive = self.transactions_send_internal(destination_user,asset,amount,description)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='internal_finished')
-        
-        return transaction_receive
-        
-    def transactions_receive_taproot_asset(self, amount:int, asset: int, description: str):
-        
-        url = "api/transactions/receive_taro/"
-        
-        res = requests.post(self.base_url + url, data={"amount":amount, "currency":asset, "description":description}, headers=self.headers)
+        Args:
+            usernames (iterable):
+            max_concurrency (int): Maximum number of lookups at once
 
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def transactions_wait_status(self, transaction_id:int, status_wait_for:str):
-        
-        for _ in range(0,1000):
-            
-            transaction_dict = self.transaction(transaction_id)
-            
-            status = transaction_dict['status']
-
-            if status==status_wait_for:
-                return transaction_dict
-            elif status=='error':
-                raise Exception(f"Transaction error: {transaction_dict['status_description']}")
-
-            print(f"Transaction status: {status}")
-
-            time.sleep(1)
-        
-        raise Exception(f"Max number of retries exceeded!")
-        
-    def transactions_receive_taproot_asset_get_invoice(self, amount:int, asset: int, description: str):
-        
-        transaction_receive = self.transactions_receive_taproot_asset(amount, asset, description)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='inbound_invoice_generated')
-        
-        return (transaction_receive["invoice_inbound"])
-        
-    def transactions_receive_btc(self, amount:int, description: str):
-        url = "api/transactions/receive_btc/"
-        
-        res = requests.post(self.base_url + url,data={"amount":amount, "description":description}, headers=self.headers)
+        Returns:
+            dict of username to user id, None for usernames without a user
+        """
 
-        self.raise_with_text(res)
-        
-        return res.json()
+        return get_user_ids(self, usernames, max_concurrency=max_concurrency)
 
-    def transactions_receive_btc_get_invoice(self, amount:int, description: str):
-        
-        transaction_receive = self.transactions_receive_btc(amount, description)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='inbound_invoice_generated')
-        
-        return (transaction_receive)
+    def stream_events(self, cursor=None, kinds=KINDS, timeout:float=None):
+        """
+        Yield new notifications and transaction status changes as they happen
 
-    def transactions_receive_btc_lnd(self, amount:int, description: str):
-        url = "api/transactions/receive_btc_lnd/"
-        
-        res = requests.post(self.base_url + url,data={"amount":amount,"description":description}, headers=self.headers)
+        All streams of the client share one EventHub, which polls the
+        server (or reads its event push, see EventHub) once for all of
+        them.
 
-        self.raise_with_text(res)
-        
-        return res.json()
-
-
-
-    def transactions(self, offset=0, limit=100, destination_username=None, description=None, currency_id=None):
-        url = "api/transactions/"
-        
-        params = {"limit":limit, "offset":offset}
-        
-        search = []
-        
-        if destination_username:
-            params["destination_user__username"] = destination_username
-            
-        if description:
-            params["description"] = description
-        
-        if currency_id:
-            params["currency_id"] = currency_id
-            
-        res = requests.get(self.base_url + url, headers=self.headers, params = params)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def transaction(self, id):
-        url = f"api/transactions/{id}"
-    
-        res = requests.get(self.base_url + url, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def list_asset(self,asset:int):
-        url = "api/list_asset/"
-        
-        res = requests.post(self.base_url + url, data={"currency":asset}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def list_nft_asset(self,asset:int,price_sat:int):
-        url = "api/list_nft_asset/"
-        
-        res = requests.post(self.base_url + url, data={"currency":asset, "price_sat":price_sat}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def listings_my(self, offset=0, limit=100):
-        url = "api/listings_my/"
-        
-        res = requests.get(self.base_url + url, headers=self.headers, params = {"limit":limit, "offset":offset})
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-        
-    def buy_taproot_asset_asset(self, asset:int, amount:int):
-        url = "api/buy_taro_asset/"
-    
-        res = requests.post(self.base_url + url, data={"currency":asset, "amount":amount}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def buy_taproot_asset_asset_wait_finished(self, asset:int, amount:int):
-        
-        transaction_receive = self.buy_taproot_asset_asset(asset, amount)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
-        return transaction_receive
-        
-    def buy_nft_asset(self, asset:int):
-        url = "api/buy_nft_asset/"
-    
-        res = requests.post(self.base_url + url, data={"currency":asset}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def buy_nft_asset_wait_finished(self, asset:int):
-        
-        transaction_receive = self.buy_nft_asset(asset)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
-        return transaction_receive
-    
-    def sell_taproot_asset(self, asset:int, amount:int):
-        url = "api/sell_taro_asset/"
-
-        res = requests.post(self.base_url + url, data={"currency":asset, "amount":amount}, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
+        Args:
+            cursor (EventCursor or str): Position to resume from and to
+            record seen events to, a path for a cursor saved to a file.
+            Without a cursor the stream starts now
+            kinds (tuple): Event kinds to yield, "notification" and/or "transaction"
+            timeout (float): End the stream after this many seconds without
+            an event, None to wait forever
+
+        Returns:
+            generator of Event
+        """
+
+        return self.event_hub.stream(cursor=cursor, kinds=kinds, timeout=timeout)
+
+    def close(self):
+        """
+        Close the connection pool of the client unless it was passed in
+        and is shared with other clients
+        """
 
-    def sell_taproot_asset_wait_finished(self, asset:int):
-        
-        transaction_receive = self.sell_taproot_asset(asset)
-        transaction_receive = self.transactions_wait_status(transaction_id=transaction_receive["id"], status_wait_for='exchange_finished')
-        return transaction_receive
+        self.user_resolver.save()
+        self._release()
 
-    def get_info(self):
-        url = "api/get_info/"
+    def _release(self):
+        """
+        Close what the client owns, leaving the user resolver to its owner
+        """
 
-        res = requests.get(self.base_url + url, headers=self.headers)
-        
-        self.raise_with_text(res)
-        
-        return res.json()
-    
-    def get_user_id(username):
-        res = requests.get(f'https://mainnet.tiramisuwallet.com/walletapp/ajax_select/ajax_lookup/users?term={username}')
-        user_id_list = (res.json())
-        
-        for user_key in user_id_list:
-            if user_key['value']==username:
-                return int(user_key['pk'])
-        
-        return None
\ No newline at end of file
+        if self._event_hub is not None:
+            self._event_hub.close()
+
+        if self._owns_waiter:
+            self.waiter.close()
+
+        if self._owns_session:
+            self.session.close()
+
+    def raise_with_text(self, res:dict):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s -> %s", res.request.method, res.url, res.status_code, extra={"event": "http_response", "method": res.request.method, "url": res.url, "status": res.status_code})
+
+        try:
+            res.raise_for_status()
+        except Exception as e:
+            # with open("error.txt",'w') as f:
+            #     f.write(res.text)
+            raise RequestError(res.text, status=res.status_code, retry_after=parse_retry_after(res.headers.get("Retry-After"))) from e
@@ -0,0 +1,87 @@
+"""
+Stores persisting the credentials a client obtains when it logs in.
+
+A stored entry is a dict with the "auth_token" and "btc_asset_id" of one
+user on one server, so a new client can start without network calls.
+"""
+
+import json
+import os
+import threading
+
+
+def token_key(base_url:str, username:str) -> str:
+    return f"{base_url}|{username}"
+
+
+class MemoryTokenStore():
+    """
+    Keeps credentials for the lifetime of the process
+    """
+
+    def __init__(self) -> None:
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def load(self, key:str) -> dict:
+        with self._lock:
+            entry = self._entries.get(key)
+
+        return dict(entry) if entry else None
+
+    def save(self, key:str, entry:dict):
+        with self._lock:
+            self._entries[key] = dict(entry)
+
+    def delete(self, key:str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileTokenStore():
+    """
+    Keeps credentials in a JSON file
+
+    The file holds secrets, it is created readable by the owner only.
+
+    Args:
+        path (str): Path of the JSON file
+    """
+
+    def __init__(self, path:str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, entries:dict):
+        tmp_path = f"{self.path}.tmp"
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f)
+
+        os.replace(tmp_path, self.path)
+
+    def load(self, key:str) -> dict:
+        with self._lock:
+            return self._read().get(key)
+
+    def save(self, key:str, entry:dict):
+        with self._lock:
+            entries = self._read()
+            entries[key] = entry
+            self._write(entries)
+
+    def delete(self, key:str):
+        with self._lock:
+            entries = self._read()
+
+            if entries.pop(key, None) is not None:
+                self._write(entries)
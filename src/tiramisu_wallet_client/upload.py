@@ -0,0 +1,281 @@
+"""
+Streaming multipart/form-data uploads.
+
+An Upload wraps a file path, a binary file object or a bytes-like object
+(bytes, bytearray, memoryview, mmap) without reading it into memory.
+MultipartEncoder lays the form fields and uploads out as a body of known
+length that is produced chunk by chunk: files are read in chunk_size
+pieces and bytes-like objects are sent as memoryview slices, so a body is
+never copied as a whole. Every iteration starts over from the beginning of
+each upload, a request can be sent again on retries and re-authentication.
+"""
+
+import io
+import mimetypes
+import mmap
+import os
+import uuid
+
+CHUNK_SIZE = 256 * 1024
+
+# (offset, magic bytes, MIME type) checked in order on the first bytes
+_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"BM", "image/bmp"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+)
+
+# brands of ISO base media files (box type "ftyp" at offset 4)
+_FTYP_BRANDS = {
+    b"avif": "image/avif",
+    b"avis": "image/avif",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"mif1": "image/heif",
+    b"qt  ": "video/quicktime",
+    b"M4A ": "audio/mp4",
+}
+
+
+def sniff_content_type(head:bytes) -> str:
+    """
+    MIME type from the first bytes of a file, None when not recognised
+    """
+
+    for offset, magic, content_type in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+
+    text = head.lstrip()[:512].lower()
+
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "image/svg+xml"
+
+    return None
+
+
+def guess_content_type(filename:str=None, head:bytes=b"") -> str:
+    """
+    MIME type from the extension of filename, else from the content
+    """
+
+    if filename:
+        content_type, _ = mimetypes.guess_type(filename)
+
+        if content_type is not None:
+            return content_type
+
+    return sniff_content_type(head) or "application/octet-stream"
+
+
+class Upload():
+    """
+    File part of a multipart upload read lazily from its source
+
+    Args:
+        source: Path (str or os.PathLike), binary file object or bytes-like
+        object. File objects are read from their current position, non
+        seekable ones are read into memory once
+        filename (str): Filename sent to the server, defaults to the name of
+        the source
+        content_type (str): MIME type, defaults to the type of the filename
+        extension or of the content
+        progress (callable): Called as progress(bytes_sent, total_bytes)
+        while the upload is sent, starting over on every attempt
+        chunk_size (int): Bytes read from files at once
+    """
+
+    def __init__(self, source, filename:str=None, content_type:str=None, progress=None, chunk_size:int=CHUNK_SIZE) -> None:
+        self.progress = progress
+        self.chunk_size = chunk_size
+
+        self._path = None
+        self._file = None
+        self._view = None
+        self._start = 0
+
+        if isinstance(source, (str, os.PathLike)):
+            self._path = os.fspath(source)
+            self.size = os.path.getsize(self._path)
+            name = self._path
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            self._view = memoryview(source).cast("B")
+            self.size = self._view.nbytes
+            name = None
+        else:
+            name = getattr(source, "name", None)
+
+            try:
+                self._start = source.tell()
+                self.size = source.seek(0, io.SEEK_END) - self._start
+                source.seek(self._start)
+                self._file = source
+            except (AttributeError, OSError):
+                self._view = memoryview(source.read())
+                self.size = self._view.nbytes
+
+        if not isinstance(name, str):
+            name = None
+
+        self.filename = filename or (os.path.basename(name) if name else None)
+        self.content_type = content_type or guess_content_type(self.filename, self._head())
+
+        if self.filename is None:
+            self.filename = "upload" + (mimetypes.guess_extension(self.content_type) or "")
+
+    def _head(self) -> bytes:
+        if self._view is not None:
+            return self._view[:512].tobytes()
+
+        if self._path is not None:
+            with open(self._path, "rb") as f:
+                return f.read(512)
+
+        head = self._file.read(512)
+        self._file.seek(self._start)
+
+        return head
+
+    def chunks(self):
+        """
+        Yield the content from the beginning, bytes-like sources as memoryview slices
+        """
+
+        sent = 0
+
+        if self._view is not None:
+            for offset in range(0, self.size, self.chunk_size):
+                chunk = self._view[offset:offset + self.chunk_size]
+                yield chunk
+                sent += len(chunk)
+                self._report(sent)
+
+            return
+
+        if self._path is not None:
+            f = open(self._path, "rb")
+        else:
+            f = self._file
+            f.seek(self._start)
+
+        try:
+            while sent < self.size:
+                chunk = f.read(min(self.chunk_size, self.size - sent))
+
+                if not chunk:
+                    raise IOError(f"{self.filename} ended after {sent} of {self.size} bytes")
+
+                yield chunk
+                sent += len(chunk)
+                self._report(sent)
+        finally:
+            if self._path is not None:
+                f.close()
+
+    def _report(self, sent:int):
+        if self.progress is not None:
+            self.progress(sent, self.size)
+
+
+def as_upload(value) -> Upload:
+    """
+    Upload from a files value: an Upload, a requests style (filename,
+    content[, content_type]) tuple, or anything Upload accepts
+    """
+
+    if isinstance(value, Upload):
+        return value
+
+    if isinstance(value, tuple):
+        filename, content, content_type = (tuple(value) + (None, None))[:3]
+
+        return Upload(content, filename=filename, content_type=content_type)
+
+    return Upload(value)
+
+
+class MultipartEncoder():
+    """
+    multipart/form-data body of known length produced chunk by chunk
+
+    Iterating yields the body, it can be iterated again for a retry.
+    len() gives the Content-Length.
+
+    Args:
+        fields (dict): Form fields, values are converted to str
+        files (dict): File parts, values as accepted by as_upload, None
+        values are skipped
+        boundary (str): Multipart boundary, random by default
+    """
+
+    def __init__(self, fields:dict=None, files:dict=None, boundary:str=None) -> None:
+        self.boundary = boundary or uuid.uuid4().hex
+
+        self._parts = []
+
+        for name, value in (fields or {}).items():
+            self._parts.append(self._header(name) + b"\r\n" + str(value).encode() + b"\r\n")
+
+        for name, value in (files or {}).items():
+            if value is None or (isinstance(value, tuple) and len(value) > 1 and value[1] is None):
+                continue
+
+            upload = as_upload(value)
+
+            self._parts.append(self._header(name, upload) + b"\r\n")
+            self._parts.append(upload)
+            self._parts.append(b"\r\n")
+
+        self._parts.append(f"--{self.boundary}--\r\n".encode())
+
+        self.length = sum(part.size if isinstance(part, Upload) else len(part) for part in self._parts)
+
+    def _header(self, name:str, upload:Upload=None) -> bytes:
+        disposition = f'form-data; name="{_quote(name)}"'
+
+        if upload is None:
+            return f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\n".encode()
+
+        disposition += f'; filename="{_quote(upload.filename)}"'
+
+        return f"--{self.boundary}\r\nContent-Disposition: {disposition}\r\nContent-Type: {upload.content_type}\r\n".encode()
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @property
+    def headers(self) -> dict:
+        return {"Content-Type": self.content_type, "Content-Length": str(self.length)}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, Upload):
+                yield from part.chunks()
+            else:
+                yield part
+
+
+def _quote(value:str) -> str:
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
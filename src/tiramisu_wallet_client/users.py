@@ -0,0 +1,199 @@
+"""
+Cache of the user ids looked up by username.
+
+Internal transfers take the numeric id of the destination user. A lookup
+by username returns every user whose name contains the term, so one
+lookup caches the ids of all exact matches it returns. Usernames without
+a user are cached as well, for a shorter time. A resolver with a path
+keeps its entries across runs.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+
+class UserResolver():
+    """
+    Username to user id cache with expiry
+
+    Entries are keyed by the base URL of the client, so a resolver can be
+    shared by clients of both networks.
+
+    Args:
+        ttl (float): Seconds a found user id is used
+        negative_ttl (float): Seconds a username without a user is
+        remembered as such
+        path (str): JSON file keeping the entries across runs, written by
+        save()
+    """
+
+    def __init__(self, ttl:float=24 * 3600, negative_ttl:float=300, path:str=None) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.path = path
+
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if path is not None:
+            self._entries = self._read()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return {key: tuple(entry) for key, entry in json.load(f).items()}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @staticmethod
+    def key(base_url:str, username:str) -> str:
+        return f"{base_url}|{username}"
+
+    def get(self, base_url:str, username:str) -> tuple:
+        """
+        Returns:
+            (found, user_id), user_id is None for a username cached as unknown
+        """
+
+        with self._lock:
+            entry = self._entries.get(self.key(base_url, username))
+
+        if entry is None or entry[1] < time.time():
+            return False, None
+
+        return True, entry[0]
+
+    def store(self, base_url:str, username:str, matches:list) -> int:
+        """
+        Cache the result of a lookup
+
+        Args:
+            base_url (str):
+            username (str): Username looked up
+            matches (list): Response of the lookup, dicts with the username
+            as "value" and the user id as "pk"
+
+        Returns:
+            Id of the user, None when there is none
+        """
+
+        now = time.time()
+        user_id = None
+
+        with self._lock:
+            for match in matches:
+                self._entries[self.key(base_url, match["value"])] = (int(match["pk"]), now + self.ttl)
+
+                if match["value"] == username:
+                    user_id = int(match["pk"])
+
+            if user_id is None:
+                self._entries[self.key(base_url, username)] = (None, now + self.negative_ttl)
+
+            self._dirty = True
+
+        return user_id
+
+    def forget(self, base_url:str, username:str):
+        with self._lock:
+            self._dirty = self._entries.pop(self.key(base_url, username), None) is not None or self._dirty
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._dirty = True
+
+    def save(self):
+        """
+        Write the unexpired entries to path, when there is one and they changed
+        """
+
+        if self.path is None:
+            return
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            now = time.time()
+            self._entries = {key: entry for key, entry in self._entries.items() if entry[1] >= now}
+            tmp_path = f"{self.path}.tmp"
+
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def _unknown(client, usernames) -> tuple:
+    """
+    Split usernames into the cached ids and the distinct usernames to look up
+    """
+
+    user_ids = {}
+    missing = []
+    seen = set()
+
+    for username in usernames:
+        if username in seen:
+            continue
+
+        seen.add(username)
+        found, user_id = client.user_resolver.get(client.base_url, username)
+
+        if found:
+            user_ids[username] = user_id
+        else:
+            missing.append(username)
+
+    return user_ids, missing
+
+
+def get_user_ids(client, usernames, max_concurrency:int=8) -> dict:
+    """
+    Ids of many users, looking up the uncached ones with bounded concurrency
+
+    Args:
+        client (TiramisuClient):
+        usernames (iterable):
+        max_concurrency (int): Maximum number of lookups at once
+
+    Returns:
+        dict of username to user id, None for usernames without a user
+    """
+
+    user_ids, missing = _unknown(client, usernames)
+
+    if missing:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_concurrency, len(missing)), thread_name_prefix="tiramisu-users") as executor:
+            user_ids.update(zip(missing, executor.map(client.get_user_id, missing)))
+
+        client.user_resolver.save()
+
+    return user_ids
+
+
+async def aget_user_ids(client, usernames, max_concurrency:int=8) -> dict:
+    """
+    Async version of get_user_ids
+    """
+
+    user_ids, missing = _unknown(client, usernames)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def lookup(username):
+        async with semaphore:
+            return await client.get_user_id(username)
+
+    if missing:
+        user_ids.update(zip(missing, await asyncio.gather(*(lookup(username) for username in missing))))
+
+        client.user_resolver.save()
+
+    return user_ids
@@ -0,0 +1,513 @@
+"""
+Shared pollers waiting for many transactions to reach a status.
+
+A waiter keeps every watched transaction in one set and polls the due ones
+together: when many transactions of one client are due it reads the
+transactions list endpoint once, the rest are fetched one by one with
+bounded concurrency. Each transaction backs off exponentially (with
+jitter) while its status does not change and is polled quickly again once
+it does.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import random
+import threading
+import time
+
+from .exceptions import RequestError, TransactionError, TransactionTimeout
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 1000
+
+
+class Backoff():
+    """
+    Exponential backoff with jitter
+
+    Args:
+        initial (float): First delay in seconds
+        maximum (float): Largest delay in seconds
+        factor (float): Multiplier applied after every unchanged poll
+        jitter (float): Relative random spread applied to every delay
+    """
+
+    def __init__(self, initial:float=0.5, maximum:float=10, factor:float=1.5, jitter:float=0.2) -> None:
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+
+    def increase(self, delay:float) -> float:
+        return min(delay * self.factor, self.maximum)
+
+    def jittered(self, delay:float) -> float:
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+def _transient(error:Exception) -> bool:
+    """
+    A failed fetch worth polling again: throttling, a server error or a
+    lost connection
+    """
+
+    if isinstance(error, RequestError):
+        return error.status is None or error.status == 429 or error.status >= 500
+
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+class _Watch():
+
+    __slots__ = ("transaction_id", "status_wait_for", "client", "future", "deadline", "delay", "next_poll", "last_status")
+
+    def __init__(self, transaction_id, status_wait_for, client, future, deadline, delay) -> None:
+        self.transaction_id = transaction_id
+        self.status_wait_for = status_wait_for
+        self.client = client
+        self.future = future
+        self.deadline = deadline
+        self.delay = delay
+        self.next_poll = 0
+        self.last_status = None
+
+
+class _WatchSet():
+    """
+    Bookkeeping shared by the sync and async waiters
+    """
+
+    def __init__(self, backoff:Backoff) -> None:
+        self.backoff = backoff
+        self.watches = []
+
+    def add(self, watch:_Watch):
+        self.watches.append(watch)
+
+    def next_poll(self):
+        return min((watch.next_poll for watch in self.watches), default=None)
+
+    def pop_due(self, now:float) -> dict:
+        """
+        Remove the watches due for a poll, grouped as {client: {transaction_id: [watch]}}
+        """
+
+        due = {}
+        keep = []
+
+        for watch in self.watches:
+            if watch.future.done():
+                continue
+
+            if watch.next_poll <= now:
+                due.setdefault(watch.client, {}).setdefault(watch.transaction_id, []).append(watch)
+            else:
+                keep.append(watch)
+
+        self.watches = keep
+
+        return due
+
+    def apply(self, watches:list, transaction_dict:dict=None, error:Exception=None, now:float=None):
+        """
+        Resolve the watches of one transaction or schedule their next poll
+        """
+
+        now = time.monotonic() if now is None else now
+
+        if error is not None and _transient(error):
+            logger.warning("Polling transaction %s failed: %s", watches[0].transaction_id, error, extra={"event": "waiter_poll_failed", "transaction_id": watches[0].transaction_id, "error": repr(error)})
+
+        for watch in watches:
+            if watch.future.done():
+                continue
+
+            if error is not None:
+                if _transient(error):
+                    self._backoff(watch, now)
+                else:
+                    watch.future.set_exception(error)
+
+                continue
+
+            status = transaction_dict['status']
+
+            if status==watch.status_wait_for:
+                watch.future.set_result(transaction_dict)
+            elif status=='error':
+                watch.future.set_exception(TransactionError(transaction_dict))
+            elif now >= watch.deadline:
+                watch.future.set_exception(TransactionTimeout("Max number of retries exceeded!"))
+            else:
+                if status!=watch.last_status:
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Transaction %s status: %s", watch.transaction_id, status, extra={"event": "transaction_status", "transaction_id": watch.transaction_id, "status": status, "previous_status": watch.last_status})
+                    watch.delay = self.backoff.initial
+                else:
+                    watch.delay = self.backoff.increase(watch.delay)
+
+                watch.last_status = status
+                watch.next_poll = min(now + self.backoff.jittered(watch.delay), watch.deadline)
+                self.watches.append(watch)
+
+    def apply_all(self, results:list):
+        """
+        apply() every poll result, failing the watches of a result that cannot be applied
+        """
+
+        for watches, transaction_dict, error in results:
+            try:
+                self.apply(watches, transaction_dict, error)
+            except Exception as e:
+                logger.warning("Applying the status of transaction %s failed: %s", watches[0].transaction_id, e, extra={"event": "waiter_apply_failed", "transaction_id": watches[0].transaction_id, "error": repr(e)})
+
+                for watch in watches:
+                    if not watch.future.done():
+                        watch.future.set_exception(e)
+
+    def retry(self, due:dict, error:Exception, now:float=None):
+        """
+        Schedule the watches of a failed poll again after their backoff
+        """
+
+        logger.warning("Polling transactions failed: %s", error, extra={"event": "waiter_poll_failed", "error": repr(error)})
+        now = time.monotonic() if now is None else now
+
+        for by_id in due.values():
+            for watches in by_id.values():
+                for watch in watches:
+                    if not watch.future.done():
+                        self._backoff(watch, now)
+
+    def _backoff(self, watch:_Watch, now:float):
+        """
+        Poll a watch again after its increased delay, at the latest at its deadline
+        """
+
+        if now >= watch.deadline:
+            watch.future.set_exception(TransactionTimeout("Max number of retries exceeded!"))
+            return
+
+        watch.delay = self.backoff.increase(watch.delay)
+        watch.next_poll = min(now + self.backoff.jittered(watch.delay), watch.deadline)
+        self.watches.append(watch)
+
+
+class TransactionWaiter():
+    """
+    Background poller resolving futures when transactions reach a status
+
+    One waiter can serve many clients, e.g. all clients of a process, so the
+    whole process polls from a single thread.
+
+    Args:
+        client (TiramisuClient): Client used when watch() gets none
+        max_concurrency (int): Maximum number of transactions fetched at once
+        backoff (Backoff): Delays between polls of one transaction
+        timeout (float): Default seconds before a watch fails with TransactionTimeout
+        list_threshold (int): Number of due transactions of one client from
+        which the transactions list endpoint is read first
+        list_limit (int): Page size used for the list endpoint
+    """
+
+    def __init__(self, client=None, max_concurrency:int=8, backoff:Backoff=None, timeout:float=DEFAULT_TIMEOUT, list_threshold:int=10, list_limit:int=100) -> None:
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.list_threshold = list_threshold
+        self.list_limit = list_limit
+
+        self._watches = _WatchSet(backoff or Backoff())
+        self._cond = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._closed = False
+
+    def watch(self, transaction_id:int, status_wait_for:str, client=None, callback=None, timeout:float=None) -> concurrent.futures.Future:
+        """
+        Start waiting for a transaction
+
+        Args:
+            transaction_id (int):
+            status_wait_for (str): Status that resolves the future
+            client (TiramisuClient): Client owning the transaction
+            callback (callable): Called with the future once it is resolved
+            timeout (float): Seconds before the future fails with TransactionTimeout
+
+        Returns:
+            concurrent.futures.Future resolving to the transaction dict, or
+            failing with TransactionError when the transaction ends in 'error'
+        """
+
+        future = concurrent.futures.Future()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        timeout = self.timeout if timeout is None else timeout
+
+        watch = _Watch(transaction_id, status_wait_for, client or self.client, future, time.monotonic() + timeout, self._watches.backoff.initial)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("TransactionWaiter is closed")
+
+            self._watches.add(watch)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="tiramisu-waiter", daemon=True)
+                self._thread.start()
+
+            self._cond.notify()
+
+        return future
+
+    def watch_many(self, items, client=None, callback=None, timeout:float=None) -> list:
+        """
+        Start waiting for many transactions
+
+        Args:
+            items (iterable): (transaction_id, status_wait_for) pairs
+
+        Returns:
+            list of futures in the order of items
+        """
+
+        return [self.watch(transaction_id, status_wait_for, client=client, callback=callback, timeout=timeout) for transaction_id, status_wait_for in items]
+
+    def wait(self, transaction_id:int, status_wait_for:str, client=None, timeout:float=None) -> dict:
+        """
+        Block until a transaction reaches a status and return it
+        """
+
+        return self.watch(transaction_id, status_wait_for, client=client, timeout=timeout).result()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._watches.watches)
+
+    def close(self):
+        """
+        Stop polling and cancel all pending futures
+        """
+
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join()
+
+        for watch in self._watches.watches:
+            watch.future.cancel()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _loop(self):
+
+        while True:
+            with self._cond:
+                while not self._closed:
+                    next_poll = self._watches.next_poll()
+                    now = time.monotonic()
+
+                    if next_poll is not None and next_poll <= now:
+                        break
+
+                    self._cond.wait(None if next_poll is None else next_poll - now)
+
+                if self._closed:
+                    return
+
+                due = self._watches.pop_due(now)
+
+            try:
+                results = self._poll(due)
+            except Exception as e:
+                with self._cond:
+                    self._watches.retry(due, e)
+
+                continue
+
+            with self._cond:
+                self._watches.apply_all(results)
+
+    def _poll(self, due:dict) -> list:
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="tiramisu-waiter")
+
+        results = []
+        fetches = []
+
+        for client, by_id in due.items():
+            by_id = dict(by_id)
+
+            if len(by_id) >= self.list_threshold:
+                try:
+                    page = client.transactions(limit=self.list_limit)
+                except Exception:
+                    page = {"results": []}
+
+                for transaction_dict in page["results"]:
+                    watches = by_id.pop(transaction_dict["id"], None)
+
+                    if watches is not None:
+                        results.append((watches, transaction_dict, None))
+
+            for transaction_id, watches in by_id.items():
+                fetches.append((watches, self._executor.submit(client.transaction, transaction_id)))
+
+        for watches, fetch in fetches:
+            try:
+                results.append((watches, fetch.result(), None))
+            except Exception as e:
+                results.append((watches, None, e))
+
+        return results
+
+
+class AsyncTransactionWaiter():
+    """
+    asyncio counterpart of TransactionWaiter, polling from a single task
+
+    Args:
+        client (AsyncTiramisuClient): Client used when watch() gets none
+        max_concurrency (int): Maximum number of transactions fetched at once
+        backoff (Backoff): Delays between polls of one transaction
+        timeout (float): Default seconds before a watch fails with TransactionTimeout
+        list_threshold (int): Number of due transactions of one client from
+        which the transactions list endpoint is read first
+        list_limit (int): Page size used for the list endpoint
+    """
+
+    def __init__(self, client=None, max_concurrency:int=8, backoff:Backoff=None, timeout:float=DEFAULT_TIMEOUT, list_threshold:int=10, list_limit:int=100) -> None:
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.list_threshold = list_threshold
+        self.list_limit = list_limit
+
+        self._watches = _WatchSet(backoff or Backoff())
+        self._wakeup = None
+        self._task = None
+
+    def watch(self, transaction_id:int, status_wait_for:str, client=None, callback=None, timeout:float=None) -> asyncio.Future:
+        """
+        Start waiting for a transaction, see TransactionWaiter.watch
+
+        Returns:
+            asyncio.Future resolving to the transaction dict
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        if callback is not None:
+            future.add_done_callback(callback)
+
+        timeout = self.timeout if timeout is None else timeout
+
+        self._watches.add(_Watch(transaction_id, status_wait_for, client or self.client, future, time.monotonic() + timeout, self._watches.backoff.initial))
+
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._loop())
+
+        self._wakeup.set()
+
+        return future
+
+    def watch_many(self, items, client=None, callback=None, timeout:float=None) -> list:
+        return [self.watch(transaction_id, status_wait_for, client=client, callback=callback, timeout=timeout) for transaction_id, status_wait_for in items]
+
+    async def wait(self, transaction_id:int, status_wait_for:str, client=None, timeout:float=None) -> dict:
+        return await self.watch(transaction_id, status_wait_for, client=client, timeout=timeout)
+
+    def pending(self) -> int:
+        return len(self._watches.watches)
+
+    async def close(self):
+        """
+        Stop polling and cancel all pending futures
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+            self._task = None
+
+        for watch in self._watches.watches:
+            watch.future.cancel()
+
+        self._watches.watches = []
+
+    async def _loop(self):
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        while self._watches.watches:
+            next_poll = self._watches.next_poll()
+            now = time.monotonic()
+
+            if next_poll > now:
+                self._wakeup.clear()
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_poll - now)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            due = self._watches.pop_due(now)
+
+            try:
+                results = await self._poll(due, semaphore)
+            except Exception as e:
+                self._watches.retry(due, e)
+                continue
+
+            self._watches.apply_all(results)
+
+    async def _poll(self, due:dict, semaphore:asyncio.Semaphore) -> list:
+
+        results = []
+        fetches = []
+
+        async def fetch(client, transaction_id, watches):
+            async with semaphore:
+                try:
+                    return (watches, await client.transaction(transaction_id), None)
+                except Exception as e:
+                    return (watches, None, e)
+
+        for client, by_id in due.items():
+            by_id = dict(by_id)
+
+            if len(by_id) >= self.list_threshold:
+                try:
+                    page = await client.transactions(limit=self.list_limit)
+                except Exception:
+                    page = {"results": []}
+
+                for transaction_dict in page["results"]:
+                    watches = by_id.pop(transaction_dict["id"], None)
+
+                    if watches is not None:
+                        results.append((watches, transaction_dict, None))
+
+            fetches.extend(fetch(client, transaction_id, watches) for transaction_id, watches in by_id.items())
+
+        results.extend(await asyncio.gather(*fetches))
+
+        return results
@@ -0,0 +1,20 @@
+import threading
+
+import pytest
+from mock_server import MockServer, Wallets
+
+
+@pytest.fixture
+def server():
+    """
+    Mock walletapp server on a free local port, see benchmarks/mock_server.py
+    """
+
+    server = MockServer(wallets=Wallets(transactions=5, notifications=5, step=0.05), latency=0, jitter=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
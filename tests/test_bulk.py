@@ -0,0 +1,62 @@
+from tiramisu_wallet_client import SendJournal, TiramisuClient
+from tiramisu_wallet_client.bulk import SUBMITTING
+
+
+def test_send_internal_many_finishes_every_transfer(server, tmp_path):
+    client = TiramisuClient("payer", "pw", server_url=server.url, lazy=True)
+    items = [(2, 2, amount, f"payout {amount}") for amount in range(1, 6)]
+
+    report = client.send_internal_many(items, journal=SendJournal(str(tmp_path / "batch.jsonl")), timeout=10)
+
+    assert report.summary()["finished"] == 5
+    assert [result.key for result in report.results] == [":".join(str(field) for field in item) for item in items]
+
+    client.close()
+
+
+def test_resume_skips_finished_transfers(server, tmp_path):
+    client = TiramisuClient("payer", "pw", server_url=server.url, lazy=True)
+    journal = str(tmp_path / "batch.jsonl")
+    items = [(2, 2, 10, "payout a"), (2, 2, 20, "payout b")]
+
+    first = client.send_internal_many(items, journal=SendJournal(journal), timeout=10)
+    sent = client.transactions()["count"]
+    second = client.send_internal_many(items, journal=SendJournal(journal), timeout=10)
+
+    assert client.transactions()["count"] == sent
+    assert [result.transaction_id for result in second.results] == [result.transaction_id for result in first.results]
+
+    client.close()
+
+
+def test_resume_claims_only_a_matching_transaction(server, tmp_path):
+    client = TiramisuClient("payer", "pw", server_url=server.url, lazy=True)
+    journal_path = str(tmp_path / "batch.jsonl")
+    item = (2, 2, 10, "payout memo")
+
+    # older transfers with the same memo in another currency and of another amount
+    other_currency = client.transactions_send_internal(2, 3, 10, "payout memo")
+    other_amount = client.transactions_send_internal(2, 2, 11, "payout memo")
+
+    journal = SendJournal(journal_path)
+    journal.record("interrupted", SUBMITTING)
+    journal.close()
+
+    report = client.send_internal_many([item + ("interrupted",)], journal=SendJournal(journal_path), timeout=10)
+
+    assert report.results[0].transaction_id not in (other_currency["id"], other_amount["id"])
+    assert report.summary()["finished"] == 1
+
+    # an interrupted transfer that did land is claimed, not sent again
+    landed = client.transactions_send_internal(2, 2, 30, "payout landed")
+    journal = SendJournal(journal_path)
+    journal.record("landed", SUBMITTING)
+    journal.close()
+    count = client.transactions()["count"]
+
+    report = client.send_internal_many([(2, 2, 30, "payout landed", "landed")], journal=SendJournal(journal_path), timeout=10)
+
+    assert report.results[0].transaction_id == landed["id"]
+    assert client.transactions()["count"] == count
+
+    client.close()
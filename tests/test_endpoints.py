@@ -0,0 +1,72 @@
+import pytest
+
+from tiramisu_wallet_client import RequestError, RetryPolicy
+from tiramisu_wallet_client.endpoints import Sleep, _confirming, transactions_send_internal
+from tiramisu_wallet_client.retry import ErrorInfo
+
+
+class FakeClient():
+    base_url = "http://wallet/"
+    username = "alice"
+
+    def __init__(self) -> None:
+        self.retry_policy = RetryPolicy(confirm_sends=True)
+
+    def _error_info(self, error):
+        return ErrorInfo(status=error.status) if isinstance(error, RequestError) else None
+
+
+def page(*transactions):
+    return {"count": len(transactions), "next": None, "previous": None, "results": list(transactions)}
+
+
+def failed_send(landed:list):
+    """
+    Drive a send whose POST fails with 502, returning the step after the confirming lookup
+    """
+
+    steps = transactions_send_internal(FakeClient(), 7, 2, 10, "payout 1")
+    existing = {"id": 1, "currency": 2, "amount": 10}
+
+    assert next(steps).name == "transactions"
+    assert steps.send(page(existing)).name == "transactions_send_internal"
+    assert steps.throw(RequestError("bad gateway", status=502)).name == "transactions"
+
+    return steps, page(existing, *landed)
+
+
+def test_landed_send_is_confirmed():
+    transaction = {"id": 2, "currency": {"id": 2}, "amount": 10}
+    steps, after = failed_send([transaction])
+
+    with pytest.raises(StopIteration) as stop:
+        steps.send(after)
+
+    assert stop.value.value == transaction
+    assert not _confirming
+
+
+def test_other_amount_is_retried():
+    steps, after = failed_send([{"id": 2, "currency": 2, "amount": 11}])
+
+    assert isinstance(steps.send(after), Sleep)
+
+    steps.close()
+    assert not _confirming
+
+
+def test_concurrent_send_with_same_description_is_not_confirmed():
+    key = (FakeClient.base_url, FakeClient.username, "payout 1")
+    steps, after = failed_send([{"id": 2, "currency": 2, "amount": 10}])
+    _confirming[key] += 1
+
+    try:
+        with pytest.raises(RequestError):
+            steps.send(after)
+    finally:
+        _confirming[key] -= 1
+
+        if not _confirming[key]:
+            del _confirming[key]
+
+    assert not _confirming
@@ -0,0 +1,42 @@
+from tiramisu_wallet_client import Backoff, EventHub, TiramisuClient
+from tiramisu_wallet_client.events import TRANSACTION, parse_sse
+
+
+def test_parse_sse():
+    lines = [b": keep-alive\n", b"event: transaction\n", b'data: {"id": 1,\n', b'data: "status": "internal_pending"}\n', b"\n", b"data: plain\r\n", b"\r\n"]
+
+    assert list(parse_sse(lines)) == [("transaction", '{"id": 1,\n"status": "internal_pending"}'), ("message", "plain")]
+
+
+def test_saved_cursor_catches_up_after_a_restart(server, tmp_path):
+    cursor = str(tmp_path / "cursor.json")
+
+    client = TiramisuClient("events", "pw", server_url=server.url, lazy=True)
+    client.event_hub = EventHub(client, backoff=Backoff(0.05, 0.2))
+
+    # the first stream starts at the current position and saves it
+    list(client.stream_events(cursor=cursor, timeout=0.5))
+    client.close()
+
+    # sent while no consumer is running
+    sent = TiramisuClient("events", "pw", server_url=server.url, lazy=True)
+    transaction = sent.transactions_send_internal(2, 2, 10, "while stopped")
+    sent.close()
+
+    client = TiramisuClient("events", "pw", server_url=server.url, lazy=True)
+    client.event_hub = EventHub(client, backoff=Backoff(0.05, 0.2))
+
+    events = []
+
+    for event in client.stream_events(cursor=cursor, kinds=(TRANSACTION,), timeout=5):
+        if event.id == transaction["id"]:
+            events.append(event)
+
+            if event.status == "internal_finished":
+                break
+
+    client.close()
+
+    assert events[0].previous_status is None
+    assert events[-1].status == "internal_finished"
+    assert [event.previous_status for event in events[1:]] == [event.status for event in events[:-1]]
@@ -0,0 +1,19 @@
+import asyncio
+
+from tiramisu_wallet_client import AsyncInvoicePool, AsyncTiramisuClient
+
+
+def test_async_pool_closes_after_take(server):
+
+    async def main():
+        async with AsyncTiramisuClient("pool", "pw", server_url=server.url) as client:
+            pool = AsyncInvoicePool(client, {(None, 500): 1}, timeout=10)
+            await pool.start()
+
+            invoice = await asyncio.wait_for(pool.take(500), 10)
+            assert invoice.invoice
+
+            await asyncio.wait_for(pool.close(), 5)
+            assert pool._task is None and not pool._refills
+
+    asyncio.run(main())
@@ -0,0 +1,44 @@
+import time
+
+from tiramisu_wallet_client import BalanceLedger, TiramisuClient
+from tiramisu_wallet_client.ledger import _Ledger
+
+
+def test_receive_hold_resolves_when_invoice_generated(server):
+    client = TiramisuClient("ledger", "pw", server_url=server.url, lazy=True)
+    ledger = BalanceLedger(client, reconcile_interval=None, timeout=10)
+
+    available = ledger.balance()
+    ledger.receive_btc(1000, "deposit")
+
+    assert ledger.expected_balance() == available + 1000
+
+    deadline = time.monotonic() + 5
+
+    while ledger.snapshot()["pending"] and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert ledger.snapshot()["pending"] == 0
+    assert ledger.balance() == ledger.expected_balance() == available
+
+    ledger.close()
+    client.close()
+
+
+def test_send_finished_before_reconcile_is_not_booked_twice():
+    ledger = _Ledger()
+    ledger.apply([{"currency": 1, "amount": 1000}])
+
+    hold = ledger.hold(1, -100)
+    assert ledger.available(1) == 900
+
+    # the server finished the send before the balances were read
+    ledger.apply([{"currency": 1, "amount": 900}])
+    ledger.settle(hold)
+
+    assert ledger.available(1) == 900
+    assert ledger.stale
+
+    ledger.apply([{"currency": 1, "amount": 900}])
+
+    assert ledger.discrepancies == 0
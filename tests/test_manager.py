@@ -0,0 +1,53 @@
+import asyncio
+
+from tiramisu_wallet_client import AsyncClientManager, ClientManager, UserResolver
+
+
+class CountingResolver(UserResolver):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.saves = 0
+
+    def save(self):
+        self.saves += 1
+
+
+def test_close_saves_shared_resolver_once(server):
+    resolver = CountingResolver()
+    manager = ClientManager(server_url=server.url, user_resolver=resolver)
+
+    for number in range(5):
+        manager.add(f"user{number}", "pw")
+
+    manager.close()
+
+    assert resolver.saves == 1
+
+
+def test_async_add_closes_replaced_client(server):
+
+    async def main():
+        resolver = CountingResolver()
+        manager = AsyncClientManager(server_url=server.url, user_resolver=resolver)
+        old = manager.add("alice", "pw")
+        closed = []
+        close = old.close
+
+        async def tracked_close():
+            closed.append(old)
+            await close()
+
+        old.close = tracked_close
+        new = manager.add("alice", "pw")
+
+        assert manager["alice"] is new
+        assert await new.get_btc_balance()
+
+        manager.add("bob", "pw")
+        await manager.close()
+
+        assert closed == [old]
+        assert resolver.saves == 2
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+from tiramisu_wallet_client import BUY, Listing, ListingIndex, Market, Order, TiramisuClient
+
+
+def test_index_sorts_by_price_sat():
+    index = ListingIndex([
+        {"id": 1, "currency": 2, "amount": 10, "price_sat": 300},
+        Listing.from_dict({"id": 2, "currency": {"id": 2}, "amount": 10, "price_sat": 100}),
+        {"id": 3, "currency": 2, "amount": 10, "price_sat": None},
+    ])
+
+    assert [listing["id"] for listing in index.for_currency(2)] == [2, 1, 3]
+    assert [listing["id"] for listing in index.for_currency(2, max_price=200)] == [2]
+
+    changes = index.replace([{"id": 1, "currency": 2, "amount": 10, "price_sat": 50}, {"id": 2, "currency": 2, "amount": 10, "price_sat": 100}])
+
+    assert changes == {"added": 0, "changed": 1, "removed": 1}
+    assert index.cheapest(2)["id"] == 1
+
+
+def test_market_refresh_and_execute(server):
+    client = TiramisuClient("market", "pw", server_url=server.url, lazy=True)
+    market = Market(client)
+
+    prices = [listing["price_sat"] for listing in market.listings(2)]
+
+    assert prices and prices == sorted(prices)
+
+    report = market.execute([Order(BUY, 2, 5), (BUY, 2, 5)], timeout=10)
+
+    assert [result.key for result in report.results] == ["buy:2:5", "buy:2:5#2"]
+    assert report.summary()["finished"] == 2
+    assert all(result.latency > 0 for result in report.results)
+
+    client.close()
+
+
+def test_refresh_reads_listings_returned_as_a_list():
+
+    class ListClient():
+
+        def listings(self, **params):
+            return [{"id": 1, "currency": 2, "amount": 10, "price_sat": 300}, {"id": 2, "currency": 2, "amount": 10, "price_sat": 100}]
+
+        def listings_nfts(self, **params):
+            return []
+
+    market = Market(ListClient())
+
+    assert market.refresh() == {"added": 2, "changed": 0, "removed": 0}
+    assert market.cheapest(2)["id"] == 2
@@ -0,0 +1,14 @@
+from tiramisu_wallet_client import Asset, ResponseCache, TiramisuClient
+
+
+def test_models_leave_shared_cache_unchanged(server):
+    cache = ResponseCache()
+    typed = TiramisuClient("typed", "pw", server_url=server.url, cache=cache, models=True)
+    plain = TiramisuClient("plain", "pw", server_url=server.url, cache=cache)
+
+    assert isinstance(typed.assets()["results"][0], Asset)
+    assert type(plain.assets()["results"][0]) is dict
+    assert cache.hits["assets"]
+
+    typed.close()
+    plain.close()
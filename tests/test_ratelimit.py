@@ -0,0 +1,47 @@
+import asyncio
+import threading
+import time
+
+from tiramisu_wallet_client import RateLimiter
+from tiramisu_wallet_client.endpoints import Request
+
+
+def test_async_slots_shared_with_threads():
+    limiter = RateLimiter(max_in_flight=2)
+    request = Request("transactions", "GET", "api/transactions/")
+    active = []
+    peak = []
+
+    def hold():
+        active.append(1)
+        peak.append(len(active))
+        time.sleep(0.01)
+        active.pop()
+
+    def sync_caller():
+        for _ in range(5):
+            with limiter.limit(request):
+                hold()
+
+    async def async_caller():
+        async with limiter.limit_async(request):
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+
+    async def main():
+        async with limiter.limit_async(request):
+            async with limiter.limit_async(request):
+                cancelled = asyncio.ensure_future(async_caller())
+                await asyncio.sleep(0.01)
+                cancelled.cancel()
+        await asyncio.wait_for(asyncio.gather(*(async_caller() for _ in range(20))), 5)
+
+    thread = threading.Thread(target=sync_caller)
+    thread.start()
+    asyncio.run(main())
+    thread.join()
+
+    assert max(peak) <= 2
+    assert limiter._in_flight == 0 and not limiter._async_waiters
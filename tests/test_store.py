@@ -0,0 +1,13 @@
+from tiramisu_wallet_client import SyncStore, TiramisuClient
+
+
+def test_first_sync_loads_every_transaction(server, tmp_path):
+    client = TiramisuClient("store", "pw", server_url=server.url, lazy=True)
+    store = SyncStore(str(tmp_path / "wallet.db"))
+
+    stats = store.sync(client, page_size=2)
+
+    assert stats["transactions_new"] == client.transactions()["count"]
+    assert store.high_water_mark("transactions") == max(transaction["id"] for transaction in store.transactions())
+
+    client.close()
@@ -0,0 +1,65 @@
+import asyncio
+import email
+
+from tiramisu_wallet_client.async_client import _stream
+from tiramisu_wallet_client.upload import MultipartEncoder, Upload, sniff_content_type
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def parse(encoder:MultipartEncoder) -> dict:
+    body = b"".join(bytes(chunk) for chunk in encoder)
+    message = email.message_from_bytes(f"Content-Type: {encoder.content_type}\r\n\r\n".encode() + body)
+
+    assert len(body) == len(encoder)
+
+    return {part.get_param("name", header="content-disposition"): part for part in message.get_payload()}
+
+
+def test_body_has_fields_and_files_of_every_source(tmp_path):
+    path = tmp_path / "picture.jpg"
+    path.write_bytes(b"\xff\xd8\xff" + b"jpeg" * 1000)
+
+    with open(path, "rb") as f:
+        encoder = MultipartEncoder({"name": "Art", "supply": 1}, {"path": str(path), "file": f, "memory": Upload(PNG, chunk_size=100), "skipped": None})
+        parts = parse(encoder)
+
+    assert parts["name"].get_payload() == "Art"
+    assert parts["supply"].get_payload() == "1"
+    assert parts["path"].get_filename() == "picture.jpg"
+    assert parts["path"].get_content_type() == "image/jpeg"
+    assert parts["file"].get_payload(decode=True) == path.read_bytes()
+    assert parts["memory"].get_filename() == "upload.png"
+    assert parts["memory"].get_payload(decode=True) == PNG
+    assert "skipped" not in parts
+
+
+def test_encoder_can_be_sent_again_and_reports_progress():
+    progress = []
+    encoder = MultipartEncoder(files={"file_path": Upload(PNG, filename="a.bin", progress=lambda sent, total: progress.append((sent, total)), chunk_size=400)})
+
+    first = b"".join(bytes(chunk) for chunk in encoder)
+    second = b"".join(bytes(chunk) for chunk in encoder)
+
+    assert first == second
+    assert progress[-1] == (len(PNG), len(PNG))
+    assert progress.count((len(PNG), len(PNG))) == 2
+
+
+def test_sniff_content_type():
+    assert sniff_content_type(PNG) == "image/png"
+    assert sniff_content_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_content_type(b"\x00\x00\x00\x18ftypheic") == "image/heic"
+    assert sniff_content_type(b'  <?xml version="1.0"?><svg>') == "image/svg+xml"
+    assert sniff_content_type(b"plain text") is None
+
+
+def test_async_stream_yields_the_whole_body(tmp_path):
+    path = tmp_path / "picture.png"
+    path.write_bytes(PNG)
+    encoder = MultipartEncoder({"name": "Art"}, {"file_path": Upload(str(path), chunk_size=100)})
+
+    async def read():
+        return b"".join([bytes(chunk) async for chunk in _stream(encoder)])
+
+    assert asyncio.run(read()) == b"".join(bytes(chunk) for chunk in encoder)
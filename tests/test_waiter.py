@@ -0,0 +1,114 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from tiramisu_wallet_client import AsyncTransactionWaiter, Backoff, RequestError, TransactionTimeout, TransactionWaiter
+from tiramisu_wallet_client.waiter import _Watch, _WatchSet
+
+
+class FlakyClient():
+    """
+    Returns a malformed transaction for id 1 and a broken list page once
+    """
+
+    def __init__(self) -> None:
+        self.list_calls = 0
+
+    def transactions(self, limit:int=None):
+        self.list_calls += 1
+
+        return {} if self.list_calls == 1 else {"results": [{"id": 2, "status": "internal_finished"}]}
+
+    def transaction(self, transaction_id:int):
+        return {"id": transaction_id} if transaction_id == 1 else {"id": transaction_id, "status": "internal_finished"}
+
+
+class AsyncFlakyClient(FlakyClient):
+
+    async def transactions(self, limit:int=None):
+        return FlakyClient.transactions(self, limit)
+
+    async def transaction(self, transaction_id:int):
+        return FlakyClient.transaction(self, transaction_id)
+
+
+def test_poller_survives_bad_responses():
+    client = FlakyClient()
+    waiter = TransactionWaiter(client, backoff=Backoff(0.01, 0.05), list_threshold=1)
+
+    broken = waiter.watch(1, "internal_finished", timeout=5)
+    fine = waiter.watch(2, "internal_finished", timeout=5)
+
+    with pytest.raises(KeyError):
+        broken.result(5)
+
+    assert fine.result(5)["status"] == "internal_finished"
+    assert waiter.wait(3, "internal_finished", timeout=5)["id"] == 3
+
+    waiter.close()
+
+
+def test_async_poller_survives_bad_responses():
+
+    async def main():
+        waiter = AsyncTransactionWaiter(AsyncFlakyClient(), backoff=Backoff(0.01, 0.05), list_threshold=1)
+
+        broken = waiter.watch(1, "internal_finished", timeout=5)
+        fine = waiter.watch(2, "internal_finished", timeout=5)
+
+        with pytest.raises(KeyError):
+            await asyncio.wait_for(broken, 5)
+
+        assert (await asyncio.wait_for(fine, 5))["status"] == "internal_finished"
+        assert (await waiter.wait(3, "internal_finished", timeout=5))["id"] == 3
+
+        await waiter.close()
+
+    asyncio.run(main())
+
+
+class UnavailableClient():
+    """
+    Answers the first fetch of every transaction with 503
+    """
+
+    def __init__(self) -> None:
+        self.calls = {}
+
+    def transaction(self, transaction_id:int):
+        self.calls[transaction_id] = self.calls.get(transaction_id, 0) + 1
+
+        if transaction_id == 404:
+            raise RequestError("not found", status=404)
+
+        if self.calls[transaction_id] == 1:
+            raise RequestError("unavailable", status=503)
+
+        return {"id": transaction_id, "status": "internal_finished"}
+
+
+def test_transient_fetch_error_is_polled_again():
+    waiter = TransactionWaiter(UnavailableClient(), backoff=Backoff(0.01, 0.05))
+
+    assert waiter.wait(1, "internal_finished", timeout=5)["id"] == 1
+
+    with pytest.raises(RequestError):
+        waiter.wait(404, "internal_finished", timeout=5)
+
+    waiter.close()
+
+
+def test_next_poll_does_not_pass_the_deadline():
+    watches = _WatchSet(Backoff(initial=60, maximum=60, jitter=0))
+    watch = _Watch(1, "internal_finished", None, concurrent.futures.Future(), deadline=5, delay=60)
+
+    watches.apply([watch], {"id": 1, "status": "internal_pending"}, now=0)
+    assert watch.next_poll == 5
+
+    watches.retry({None: {1: [watch]}}, RequestError("unavailable", status=503), now=1)
+    assert watch.next_poll == 5
+
+    watches.apply([watch], {"id": 1, "status": "internal_pending"}, now=5)
+    with pytest.raises(TransactionTimeout):
+        watch.future.result(0)